@@ -0,0 +1,355 @@
+from lc3.loader import MEMORY_SIZE
+
+import hashlib
+import os
+import re
+import struct
+
+REGISTER = re.compile(r'^R([0-7])$')
+LABEL = re.compile(r'^[A-Za-z_][A-Za-z_0-9]*$')
+MAX_LABEL_LENGTH = 20
+
+# Part of every assembly cache key, bumped whenever the output for the same source changes
+ASSEMBLER_VERSION = b'2'
+
+TRAPS = {'GETC': 0x20, 'OUT': 0x21, 'PUTS': 0x22, 'IN': 0x23, 'PUTSP': 0x24, 'HALT': 0x25}
+
+# Opcode -> (operand format, base encoding), following the instruction set of the bundled PennSim.jar
+INSTRUCTIONS = {
+    'ADD': ('alu', 0x1000), 'AND': ('alu', 0x5000), 'MUL': ('alu', 0xD000), 'SUB': ('sub', 0x1010),
+    'NOT': ('not', 0x903F),
+    'JMP': ('base', 0xC000), 'JMPT': ('base', 0xC001), 'JSRR': ('base', 0x4000),
+    'RET': ('none', 0xC1C0), 'RTT': ('none', 0xC1C1), 'RTI': ('none', 0x8000),
+    'JSR': ('pc11', 0x4800),
+    'LD': ('pc9', 0x2000), 'LDI': ('pc9', 0xA000), 'LEA': ('pc9', 0xE000),
+    'ST': ('pc9', 0x3000), 'STI': ('pc9', 0xB000),
+    'LDR': ('offset6', 0x6000), 'STR': ('offset6', 0x7000),
+    'TRAP': ('trap', 0xF000),
+}
+INSTRUCTIONS.update((name, ('none', 0xF000 | vector)) for name, vector in TRAPS.items())
+for condition in ('', 'N', 'Z', 'P', 'NZ', 'NP', 'ZP', 'NZP'):
+    INSTRUCTIONS['BR' + condition] = ('br', ((4 if 'N' in condition else 0) | (2 if 'Z' in condition else 0) |
+                                             (1 if 'P' in condition else 0) or 7) << 9)
+
+DIRECTIVES = {'.ORIG', '.END', '.FILL', '.BLKW', '.STRINGZ', '.EXTERNAL'}
+
+ESCAPES = {'n': '\n', 't': '\t', '0': '\0', '"': '"', '\\': '\\'}
+
+
+class AssemblyException(Exception):
+    """
+    Raised for the first error in a source file, worded the same as PennSim's assembler
+    """
+
+    def __init__(self, lineNumber, line, message):
+        super(AssemblyException, self).__init__('Assembly error: [line {}, \'{}\']: {}'.format(
+            lineNumber, line, message))
+
+
+class Statement:
+    """
+    One source line that has a label, an opcode or both
+    """
+
+    def __init__(self, lineNumber, line, label, opcode, operands, string):
+        self.lineNumber = lineNumber
+        self.line = line
+        self.label = label
+        self.opcode = opcode
+        self.operands = operands
+        self.string = string
+        self.address = None
+
+    def error(self, message):
+        return AssemblyException(self.lineNumber, self.line, message)
+
+
+def splitLine(line):
+    """
+    Returns the tokens of a line and the contents of its string literal, if any
+
+    Tokens keep their case, parse upper cases everything but label definitions.
+    """
+    code, string, index = [], None, 0
+    while index < len(line):
+        char = line[index]
+        if char == ';':
+            break
+        if char == '"' and string is None:
+            string, index = [], index + 1
+            while index < len(line) and line[index] != '"':
+                if line[index] == '\\' and index + 1 < len(line):
+                    index += 1
+                    string.append(ESCAPES.get(line[index], line[index]))
+                else:
+                    string.append(line[index])
+                index += 1
+        else:
+            code.append(char)
+        index += 1
+    tokens = ''.join(code).replace(',', ' ').split()
+    return tokens, None if string is None else ''.join(string)
+
+
+def parseNumber(token):
+    """
+    Parses #10, 10, -10, x1F, 0x1F and b101, returns None for anything else
+    """
+    try:
+        if re.match(r'^#?-?\d+$', token):
+            return int(token.lstrip('#'))
+        if re.match(r'^0?X-?[0-9A-F]+$', token):
+            return int(token[token.index('X') + 1:], 16)
+        if re.match(r'^B-?[01]+$', token):
+            return int(token[1:], 2)
+    except ValueError:
+        pass
+    return None
+
+
+def parse(source):
+    statements = []
+    for lineNumber, line in enumerate(source.splitlines(), 1):
+        tokens, string = splitLine(line)
+        if not tokens:
+            continue
+        label = None
+        # Opcodes, registers and label references are case insensitive, a label keeps the spelling it is defined with
+        if tokens[0].upper() not in INSTRUCTIONS and tokens[0].upper() not in DIRECTIVES:
+            label = tokens.pop(0).rstrip(':')
+            if not LABEL.match(label):
+                raise AssemblyException(lineNumber, line.strip(), 'Unrecognizable token: `{}`'.format(label))
+            if len(label) > MAX_LABEL_LENGTH:
+                raise AssemblyException(lineNumber, line.strip(),
+                                        'Labels can be no longer than 20 characters (\'{}\').'.format(label))
+        tokens = [token.upper() for token in tokens]
+        opcode = tokens.pop(0) if tokens else None
+        if opcode is not None and opcode not in INSTRUCTIONS and opcode not in DIRECTIVES:
+            raise AssemblyException(lineNumber, line.strip(), 'Undefined opcode \'{}\''.format(opcode))
+        statements.append(Statement(lineNumber, line.strip(), label, opcode, tokens, string))
+    return statements
+
+
+def size(statement):
+    if statement.opcode == '.BLKW':
+        count = parseNumber(statement.operands[0]) if statement.operands else None
+        if count is None or count < 0:
+            raise statement.error('.BLKW needs a positive number of words')
+        return count
+    if statement.opcode == '.STRINGZ':
+        if statement.string is None:
+            raise statement.error('.STRINGZ needs a string')
+        return len(statement.string) + 1
+    if statement.opcode in ('.END', '.EXTERNAL', None):
+        return 0
+    return 1
+
+
+class Assembly:
+    """
+    Two pass assembly of a source file
+
+    The first pass assigns addresses to every statement and collects labels, the second
+    encodes them. words holds the object image (origin first) and symbols the labels, as
+    they were spelled, in the order they were defined. labels holds the same addresses by
+    upper cased label, which is how operands refer to them.
+    """
+
+    def __init__(self, source):
+        self.symbols = {}
+        self.labels = {}
+        self.instructions = []
+        self.origin = None
+
+        statements = parse(source)
+        self.layout(statements)
+        self.words = [self.origin]
+        for statement in statements:
+            self.words.extend(self.encode(statement))
+
+    def layout(self, statements):
+        address = None
+        for index, statement in enumerate(statements):
+            if statement.opcode == '.ORIG':
+                if address is not None or any(other.opcode for other in statements[:index]):
+                    raise statement.error('.ORIG can only appear at the beginning of a file')
+                origin = parseNumber(statement.operands[0]) if statement.operands else None
+                if origin is None or not 0 <= origin < MEMORY_SIZE:
+                    raise statement.error('Immediate out of range')
+                self.origin = address = origin
+                continue
+            if statement.opcode == '.END':
+                del statements[index:]
+                break
+            if address is None:
+                if statement.opcode is None:
+                    continue
+                raise statement.error('.ORIG can only appear at the beginning of a file')
+
+            statement.address = address
+            if statement.label is not None:
+                if statement.label.upper() in self.labels:
+                    raise statement.error('Duplicate label (\'{}\')'.format(statement.label))
+                self.symbols[statement.label] = address
+                self.labels[statement.label.upper()] = address
+            if statement.opcode in INSTRUCTIONS:
+                self.instructions.append(address)
+            address += size(statement)
+            if address > MEMORY_SIZE:
+                raise statement.error('Label cannot be represented in 16 bits ({})'.format(address))
+        if self.origin is None:
+            raise AssemblyException(0, '', 'No .ORIG found')
+
+    def register(self, statement, token):
+        match = REGISTER.match(token)
+        if match is None:
+            raise statement.error('Register number out of range' if token.startswith('R') and token[1:].isdigit()
+                                  else 'Unexpected instruction format: \'{}\''.format(statement.line))
+        return int(match.group(1))
+
+    def immediate(self, statement, token, bits, signed=True):
+        value = parseNumber(token)
+        if value is None:
+            raise statement.error('Unexpected instruction format: \'{}\''.format(statement.line))
+        low, high = (-(1 << (bits - 1)), (1 << (bits - 1)) - 1) if signed else (0, (1 << bits) - 1)
+        if not low <= value <= high:
+            raise statement.error('Immediate out of range')
+        return value & ((1 << bits) - 1)
+
+    def offset(self, statement, token, bits):
+        # A label is turned into an offset from the incremented PC, a number is taken as the offset itself
+        if token in self.labels:
+            value = self.labels[token] - (statement.address + 1)
+            if not -(1 << (bits - 1)) <= value < (1 << (bits - 1)):
+                raise statement.error('PC-relative offset out of range')
+            return value & ((1 << bits) - 1)
+        if parseNumber(token) is None:
+            raise statement.error('Undeclared label: \'{}\''.format(token))
+        return self.immediate(statement, token, bits)
+
+    def operands(self, statement, count):
+        if len(statement.operands) != count:
+            raise statement.error('Unexpected instruction format: \'{}\''.format(statement.line))
+        return statement.operands
+
+    def encode(self, statement):
+        opcode = statement.opcode
+        if opcode is None or opcode in ('.ORIG', '.EXTERNAL'):
+            return []
+        if opcode == '.FILL':
+            value, = self.operands(statement, 1)
+            if value in self.labels:
+                return [self.labels[value]]
+            number = parseNumber(value)
+            if number is None:
+                raise statement.error('Undeclared label: \'{}\''.format(value))
+            if not -0x8000 <= number <= 0xFFFF:
+                raise statement.error('Immediate out of range')
+            return [number & 0xFFFF]
+        if opcode == '.BLKW':
+            return [0] * size(statement)
+        if opcode == '.STRINGZ':
+            return [ord(char) & 0xFFFF for char in statement.string] + [0]
+
+        form, word = INSTRUCTIONS[opcode]
+        if form == 'none':
+            self.operands(statement, 0)
+        elif form == 'alu':
+            dr, sr, operand = self.operands(statement, 3)
+            word |= self.register(statement, dr) << 9 | self.register(statement, sr) << 6
+            if REGISTER.match(operand):
+                word |= self.register(statement, operand)
+            else:
+                word |= 0x20 | self.immediate(statement, operand, 5)
+        elif form == 'sub':
+            dr, sr, tr = self.operands(statement, 3)
+            word |= (self.register(statement, dr) << 9 | self.register(statement, sr) << 6 |
+                     self.register(statement, tr))
+        elif form == 'not':
+            dr, sr = self.operands(statement, 2)
+            word |= self.register(statement, dr) << 9 | self.register(statement, sr) << 6
+        elif form == 'base':
+            base, = self.operands(statement, 1)
+            word |= self.register(statement, base) << 6
+        elif form == 'br':
+            target, = self.operands(statement, 1)
+            word |= self.offset(statement, target, 9)
+        elif form == 'pc11':
+            target, = self.operands(statement, 1)
+            word |= self.offset(statement, target, 11)
+        elif form == 'pc9':
+            dr, target = self.operands(statement, 2)
+            word |= self.register(statement, dr) << 9 | self.offset(statement, target, 9)
+        elif form == 'offset6':
+            dr, base, offset = self.operands(statement, 3)
+            word |= (self.register(statement, dr) << 9 | self.register(statement, base) << 6 |
+                     self.immediate(statement, offset, 6))
+        elif form == 'trap':
+            vector, = self.operands(statement, 1)
+            word |= self.immediate(statement, vector, 8, signed=False)
+        return [word]
+
+    @property
+    def objectData(self):
+        return struct.pack('>{}H'.format(len(self.words)), *self.words)
+
+    @property
+    def symbolText(self):
+        # Same layout as PennSim's .sym files, '$' entries mark the addresses holding instructions
+        lines = ['// Symbol table', '// Scope level 0:', '//\tSymbol Name       Page Address',
+                 '//\t----------------  ------------']
+        lines.extend('//\t{:<16}  {:04X}'.format(label, address) for label, address in self.symbols.items())
+        lines.extend('//\t$               {:04X}'.format(address) for address in self.instructions)
+        return '\n'.join(lines) + '\n\n'
+
+
+class AssemblyCache:
+    """
+    Assembled .obj / .sym contents keyed by the SHA-256 of the source and ASSEMBLER_VERSION
+
+    Kept in memory and, when a directory is given, on disk so unchanged sources are never
+    assembled twice across runs. Failed assemblies aren't cached.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.entries = {}
+        if directory is not None:
+            try:
+                os.makedirs(directory, exist_ok=True)
+            except OSError:
+                self.directory = None
+
+    def paths(self, key):
+        return os.path.join(self.directory, key + '.obj'), os.path.join(self.directory, key + '.sym')
+
+    def assemble(self, source):
+        """
+        Returns the .obj bytes and .sym text for source, raises AssemblyException on errors
+        """
+        key = hashlib.sha256(ASSEMBLER_VERSION + source.encode('utf-8')).hexdigest()
+        if key in self.entries:
+            return self.entries[key]
+
+        if self.directory is not None:
+            objPath, symPath = self.paths(key)
+            try:
+                with open(objPath, 'rb') as objFile, open(symPath, encoding='utf-8') as symFile:
+                    self.entries[key] = objFile.read(), symFile.read()
+                return self.entries[key]
+            except OSError:
+                pass
+
+        assembly = Assembly(source)
+        self.entries[key] = assembly.objectData, assembly.symbolText
+
+        if self.directory is not None:
+            for path, contents, mode in zip(self.paths(key), self.entries[key], ('wb', 'w')):
+                temporary = '{}.tmp{}'.format(path, os.getpid())
+                try:
+                    with open(temporary, mode) as cacheFile:
+                        cacheFile.write(contents)
+                    os.replace(temporary, path)
+                except OSError:
+                    pass
+        return self.entries[key]
@@ -0,0 +1,183 @@
+from lc3.loader import MEMORY_SIZE
+
+from collections import namedtuple
+
+# Device registers start here, stores at or above it can halt the machine or change the MPR
+DEVICE_START = 0xFE00
+
+MAX_BLOCK_LENGTH = 256
+
+# A compiled block: function(machine) runs it and returns how many instructions it executed.
+# interior holds the addresses after the first, a breakpoint on one of them means the block can't be used.
+Block = namedtuple('Block', ['start', 'end', 'length', 'function', 'interior'])
+
+
+def signExtend(value, bits):
+    if value & (1 << (bits - 1)):
+        return value - (1 << bits)
+    return value
+
+
+def isTerminator(instruction):
+    # BR, JSR / JSRR, RTI, JMP / RET / JMPT / RTT and TRAP
+    return instruction >> 12 in (0x0, 0x4, 0x8, 0xC, 0xF)
+
+
+def isUndefined(instruction):
+    opcode = instruction >> 12
+    if opcode in (0x1, 0x5, 0xD) and not instruction & 0x20:
+        mode = (instruction >> 3) & 0x3
+        return not (mode == 0 or (mode == 2 and opcode == 0x1))
+    return False
+
+
+class BlockCompiler:
+    """
+    Translates a straight-line run of LC-3 instructions into one generated Python function
+
+    A block runs from its start address up to and including the first control transfer.
+    It never crosses a 4K page, so one MPR check at the start covers every fetch. The PC,
+    instruction count and condition codes are written back before each memory access, so
+    exceptions, device reads and the timer see the same state they would when stepping.
+    """
+
+    def __init__(self, memory, start):
+        self.memory = memory
+        self.start = start
+        self.lines = []
+        self.pendingCount = 0
+        self.pendingCC = False
+
+    def emit(self, line):
+        self.lines.append('    ' + line)
+
+    def sync(self, address):
+        # Makes the machine's state match having just fetched the instruction at address
+        self.emit('self.pc = {}'.format((address + 1) & 0xFFFF))
+        if self.pendingCount:
+            self.emit('self.advance({})'.format(self.pendingCount))
+            self.pendingCount = 0
+        self.flushCC()
+
+    def flushCC(self):
+        if self.pendingCC:
+            self.emit('self.nzp = 2 if not v else 4 if v & 0x8000 else 1')
+            self.pendingCC = False
+
+    def setsCC(self, expression, dr):
+        self.emit('r[{}] = v = {}'.format(dr, expression))
+        self.pendingCC = True
+
+    def store(self, address, addressExpression, value, executed):
+        self.emit('a = {}'.format(addressExpression))
+        self.emit('self.write(a, {})'.format(value))
+        # Stop if the store rewrote this block or touched a device (MCR halt, MPR, ...)
+        self.emit('if a >= {} or {} not in self.blocks:'.format(DEVICE_START, self.start))
+        self.emit('    return {}'.format(executed))
+
+    def compile(self):
+        """
+        Returns a Block, or None if the first instruction can't start one
+        """
+        memory = self.memory
+        address = self.start
+        page = address >> 12
+        length = 0
+
+        while True:
+            instruction = memory[address]
+            # Undefined instructions are left for step() to raise on
+            if isUndefined(instruction):
+                self.sync((address - 1) & 0xFFFF)
+                break
+            length += 1
+            self.pendingCount += 1
+            self.translate(address, (address + 1) & 0xFFFF, instruction, length)
+            if isTerminator(instruction):
+                break
+            if length >= MAX_BLOCK_LENGTH or (address + 1) >> 12 != page:
+                self.sync(address)
+                break
+            address += 1
+
+        if not length:
+            return None
+
+        source = 'def block(self):\n    r = self.registers\n{}\n    return {}\n'.format('\n'.join(self.lines), length)
+        namespace = {}
+        exec(compile(source, '<block x{:04X}>'.format(self.start), 'exec'), namespace)
+        end = self.start + length
+        return Block(self.start, end, length, namespace['block'], frozenset(range(self.start + 1, end)))
+
+    def translate(self, address, pc, instruction, executed):
+        opcode = instruction >> 12
+        dr = (instruction >> 9) & 0x7
+        sr = (instruction >> 6) & 0x7
+        pcOffset9 = (pc + signExtend(instruction & 0x1FF, 9)) & 0xFFFF
+
+        if opcode in (0x1, 0x5, 0xD):
+            if instruction & 0x20:
+                operand = str(signExtend(instruction & 0x1F, 5))
+            else:
+                operand = 'r[{}]'.format(instruction & 0x7)
+            if opcode == 0x5:
+                self.setsCC('r[{}] & {} & 0xFFFF'.format(sr, operand), dr)
+            elif opcode == 0xD:
+                self.setsCC('(r[{}] * {}) & 0xFFFF'.format(sr, operand), dr)
+            elif not instruction & 0x20 and (instruction >> 3) & 0x3 == 2:
+                self.setsCC('(r[{}] - {}) & 0xFFFF'.format(sr, operand), dr)
+            else:
+                self.setsCC('(r[{}] + {}) & 0xFFFF'.format(sr, operand), dr)
+        elif opcode == 0x9:
+            self.setsCC('~r[{}] & 0xFFFF'.format(sr), dr)
+        elif opcode == 0xE:
+            self.setsCC(str(pcOffset9), dr)
+        elif opcode == 0x2:
+            self.sync(address)
+            self.setsCC('self.read({})'.format(pcOffset9), dr)
+        elif opcode == 0x6:
+            self.sync(address)
+            self.setsCC('self.read((r[{}] + {}) & 0xFFFF)'.format(sr, signExtend(instruction & 0x3F, 6)), dr)
+        elif opcode == 0xA:
+            self.sync(address)
+            self.setsCC('self.read(self.read({}))'.format(pcOffset9), dr)
+        elif opcode == 0x3:
+            self.sync(address)
+            self.store(address, str(pcOffset9), 'r[{}]'.format(dr), executed)
+        elif opcode == 0x7:
+            self.sync(address)
+            self.store(address, '(r[{}] + {}) & 0xFFFF'.format(sr, signExtend(instruction & 0x3F, 6)),
+                       'r[{}]'.format(dr), executed)
+        elif opcode == 0xB:
+            self.sync(address)
+            self.store(address, 'self.read({})'.format(pcOffset9), 'r[{}]'.format(dr), executed)
+        elif opcode == 0x0:
+            self.sync(address)
+            self.emit('if {} & self.nzp:'.format((instruction >> 9) & 0x7))
+            self.emit('    self.pc = {}'.format(pcOffset9))
+        elif opcode == 0x4:
+            self.sync(address)
+            if instruction & 0x800:
+                self.emit('r[7] = {}'.format(pc))
+                self.emit('self.pc = {}'.format((pc + signExtend(instruction & 0x7FF, 11)) & 0xFFFF))
+            else:
+                self.emit('t = r[{}]'.format(sr))
+                self.emit('r[7] = {}'.format(pc))
+                self.emit('self.pc = t')
+        elif opcode == 0x8:
+            self.sync(address)
+            self.emit('self.execRTI()')
+        elif opcode == 0xC:
+            self.sync(address)
+            if instruction & 0x1:
+                self.emit('self.privileged = False')
+            self.emit('self.pc = r[{}]'.format(sr))
+        elif opcode == 0xF:
+            self.sync(address)
+            self.emit('self.execTRAP({})'.format(instruction & 0xFF))
+
+
+def compileBlock(memory, start):
+    if not 0 <= start < MEMORY_SIZE:
+        return None
+    return BlockCompiler(memory, start).compile()
@@ -0,0 +1,107 @@
+from lc3.script import ScriptRunner, perRunner, runScript, setAssemblyCache, stripComment
+
+import gc
+import os
+import pickle
+import time
+
+# Commands that never read anything from the working directory
+PRELUDE_COMMANDS = {'reset', 'b', 'break', 'set', 'stop'}
+
+
+def readFile(path):
+    try:
+        with open(path, 'rb') as sharedFile:
+            return sharedFile.read()
+    except OSError:
+        return None
+
+
+def preludeLength(workingDirs, scripts):
+    """
+    Returns how many of the scripts' leading lines do the same thing in every working directory
+
+    That is comments, commands that don't touch the working directory and ld of object (and
+    symbol) files that are byte for byte the same everywhere, as the staged OS normally is.
+    scripts holds each working directory's script as a list of lines.
+    """
+    for index, lines in enumerate(zip(*scripts)):
+        line = lines[0]
+        if any(other != line for other in lines):
+            return index
+        command = stripComment(line).split()
+        if not command or command[0].lower() in PRELUDE_COMMANDS:
+            continue
+        if command[0].lower() not in ('ld', 'load') or len(command) < 2 or not command[1].endswith('.obj'):
+            return index
+        for name in (command[1], command[1][:-len('.obj')] + '.sym'):
+            contents = {readFile(os.path.join(workingDir, name)) for workingDir in workingDirs}
+            if len(contents) != 1:
+                return index
+    return min(len(lines) for lines in scripts)
+
+
+def runForked(workingDirs, script, instructionLimit=None, outputLimit=None, assemblyCacheDir=None, fastTraps=False,
+              timeLimit=None):
+    """
+    Runs the same script in each of workingDirs and returns a (transcript, verdict) pair for each
+
+    script is either one script or one per working directory, as for runScripts. The prelude
+    (see preludeLength) is run once here, then every working directory gets an os.fork()
+    child that carries on from that state, sharing the loaded OS with this process
+    copy-on-write. Children run one at a time and send their result back over a pipe. Where
+    fork isn't available each script is run with runScript. Module level so it can be handed
+    to a process pool.
+    """
+    scripts = perRunner(script, len(workingDirs))
+    if not hasattr(os, 'fork'):
+        return [runScript(workingDir, script, instructionLimit, outputLimit, assemblyCacheDir, fastTraps, timeLimit)
+                for workingDir, script in zip(workingDirs, scripts)]
+    if assemblyCacheDir is not None:
+        setAssemblyCache(assemblyCacheDir)
+    if not workingDirs:
+        return []
+
+    scripts = [script.splitlines() for script in scripts]
+    prelude = preludeLength(workingDirs, scripts)
+    runner = ScriptRunner(workingDirs[0], instructionLimit, outputLimit, fastTraps, timeLimit=timeLimit)
+    for line in scripts[0][:prelude]:
+        runner.runCommand(line)
+    # Keeps the collector from writing to every object it tracks, which would copy their pages into each child
+    gc.freeze()
+    try:
+        return [runChild(runner, workingDir, lines[prelude:], timeLimit)
+                for workingDir, lines in zip(workingDirs, scripts)]
+    finally:
+        gc.unfreeze()
+
+
+def runChild(runner, workingDir, lines, timeLimit):
+    readEnd, writeEnd = os.pipe()
+    pid = os.fork()
+    if not pid:
+        os.close(readEnd)
+        try:
+            runner.workingDir = workingDir
+            if timeLimit is not None:
+                runner.deadline = time.monotonic() + timeLimit
+            if not runner.finished:
+                runner.run('\n'.join(lines))
+            result = runner.output, runner.verdict
+        except BaseException as e:
+            result = '', 'Failed ({})'.format(e)
+        try:
+            with os.fdopen(writeEnd, 'wb') as resultPipe:
+                pickle.dump(result, resultPipe)
+        finally:
+            # Straight out, without running anything the parent registered to run at exit
+            os._exit(0)
+
+    os.close(writeEnd)
+    with os.fdopen(readEnd, 'rb') as resultPipe:
+        data = resultPipe.read()
+    _, status = os.waitpid(pid, 0)
+    try:
+        return pickle.loads(data)
+    except Exception:
+        return '', 'Failed (run exited with status {})'.format(status)
@@ -0,0 +1,395 @@
+from lc3.loader import MEMORY_SIZE, numpy
+from lc3.machine import (DDR, DSR, KBDR, KBSR, MCR, MPR, N, P, PAGES, TIMER_DISABLED, TIMER_MANUAL, TMI, TMR, Z,
+                         ExecutionException, accessException)
+
+import time
+
+# Device registers that are more than a plain memory word, reads and writes of them go through the lane's Machine
+DEVICE_READS = frozenset([KBSR, KBDR, DSR, TMR, TMI, MPR, MCR])
+DEVICE_WRITES = frozenset([DDR, TMI, MPR, MCR])
+
+# Below this many running lanes a step costs more than running the lanes one after another
+MIN_LANES = 16
+# Each lane holds a full 128K memory, larger groups are split
+MAX_LANES = 512
+# Steps between checks of run()'s deadline
+TIME_SLICE_STEPS = 256
+# Lanes detecting livelock are checkpointed every CYCLE_STEPS steps and watched for
+# CYCLE_WINDOW_STEPS steps after, see Machine.findCycle
+CYCLE_STEPS = 1024
+CYCLE_WINDOW_STEPS = 256
+
+
+def extend(values, bits):
+    # signExtend over an array
+    sign = 1 << (bits - 1)
+    return ((values & ((1 << bits) - 1)) ^ sign) - sign
+
+
+class LaneMachine:
+    """
+    Continues many Machines in lockstep, one NumPy lane each
+
+    Memory (N x 65536), registers (N x 8), PC and the rest of the machine state are held as
+    arrays, and each step executes the current instruction of every running lane, one
+    vectorized operation per opcode present. Lanes diverge freely: a lane that halts, hits a
+    breakpoint, reaches the limit or raises simply stops taking part.
+
+    Device registers are handled a lane at a time through the lane's own Machine, so keyboard
+    input, console output and the clock behave exactly as they do there. The Machines are
+    brought up to date when run returns. Lanes whose Machine has detectLivelock set stop
+    with 'livelock' when they come back to a checkpointed state, as Machine.run would.
+    """
+
+    def __init__(self, machines):
+        if numpy is None:
+            raise ImportError('LaneMachine needs numpy')
+        count = len(machines)
+        self.machines = machines
+
+        self.memory = numpy.empty((count, MEMORY_SIZE), dtype=numpy.uint16)
+        for lane, machine in enumerate(machines):
+            self.memory[lane] = machine.memory
+        self.registers = numpy.array([machine.registers for machine in machines], dtype=numpy.int64).reshape(count, 8)
+        self.pc = numpy.array([machine.pc for machine in machines], dtype=numpy.int64)
+        self.privileged = numpy.array([machine.privileged for machine in machines], dtype=bool)
+        self.nzp = numpy.array([machine.nzp for machine in machines], dtype=numpy.int64)
+        self.mpr = numpy.array([machine.mpr for machine in machines], dtype=numpy.int64)
+        # Each lane's Machine.userPages, updated when the lane writes its MPR
+        self.userPages = numpy.array([machine.userPages for machine in machines], dtype=bool).reshape(count, PAGES)
+        self.mcr = numpy.array([machine.mcr for machine in machines], dtype=numpy.int64)
+        self.timerInterval = numpy.array([machine.timerInterval for machine in machines], dtype=numpy.int64)
+        self.instructionCount = numpy.array([machine.instructionCount for machine in machines], dtype=numpy.int64)
+        # Instruction count each lane's timer last went off or was set at, see Machine.timerDue
+        self.timerStart = self.instructionCount - [machine.timerCount for machine in machines]
+
+        self.breakpoints = None
+        if any(machine.breakpoints for machine in machines):
+            self.breakpoints = numpy.zeros((count, MEMORY_SIZE), dtype=bool)
+            for lane, machine in enumerate(machines):
+                self.breakpoints[lane, list(machine.breakpoints)] = True
+
+        # Lanes being watched for a cycle, with their state and memory when the watch started
+        self.watched = None
+        self.cycleState = None
+        self.cycleMemory = None
+
+        # Exceptions raised by lanes during the current step
+        self.errors = {}
+        self.handlers = [self.execBR, self.execADD, self.execLD, self.execST, self.execJSR, self.execAND,
+                         self.execLDR, self.execSTR, self.execRTI, self.execNOT, self.execLDI, self.execSTI,
+                         self.execJMP, self.execMUL, self.execLEA, self.execTRAP]
+
+    def run(self, limit=None, deadline=None):
+        """
+        Runs every lane until it halts, reaches a breakpoint or has executed limit instructions
+
+        limit is either one limit for every lane or a list with one per lane. Returns one result
+        per lane: 'halted', 'breakpoint', 'limit', 'timeout' or 'livelock' as Machine.run would, or the
+        ExecutionException the lane stopped on. Once fewer than MIN_LANES are left they are
+        finished on their own Machines, where compiled blocks make up for the lost width.
+        """
+        count = len(self.machines)
+        results = [None] * count
+        limits = None
+        if limit is not None:
+            limits = numpy.broadcast_to(numpy.asarray(limit, dtype=numpy.int64), (count,))
+        # Running lanes all started together, so they have all executed the same number of instructions
+        executed = 0
+        active = numpy.arange(count)
+        self.devicesWritten = True
+        while active.size >= MIN_LANES:
+            if self.devicesWritten:
+                halted = (self.mcr[active] & 0x8000) == 0
+                if halted.any():
+                    for lane in active[halted]:
+                        results[lane] = 'halted'
+                    active = active[~halted]
+                self.devicesWritten = False
+            if limits is not None:
+                done = limits[active] <= executed
+                if done.any():
+                    for lane in active[done]:
+                        results[lane] = 'limit'
+                    active = active[~done]
+            if deadline is not None and not executed % TIME_SLICE_STEPS and time.monotonic() >= deadline:
+                for lane in active:
+                    results[lane] = 'timeout'
+                active = active[:0]
+            if not active.size:
+                break
+            if not executed % CYCLE_STEPS:
+                self.watchCycles(active)
+
+            self.step(active)
+            executed += 1
+            if self.errors:
+                for lane, exception in self.errors.items():
+                    results[lane] = exception
+                active = active[~numpy.isin(active, list(self.errors))]
+                self.errors.clear()
+            if self.breakpoints is not None:
+                hit = self.breakpoints[active, self.pc[active]]
+                if hit.any():
+                    for lane in active[hit]:
+                        results[lane] = 'breakpoint'
+                    active = active[~hit]
+            if self.watched is not None:
+                looping = self.cycled(active)
+                if looping:
+                    for lane in looping:
+                        results[lane] = 'livelock'
+                    active = active[~numpy.isin(active, looping)]
+                if executed % CYCLE_STEPS >= CYCLE_WINDOW_STEPS:
+                    self.watched = None
+
+        self.store()
+        for lane in active:
+            try:
+                results[lane] = self.machines[lane].run(None if limits is None else int(limits[lane]) - executed,
+                                                        deadline)
+            except ExecutionException as e:
+                results[lane] = e
+        return results
+
+    def store(self):
+        # Writes the lanes back to their Machines
+        for lane, machine in enumerate(self.machines):
+            fastTraps = bool(machine.fastTraps)
+            machine.memory = self.memory[lane].tolist()
+            machine.invalidate()
+            if fastTraps:
+                machine.installFastTraps()
+            machine.registers = self.registers[lane].tolist()
+            machine.pc = int(self.pc[lane])
+            machine.privileged = bool(self.privileged[lane])
+            machine.nzp = int(self.nzp[lane])
+            machine.instructionCount = int(self.instructionCount[lane])
+            self.storeDevices(lane, machine)
+
+    ## Livelock detection
+
+    def state(self, lanes):
+        # One row per lane of everything besides memory that decides what it does next
+        return numpy.column_stack([self.pc[lanes], self.registers[lanes], self.privileged[lanes], self.nzp[lanes],
+                                   self.mpr[lanes], self.mcr[lanes], self.timerInterval[lanes],
+                                   numpy.minimum(self.timerCount(lanes), self.timerInterval[lanes])])
+
+    def watchCycles(self, lanes):
+        # Only the keyboard comes from outside a lane, lanes with input pending are left alone
+        watched = [lane for lane in lanes if self.machines[lane].detectLivelock and not self.machines[lane].keyboard]
+        if not watched:
+            self.watched = None
+            return
+        self.watched = numpy.array(watched, dtype=numpy.int64)
+        self.cycleState = self.state(self.watched)
+        self.cycleMemory = self.memory[self.watched]
+
+    def cycled(self, lanes):
+        """
+        Returns the running lanes that are back in exactly the state they were being watched from
+        """
+        watched = self.watched
+        candidates = numpy.flatnonzero(numpy.isin(watched, lanes) & (self.pc[watched] == self.cycleState[:, 0]))
+        if not candidates.size:
+            return []
+        same = (self.state(watched[candidates]) == self.cycleState[candidates]).all(axis=1)
+        return [int(watched[index]) for index in candidates[same]
+                if numpy.array_equal(self.memory[watched[index]], self.cycleMemory[index])]
+
+    def timerCount(self, lanes):
+        interval = self.timerInterval[lanes]
+        ticking = (interval != TIMER_DISABLED) & (interval != TIMER_MANUAL)
+        return numpy.where(ticking, self.instructionCount[lanes] - self.timerStart[lanes], 0)
+
+    def storeDevices(self, lane, machine):
+        machine.mpr = int(self.mpr[lane])
+        machine.mcr = int(self.mcr[lane])
+        machine.timerInterval = int(self.timerInterval[lane])
+        machine.timerCount = int(self.timerCount(lane))
+
+    def loadDevices(self, lane, machine):
+        if self.mpr[lane] != machine.mpr:
+            self.mpr[lane] = machine.mpr
+            self.userPages[lane] = machine.userPages
+        self.mcr[lane] = machine.mcr
+        self.timerInterval[lane] = machine.timerInterval
+        self.timerStart[lane] = self.instructionCount[lane] - machine.timerCount
+
+    def fail(self, lane, exception):
+        self.errors[int(lane)] = exception
+
+    def step(self, lanes):
+        pc = self.pc[lanes]
+        allowed = self.privileged[lanes] | self.userPages[lanes, pc >> 12]
+        if not allowed.all():
+            for lane, address in zip(lanes[~allowed], pc[~allowed]):
+                self.fail(lane, accessException(address))
+            lanes, pc = lanes[allowed], pc[allowed]
+
+        instructions = self.memory[lanes, pc].astype(numpy.int64)
+        pc = (pc + 1) & 0xFFFF
+        self.pc[lanes] = pc
+        self.instructionCount[lanes] += 1
+
+        opcodes = instructions >> 12
+        for opcode in numpy.flatnonzero(numpy.bincount(opcodes, minlength=16)):
+            selected = opcodes == opcode
+            self.handlers[opcode](lanes[selected], instructions[selected], pc[selected])
+
+    ## Memory
+
+    def allowed(self, lanes, addresses):
+        allowed = self.privileged[lanes] | self.userPages[lanes, addresses >> 12]
+        if not allowed.all():
+            for lane, address in zip(lanes[~allowed], addresses[~allowed]):
+                self.fail(lane, accessException(address))
+        return allowed
+
+    def read(self, lanes, addresses):
+        """
+        Returns the words read by each lane and which lanes read them without raising
+        """
+        allowed = self.allowed(lanes, addresses)
+        device = allowed & (addresses >= KBSR)
+        plain = allowed & ~device
+        values = numpy.zeros(len(lanes), dtype=numpy.int64)
+        values[plain] = self.memory[lanes[plain], addresses[plain]]
+        for index in numpy.flatnonzero(device):
+            values[index] = self.readDevice(lanes[index], int(addresses[index]))
+        return values, allowed
+
+    def write(self, lanes, addresses, values):
+        allowed = self.allowed(lanes, addresses)
+        device = allowed & (addresses >= KBSR)
+        plain = allowed & ~device
+        self.memory[lanes[plain], addresses[plain]] = values[plain]
+        for index in numpy.flatnonzero(device):
+            self.writeDevice(lanes[index], int(addresses[index]), int(values[index]))
+
+    def readDevice(self, lane, address):
+        if address not in DEVICE_READS:
+            return self.memory[lane, address]
+        machine = self.machines[lane]
+        self.storeDevices(lane, machine)
+        value = machine.readDevice(address)
+        self.loadDevices(lane, machine)
+        return value
+
+    def writeDevice(self, lane, address, value):
+        if address not in DEVICE_WRITES:
+            self.memory[lane, address] = value
+            return
+        machine = self.machines[lane]
+        self.storeDevices(lane, machine)
+        self.devicesWritten = True
+        try:
+            machine.writeDevice(address, value)
+        except ExecutionException as e:
+            # Raised by the output callback (output limit)
+            self.fail(lane, e)
+        self.loadDevices(lane, machine)
+
+    def setRegister(self, lanes, dr, values):
+        self.registers[lanes, dr] = values
+        self.nzp[lanes] = numpy.where(values == 0, Z, numpy.where(values & 0x8000, N, P))
+
+    ## Instructions
+    # Each takes the lanes executing it, their instructions and their incremented PCs
+
+    def operands(self, lanes, instructions, subtract):
+        # Operands of ADD / SUB, AND and MUL, lanes with an undefined encoding are failed and dropped
+        immediate = (instructions & 0x20) != 0
+        mode = (instructions >> 3) & 0x3
+        defined = immediate | (mode == 0)
+        if subtract:
+            defined |= mode == 2
+        if not defined.all():
+            for lane, instruction in zip(lanes[~defined], instructions[~defined]):
+                self.fail(lane, ExecutionException('Undefined instruction: x{:04X}'.format(instruction)))
+            lanes, instructions, immediate = lanes[defined], instructions[defined], immediate[defined]
+        first = self.registers[lanes, (instructions >> 6) & 0x7]
+        second = numpy.where(immediate, extend(instructions, 5), self.registers[lanes, instructions & 0x7])
+        return lanes, instructions, first, second
+
+    def execBR(self, lanes, instructions, pc):
+        taken = ((instructions >> 9) & self.nzp[lanes]) != 0
+        self.pc[lanes[taken]] = ((pc + extend(instructions, 9)) & 0xFFFF)[taken]
+
+    def execADD(self, lanes, instructions, pc):
+        lanes, instructions, first, second = self.operands(lanes, instructions, True)
+        subtract = (instructions & 0x38) == 0x10
+        self.setRegister(lanes, (instructions >> 9) & 0x7,
+                         numpy.where(subtract, first - second, first + second) & 0xFFFF)
+
+    def execAND(self, lanes, instructions, pc):
+        lanes, instructions, first, second = self.operands(lanes, instructions, False)
+        self.setRegister(lanes, (instructions >> 9) & 0x7, first & second & 0xFFFF)
+
+    def execMUL(self, lanes, instructions, pc):
+        lanes, instructions, first, second = self.operands(lanes, instructions, False)
+        self.setRegister(lanes, (instructions >> 9) & 0x7, (first * second) & 0xFFFF)
+
+    def execNOT(self, lanes, instructions, pc):
+        self.setRegister(lanes, (instructions >> 9) & 0x7, ~self.registers[lanes, (instructions >> 6) & 0x7] & 0xFFFF)
+
+    def execLEA(self, lanes, instructions, pc):
+        self.setRegister(lanes, (instructions >> 9) & 0x7, (pc + extend(instructions, 9)) & 0xFFFF)
+
+    def load(self, lanes, instructions, addresses):
+        values, allowed = self.read(lanes, addresses)
+        self.setRegister(lanes[allowed], ((instructions >> 9) & 0x7)[allowed], values[allowed])
+
+    def execLD(self, lanes, instructions, pc):
+        self.load(lanes, instructions, (pc + extend(instructions, 9)) & 0xFFFF)
+
+    def execLDR(self, lanes, instructions, pc):
+        base = self.registers[lanes, (instructions >> 6) & 0x7]
+        self.load(lanes, instructions, (base + extend(instructions, 6)) & 0xFFFF)
+
+    def execLDI(self, lanes, instructions, pc):
+        pointers, allowed = self.read(lanes, (pc + extend(instructions, 9)) & 0xFFFF)
+        self.load(lanes[allowed], instructions[allowed], pointers[allowed])
+
+    def execST(self, lanes, instructions, pc):
+        self.write(lanes, (pc + extend(instructions, 9)) & 0xFFFF,
+                   self.registers[lanes, (instructions >> 9) & 0x7])
+
+    def execSTR(self, lanes, instructions, pc):
+        base = self.registers[lanes, (instructions >> 6) & 0x7]
+        self.write(lanes, (base + extend(instructions, 6)) & 0xFFFF, self.registers[lanes, (instructions >> 9) & 0x7])
+
+    def execSTI(self, lanes, instructions, pc):
+        pointers, allowed = self.read(lanes, (pc + extend(instructions, 9)) & 0xFFFF)
+        lanes, instructions = lanes[allowed], instructions[allowed]
+        self.write(lanes, pointers[allowed], self.registers[lanes, (instructions >> 9) & 0x7])
+
+    def execJSR(self, lanes, instructions, pc):
+        base = self.registers[lanes, (instructions >> 6) & 0x7]
+        target = numpy.where(instructions & 0x800, (pc + extend(instructions, 11)) & 0xFFFF, base)
+        self.registers[lanes, 7] = pc
+        self.pc[lanes] = target
+
+    def execJMP(self, lanes, instructions, pc):
+        # JMPT / RTT drop to user mode
+        self.privileged[lanes[(instructions & 0x1) != 0]] = False
+        self.pc[lanes] = self.registers[lanes, (instructions >> 6) & 0x7]
+
+    def execTRAP(self, lanes, instructions, pc):
+        self.privileged[lanes] = True
+        self.registers[lanes, 7] = pc
+        self.pc[lanes] = self.memory[lanes, instructions & 0xFF]
+
+    def execRTI(self, lanes, instructions, pc):
+        # Only ever reached at the end of an interrupt or exception handler, so done a lane at a time
+        for lane in lanes:
+            if not self.privileged[lane]:
+                self.fail(lane, ExecutionException('RTI can only be executed in privileged mode'))
+                continue
+            registers = self.registers[lane]
+            self.pc[lane] = self.memory[lane, registers[6]]
+            registers[6] = (registers[6] + 1) & 0xFFFF
+            psr = int(self.memory[lane, registers[6]])
+            self.privileged[lane] = bool(psr & 0x8000)
+            self.nzp[lane] = psr & 0x7
+            registers[6] = (registers[6] + 1) & 0xFFFF
@@ -0,0 +1,91 @@
+from array import array
+from bisect import bisect_left
+
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MEMORY_SIZE = 0x10000
+
+
+class ObjectException(Exception):
+    """
+    Raised for an object image that can't be loaded
+    """
+
+
+def decodeObject(data):
+    """
+    Decodes an object image (big-endian words, origin first) in one pass
+
+    Returns the origin and the words that follow it, as a uint16 array when numpy is
+    available and an array('H') otherwise.
+    """
+    count = len(data) // 2
+    if not count:
+        raise ObjectException('Empty object file')
+    if numpy is not None:
+        words = numpy.frombuffer(data, dtype='>u2', count=count).astype(numpy.uint16)
+    else:
+        words = array('H')
+        words.frombytes(data[:count * 2])
+        if sys.byteorder == 'little':
+            words.byteswap()
+    origin = int(words[0])
+    if origin + count - 1 > MEMORY_SIZE:
+        raise ObjectException('Object file extends past the end of memory')
+    return origin, words[1:]
+
+
+class MemoryImage:
+    """
+    A full 65536 word memory built from one or more object images
+
+    Keeps the ranges each image occupies so an image loading over another can be reported.
+    The later image wins, as it does in PennSim, so an overlap is a diagnostic rather than
+    an error.
+    """
+
+    def __init__(self):
+        if numpy is not None:
+            self.words = numpy.zeros(MEMORY_SIZE, dtype=numpy.uint16)
+        else:
+            self.words = array('H', bytes(MEMORY_SIZE * 2))
+        # Sorted (start, end, name) of the words each image loaded so far still holds
+        self.ranges = []
+
+    def overlaps(self, start, end):
+        index = bisect_left(self.ranges, (start,))
+        found = []
+        # The range before the insertion point can still reach into [start, end)
+        for other in self.ranges[max(0, index - 1):]:
+            if other[0] >= end:
+                break
+            if other[1] > start:
+                found.append(other)
+        return found
+
+    def load(self, data, name=''):
+        """
+        Copies an object image into memory
+
+        Returns the (start, end, name) ranges of earlier images it was loaded over.
+        """
+        origin, words = decodeObject(data)
+        end = origin + len(words)
+        overlapping = self.overlaps(origin, end)
+        self.words[origin:end] = words
+        # What is left of the ranges loaded over, either side of the new image
+        kept = [piece for start, stop, other in overlapping
+                for piece in ((start, min(stop, origin), other), (max(start, end), stop, other)) if piece[0] < piece[1]]
+        for other in overlapping:
+            self.ranges.remove(other)
+        for piece in kept + ([(origin, end, name)] if end > origin else []):
+            self.ranges.insert(bisect_left(self.ranges, piece[:1]), piece)
+        return overlapping
+
+    def tolist(self):
+        return self.words.tolist()
@@ -0,0 +1,616 @@
+from lc3.blocks import compileBlock, signExtend
+from lc3.loader import MEMORY_SIZE, decodeObject
+from lc3.traps import findTrapRoutines
+
+from collections import deque, namedtuple
+
+import time
+
+# Device registers as mapped by PennSim (see OS_KBSR, OS_DSR, ... in the OS symbol tables)
+KBSR = 0xFE00
+KBDR = 0xFE02
+DSR = 0xFE04
+DDR = 0xFE06
+TMR = 0xFE08
+TMI = 0xFE0A
+MPR = 0xFE12
+MCR = 0xFFFE
+
+# Writing one of these to TMI disables the timer or leaves it to be ticked by hand, which
+# PennSim does from the keyboard and the native engine doesn't model (see Machine's timer).
+TIMER_DISABLED = 0x0000
+TIMER_MANUAL = 0xFFFF
+
+OS_START = 0x0200
+# The OS and its trap and interrupt routines live in system space, below user space
+USER_START = 0x3000
+
+# The MPR has one bit per 4K page
+PAGES = 16
+
+N, Z, P = 4, 2, 1
+
+# Times an address has to be reached by run() before the block starting there is compiled
+HOT_BLOCK = 8
+
+# Instructions run between checks of run()'s deadline, a few tens of milliseconds
+TIME_SLICE = 100000
+
+# With livelock detection run() alternates LIVELOCK_SLICE instructions of normal running
+# with CYCLE_WINDOW instructions watching for the state it started them in to come back
+LIVELOCK_SLICE = 50000
+CYCLE_WINDOW = 5000
+
+
+class ExecutionException(Exception):
+    """
+    Raised when the running program does something PennSim would stop on
+    (undefined instruction, protected memory access, ...)
+    """
+
+
+class UnsupportedException(ExecutionException):
+    """
+    Raised when the program uses a device mode the native engine can't reproduce PennSim's
+    behaviour for
+    """
+
+
+def accessException(address):
+    return ExecutionException('IllegalMemAccessException accessing address x{:04X}\n'
+                              '(The MPR and PSR do not permit access to this address)'.format(address))
+
+
+# Machine state captured by Machine.snapshot, memory is held as an immutable tuple
+Snapshot = namedtuple('Snapshot', ['memory', 'registers', 'pc', 'psr', 'mpr', 'mcr', 'timerInterval', 'timerCount',
+                                   'instructionCount', 'keyboard'])
+
+
+class Machine:
+    """
+    In-process LC-3 machine
+
+    Implements the LC-3 variant simulated by the bundled PennSim.jar, including its
+    extensions (SUB, MUL, JMPT / RTT, MPR protection and the MCR clock). Console output
+    is passed to output as it is produced and keyboard input is taken from keyboard.
+    With detectLivelock, run() stops programs stuck in a loop that can never end.
+    """
+
+    def __init__(self, output=None):
+        self.output = output if output else lambda text: None
+        self.breakpoints = set()
+        self.keyboard = deque()
+        self.detectLivelock = False
+        # Values addresses held before their first write since findCycle started, None otherwise
+        self.writeLog = None
+        self.reset()
+
+    def reset(self):
+        self.memory = [0] * MEMORY_SIZE
+        self.decoded = [None] * MEMORY_SIZE
+        self.blocks = {}
+        self.blockCover = [None] * MEMORY_SIZE
+        self.heat = {}
+        self.fastTraps = {}
+        self.fastTrapCode = frozenset()
+        self.registers = [0] * 8
+        self.pc = OS_START
+        self.privileged = True
+        self.nzp = Z
+        self.mpr = 0
+        self.mcr = 0x8000
+        self.instructionCount = 0
+        self.timerInterval = TIMER_DISABLED
+        self.timerDue = None
+        self.keyboard.clear()
+
+    def snapshot(self):
+        return Snapshot(tuple(self.memory), tuple(self.registers), self.pc, self.psr, self.mpr, self.mcr,
+                        self.timerInterval, self.timerCount, self.instructionCount, tuple(self.keyboard))
+
+    def restore(self, snapshot):
+        """
+        Puts the machine back in a snapshotted state
+
+        Snapshots are never modified, so any number of machines can start from the same one.
+        Copying memory out of the tuple is a single bulk copy rather than a reload.
+        """
+        self.memory = list(snapshot.memory)
+        self.invalidate()
+        self.registers = list(snapshot.registers)
+        self.pc = snapshot.pc
+        self.psr = snapshot.psr
+        self.mpr = snapshot.mpr
+        self.mcr = snapshot.mcr
+        self.instructionCount = snapshot.instructionCount
+        self.timerInterval = snapshot.timerInterval
+        self.timerCount = snapshot.timerCount
+        self.keyboard.clear()
+        self.keyboard.extend(snapshot.keyboard)
+
+    @property
+    def psr(self):
+        return (0x8000 if self.privileged else 0) | self.nzp
+
+    @psr.setter
+    def psr(self, value):
+        self.privileged = bool(value & 0x8000)
+        self.nzp = value & 0x7
+
+    ## Timer
+    # Rather than being ticked every instruction the timer keeps the instruction count it
+    # next goes off at, timerDue (None while disabled or manual), and TMR reads compare it
+    # with instructionCount. Running costs nothing extra whatever the interval.
+    # Where this differs from PennSim: PennSim's interval is in milliseconds of wall-clock
+    # time, here it is in instructions, so how many polls a program makes between ticks
+    # (and any output that depends on it) can differ, though it is the same on every run.
+    # Manual mode, ticked by PennSim's keyboard, raises UnsupportedException instead.
+
+    @property
+    def ticking(self):
+        return self.timerInterval not in (TIMER_DISABLED, TIMER_MANUAL)
+
+    @property
+    def timerCount(self):
+        # Instructions since the timer last went off or was set, as the timer would have counted them
+        return 0 if self.timerDue is None else self.instructionCount - self.timerDue + self.timerInterval
+
+    @timerCount.setter
+    def timerCount(self, value):
+        # Relative to the current interval and instruction count, so those have to be set first
+        self.timerDue = self.instructionCount - value + self.timerInterval if self.ticking else None
+
+    @property
+    def mpr(self):
+        return self._mpr
+
+    @mpr.setter
+    def mpr(self, value):
+        # userPages[page] says whether user code may access the page, rebuilt only when the MPR changes
+        self._mpr = value
+        self.userPages = [bool((value >> page) & 1) for page in range(PAGES)]
+
+    @property
+    def halted(self):
+        return not self.mcr & 0x8000
+
+    def loadObject(self, path):
+        with open(path, 'rb') as objFile:
+            data = objFile.read()
+        return self.loadImage(data)
+
+    def loadImage(self, data):
+        """
+        Copies an object image (big-endian words, origin first) into memory
+
+        Returns the origin and length in words of the loaded image.
+        """
+        origin, words = decodeObject(data)
+        self.memory[origin:origin + len(words)] = words.tolist()
+        self.invalidate(origin, origin + len(words))
+        return origin, len(words)
+
+    def setCC(self, value):
+        if value == 0:
+            self.nzp = Z
+        elif value & 0x8000:
+            self.nzp = N
+        else:
+            self.nzp = P
+
+    def checkAccess(self, address):
+        if not self.privileged and not self.userPages[address >> 12]:
+            raise accessException(address)
+
+    def advance(self, count):
+        # Accounts for count instructions at once, used by compiled blocks
+        self.instructionCount += count
+
+    def read(self, address):
+        self.checkAccess(address)
+        if address >= KBSR:
+            return self.readDevice(address)
+        return self.memory[address]
+
+    def readDevice(self, address):
+        if address == KBSR:
+            return 0x8000 if self.keyboard else 0
+        if address == KBDR:
+            return self.keyboard.popleft() if self.keyboard else 0
+        if address == DSR:
+            return 0x8000
+        if address == TMR:
+            if self.timerDue is not None and self.instructionCount >= self.timerDue:
+                self.timerDue = self.instructionCount + self.timerInterval
+                return 0x8000
+            return 0
+        if address == TMI:
+            return self.timerInterval
+        if address == MPR:
+            return self.mpr
+        if address == MCR:
+            return self.mcr
+        return self.memory[address]
+
+    def write(self, address, value):
+        self.checkAccess(address)
+        if address >= KBSR:
+            self.writeDevice(address, value)
+        else:
+            if self.writeLog is not None and address not in self.writeLog:
+                self.writeLog[address] = self.memory[address]
+            self.memory[address] = value
+            self.decoded[address] = None
+            if self.blockCover[address] is not None:
+                self.dropBlocks(address)
+            if address in self.fastTrapCode:
+                self.removeFastTraps()
+
+    def writeDevice(self, address, value):
+        if address == DDR:
+            self.output(chr(value & 0xFF))
+        elif address == TMI:
+            if value == TIMER_MANUAL:
+                raise UnsupportedException('manual timer mode')
+            self.timerInterval = value
+            self.timerCount = 0
+        elif address == MPR:
+            self.mpr = value
+        elif address == MCR:
+            self.mcr = value
+        else:
+            if self.writeLog is not None and address not in self.writeLog:
+                self.writeLog[address] = self.memory[address]
+            self.memory[address] = value
+            self.decoded[address] = None
+            if self.blockCover[address] is not None:
+                self.dropBlocks(address)
+            if address in self.fastTrapCode:
+                self.removeFastTraps()
+
+    def step(self):
+        pc = self.pc
+        if not self.privileged and not self.userPages[pc >> 12]:
+            self.checkAccess(pc)
+        entry = self.decoded[pc]
+        if entry is None:
+            entry = self.decoded[pc] = self.decode(pc, self.memory[pc])
+        self.pc = (pc + 1) & 0xFFFF
+        self.instructionCount += 1
+        entry[0](*entry[1])
+
+    ## Decoding
+    # Each instruction is decoded once into a handler and its operands, with PC-relative
+    # addresses already worked out. Entries are dropped when their address is written to.
+
+    def invalidate(self, start=0, end=MEMORY_SIZE):
+        self.decoded[start:end] = [None] * (end - start)
+        if self.fastTraps and not self.fastTrapCode.isdisjoint(range(start, end)):
+            self.removeFastTraps()
+        if start == 0 and end == MEMORY_SIZE:
+            self.blocks.clear()
+            self.blockCover = [None] * MEMORY_SIZE
+            self.heat.clear()
+        else:
+            for address in range(start, end):
+                if self.blockCover[address] is not None:
+                    self.dropBlocks(address)
+
+    ## Compiled blocks
+    # Code reached often enough is compiled a basic block at a time (see lc3.blocks). blockCover
+    # maps each address to the starts of the blocks containing it so a store can drop them.
+
+    def compileBlock(self, start):
+        block = compileBlock(self.memory, start)
+        if block is not None:
+            self.blocks[start] = block
+            for address in range(block.start, block.end):
+                if self.blockCover[address] is None:
+                    self.blockCover[address] = set()
+                self.blockCover[address].add(start)
+        return block
+
+    def dropBlocks(self, address):
+        for start in self.blockCover[address]:
+            block = self.blocks.pop(start, None)
+            if block is None:
+                continue
+            for covered in range(block.start, block.end):
+                if covered != address and self.blockCover[covered] is not None:
+                    self.blockCover[covered].discard(start)
+            self.heat.pop(start, None)
+        self.blockCover[address] = None
+
+    ## Native trap routines
+    # Opt-in: recognised OS routines (see lc3.traps) run natively when their TRAP executes.
+    # Writing over any of their code drops them all until they are installed again.
+
+    def installFastTraps(self):
+        self.fastTraps = findTrapRoutines(self.memory)
+        self.fastTrapCode = frozenset().union(*(routine.addresses for routine in self.fastTraps.values()))
+
+    def removeFastTraps(self):
+        self.fastTraps = {}
+        self.fastTrapCode = frozenset()
+
+    def decode(self, address, instruction):
+        pc = (address + 1) & 0xFFFF
+        opcode = instruction >> 12
+        dr = (instruction >> 9) & 0x7
+        sr = (instruction >> 6) & 0x7
+        pcOffset9 = (pc + signExtend(instruction & 0x1FF, 9)) & 0xFFFF
+
+        if opcode == 0x0:
+            return self.execBR, ((instruction >> 9) & 0x7, pcOffset9)
+        if opcode == 0x1 or opcode == 0x5 or opcode == 0xD:
+            if instruction & 0x20:
+                operation = {0x1: self.execADDImmediate, 0x5: self.execANDImmediate, 0xD: self.execMULImmediate}
+                return operation[opcode], (dr, sr, signExtend(instruction & 0x1F, 5))
+            mode = (instruction >> 3) & 0x3
+            if mode == 0:
+                operation = {0x1: self.execADD, 0x5: self.execAND, 0xD: self.execMUL}
+                return operation[opcode], (dr, sr, instruction & 0x7)
+            if mode == 2 and opcode == 0x1:
+                return self.execSUB, (dr, sr, instruction & 0x7)
+        elif opcode == 0x2:
+            return self.execLD, (dr, pcOffset9)
+        elif opcode == 0x3:
+            return self.execST, (dr, pcOffset9)
+        elif opcode == 0x4:
+            if instruction & 0x800:
+                return self.execJSR, ((pc + signExtend(instruction & 0x7FF, 11)) & 0xFFFF,)
+            return self.execJSRR, (sr,)
+        elif opcode == 0x6:
+            return self.execLDR, (dr, sr, signExtend(instruction & 0x3F, 6))
+        elif opcode == 0x7:
+            return self.execSTR, (dr, sr, signExtend(instruction & 0x3F, 6))
+        elif opcode == 0x8:
+            return self.execRTI, ()
+        elif opcode == 0x9:
+            return self.execNOT, (dr, sr)
+        elif opcode == 0xA:
+            return self.execLDI, (dr, pcOffset9)
+        elif opcode == 0xB:
+            return self.execSTI, (dr, pcOffset9)
+        elif opcode == 0xC:
+            # JMP / RET, JMPT / RTT drop to user mode
+            return self.execJMP, (sr, instruction & 0x1)
+        elif opcode == 0xE:
+            return self.execLEA, (dr, pcOffset9)
+        elif opcode == 0xF:
+            return self.execTRAP, (instruction & 0xFF,)
+        return self.execUndefined, (instruction,)
+
+    ## Instructions
+
+    def execBR(self, mask, target):
+        if mask & self.nzp:
+            self.pc = target
+
+    def execADD(self, dr, sr, sr2):
+        registers = self.registers
+        value = registers[dr] = (registers[sr] + registers[sr2]) & 0xFFFF
+        self.nzp = Z if not value else N if value & 0x8000 else P
+
+    def execADDImmediate(self, dr, sr, immediate):
+        registers = self.registers
+        value = registers[dr] = (registers[sr] + immediate) & 0xFFFF
+        self.nzp = Z if not value else N if value & 0x8000 else P
+
+    def execSUB(self, dr, sr, sr2):
+        registers = self.registers
+        value = registers[dr] = (registers[sr] - registers[sr2]) & 0xFFFF
+        self.nzp = Z if not value else N if value & 0x8000 else P
+
+    def execAND(self, dr, sr, sr2):
+        registers = self.registers
+        value = registers[dr] = registers[sr] & registers[sr2]
+        self.nzp = Z if not value else N if value & 0x8000 else P
+
+    def execANDImmediate(self, dr, sr, immediate):
+        registers = self.registers
+        value = registers[dr] = registers[sr] & immediate & 0xFFFF
+        self.nzp = Z if not value else N if value & 0x8000 else P
+
+    def execMUL(self, dr, sr, sr2):
+        registers = self.registers
+        value = registers[dr] = (registers[sr] * registers[sr2]) & 0xFFFF
+        self.nzp = Z if not value else N if value & 0x8000 else P
+
+    def execMULImmediate(self, dr, sr, immediate):
+        registers = self.registers
+        value = registers[dr] = (registers[sr] * immediate) & 0xFFFF
+        self.nzp = Z if not value else N if value & 0x8000 else P
+
+    def execLD(self, dr, address):
+        value = self.registers[dr] = self.read(address)
+        self.setCC(value)
+
+    def execST(self, sr, address):
+        self.write(address, self.registers[sr])
+
+    def execJSR(self, target):
+        self.registers[7] = self.pc
+        self.pc = target
+
+    def execJSRR(self, base):
+        registers = self.registers
+        target = registers[base]
+        registers[7] = self.pc
+        self.pc = target
+
+    def execLDR(self, dr, base, offset):
+        registers = self.registers
+        value = registers[dr] = self.read((registers[base] + offset) & 0xFFFF)
+        self.setCC(value)
+
+    def execSTR(self, sr, base, offset):
+        registers = self.registers
+        self.write((registers[base] + offset) & 0xFFFF, registers[sr])
+
+    def execRTI(self):
+        if not self.privileged:
+            raise ExecutionException('RTI can only be executed in privileged mode')
+        registers = self.registers
+        self.pc = self.memory[registers[6]]
+        registers[6] = (registers[6] + 1) & 0xFFFF
+        self.psr = self.memory[registers[6]]
+        registers[6] = (registers[6] + 1) & 0xFFFF
+
+    def execNOT(self, dr, sr):
+        registers = self.registers
+        value = registers[dr] = ~registers[sr] & 0xFFFF
+        self.setCC(value)
+
+    def execLDI(self, dr, address):
+        value = self.registers[dr] = self.read(self.read(address))
+        self.setCC(value)
+
+    def execSTI(self, sr, address):
+        self.write(self.read(address), self.registers[sr])
+
+    def execJMP(self, base, user):
+        if user:
+            self.privileged = False
+        self.pc = self.registers[base]
+
+    def execLEA(self, dr, value):
+        self.registers[dr] = value
+        self.setCC(value)
+
+    def execTRAP(self, vector):
+        self.privileged = True
+        self.registers[7] = self.pc
+        self.pc = self.memory[vector]
+        if self.fastTraps:
+            routine = self.fastTraps.get(self.pc)
+            if routine is not None and self.breakpoints.isdisjoint(routine.addresses):
+                routine.run(self)
+
+    def execUndefined(self, instruction):
+        raise ExecutionException('Undefined instruction: x{:04X}'.format(instruction))
+
+    def run(self, limit=None, deadline=None):
+        """
+        Runs until the machine halts, a breakpoint is reached or limit instructions have executed
+
+        Returns 'halted', 'breakpoint' or 'limit'. ExecutionException is passed through.
+        A native trap routine runs to completion, so it can take the count past limit.
+        With a deadline (a time.monotonic() value) 'timeout' is returned once it has passed,
+        checked every TIME_SLICE instructions. With detectLivelock 'livelock' is returned
+        once findCycle sees the program can't stop, with the PC left on the loop.
+        """
+        if deadline is None and not self.detectLivelock:
+            return self.runFor(limit)
+        size = LIVELOCK_SLICE if self.detectLivelock else TIME_SLICE
+        watching = False
+        started = self.instructionCount
+        while True:
+            remaining = None if limit is None else limit - (self.instructionCount - started)
+            if remaining is not None and remaining <= size:
+                return self.findCycle(remaining) if watching else self.runFor(remaining)
+            reason = self.findCycle(CYCLE_WINDOW) if watching else self.runFor(size)
+            if reason != 'limit':
+                return reason
+            if deadline is not None and time.monotonic() >= deadline:
+                return 'timeout'
+            watching = self.detectLivelock and not watching
+
+    def cycleState(self):
+        # Everything besides memory that decides what the machine does next. Past its interval
+        # the timer's count makes no difference until TMR is read, which restarts it.
+        return (self.pc, tuple(self.registers), self.privileged, self.nzp, self.mpr, self.mcr, self.timerInterval,
+                min(self.timerCount, self.timerInterval))
+
+    def findCycle(self, limit):
+        """
+        Runs like runFor, returning 'livelock' if the machine comes back to the state it started in
+
+        Every time the starting PC is reached again the registers, flags, timer and everything
+        written since are compared with how they started. Only the keyboard comes from outside
+        the machine, so with none of it pending an exact repeat means the program loops forever.
+        """
+        if self.keyboard:
+            return self.runFor(limit)
+        anchor = self.pc
+        state = self.cycleState()
+        # A breakpoint already there belongs to the user and stops the run as usual
+        watched = anchor not in self.breakpoints
+        if watched:
+            self.breakpoints.add(anchor)
+        self.writeLog = {}
+        started = self.instructionCount
+        try:
+            while True:
+                reason = self.runFor(limit - (self.instructionCount - started))
+                if reason != 'breakpoint' or not watched or self.pc != anchor:
+                    return reason
+                memory = self.memory
+                if (self.cycleState() == state and
+                        all(memory[address] == value for address, value in self.writeLog.items())):
+                    return 'livelock'
+        finally:
+            if watched:
+                self.breakpoints.discard(anchor)
+            self.writeLog = None
+
+    def loopAddress(self):
+        """
+        Returns the submission's address for a livelock findCycle just reported
+
+        The PC is wherever the watch started, which can be inside an OS routine the program keeps
+        calling. Then the cycle is stepped through once more, silently, for the last PC on it in
+        user space, or, for a loop that never leaves the OS, the TRAP that R7 returns past.
+        The machine is left as it was.
+        """
+        if USER_START <= self.pc < KBSR:
+            return self.pc
+        snapshot = self.snapshot()
+        output = self.output
+        self.output = lambda text: None
+        fastTraps, fastTrapCode = self.fastTraps, self.fastTrapCode
+        state = self.cycleState()
+        address = None
+        try:
+            for _ in range(CYCLE_WINDOW):
+                if USER_START <= self.pc < KBSR:
+                    address = self.pc
+                self.step()
+                if self.cycleState() == state:
+                    break
+        except ExecutionException:
+            pass
+        finally:
+            self.output = output
+            self.restore(snapshot)
+            # Memory is as it was, so the routines found in it still are
+            self.fastTraps, self.fastTrapCode = fastTraps, fastTrapCode
+        return (self.registers[7] - 1) & 0xFFFF if address is None else address
+
+    def runFor(self, limit):
+        breakpoints = self.breakpoints
+        blocks = self.blocks
+        heat = self.heat
+        step = self.step
+        started = self.instructionCount
+        while True:
+            if self.halted:
+                return 'halted'
+            executed = self.instructionCount - started
+            if limit is not None and executed >= limit:
+                return 'limit'
+            pc = self.pc
+            block = blocks.get(pc)
+            if block is None:
+                heat[pc] = heat.get(pc, 0) + 1
+                if heat[pc] == HOT_BLOCK:
+                    block = self.compileBlock(pc)
+            # Blocks can't stop part way through for a breakpoint, the limit or an MPR violation
+            if (block is not None and (limit is None or executed + block.length <= limit) and
+                    (not breakpoints or breakpoints.isdisjoint(block.interior)) and
+                    (self.privileged or self.userPages[pc >> 12])):
+                block.function(self)
+            else:
+                step()
+            if self.pc in breakpoints:
+                return 'breakpoint'
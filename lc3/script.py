@@ -0,0 +1,526 @@
+from lc3.assembler import AssemblyCache, AssemblyException
+from lc3.lanes import MAX_LANES, LaneMachine
+from lc3.loader import MemoryImage, ObjectException, numpy
+from lc3.machine import Machine, ExecutionException, UnsupportedException, MEMORY_SIZE
+from lc3.symbols import SymbolTable, readSymbols
+
+import hashlib
+import os
+import re
+import time
+
+PROMPT = '==>'
+
+# '#' starts a comment at the start of a line or before whitespace, '#5' and '#-3' are decimal literals
+COMMENT = re.compile(r'^\s*#.*|#(?=\s|$).*')
+
+# Machine state right after an object was loaded into a freshly reset machine, by the object's SHA-256.
+# Scripts almost always start 'reset', 'ld <os>.obj', so each process only loads each OS once.
+bootSnapshots = {}
+BOOT_SNAPSHOT_LIMIT = 8
+
+# Shared by every run in the process, see setAssemblyCache
+assemblyCache = AssemblyCache()
+
+
+def stripComment(line):
+    return COMMENT.sub('', line, count=1)
+
+
+def setAssemblyCache(directory):
+    global assemblyCache
+    if assemblyCache.directory != directory:
+        assemblyCache = AssemblyCache(directory)
+
+
+class ScriptRunner:
+    """
+    Runs PennSim scripts against an in-process Machine
+
+    Understands the PennSim commands used by NSim scripts and writes a transcript in
+    the same shape as PennSim's CLI output ('==>' prompts, 'Bye!' on quit). Relative
+    paths are resolved against workingDir, the same as PennSim started in that directory.
+    With fastTraps, recognised OS trap routines are run natively after each load. With
+    keyboardInput, input commands queue it in place of the named file's contents. Objects
+    loaded over one another are noted in overlaps, which PennSim doesn't report, so they are
+    kept out of the transcript.
+
+    instructionLimit and timeLimit (seconds) are budgets for the whole script rather than for
+    each continue, the run is terminated once either is used up. With detectLivelock a
+    program found looping forever is terminated straight away instead.
+    """
+
+    def __init__(self, workingDir, instructionLimit=None, outputLimit=None, fastTraps=False, keyboardInput=None,
+                 timeLimit=None, detectLivelock=True):
+        self.workingDir = workingDir
+        self.instructionLimit = instructionLimit
+        self.deadline = None if timeLimit is None else time.monotonic() + timeLimit
+        # Instructions executed so far, counted against instructionLimit
+        self.executed = 0
+        self.outputLimit = outputLimit
+        self.fastTraps = fastTraps
+        self.keyboardInput = keyboardInput
+        self.outputSize = 0
+        self.transcript = []
+        self.machine = Machine(self.write)
+        self.machine.detectLivelock = detectLivelock
+        self.symbols = SymbolTable()
+        # What each load put where, and the loads that landed on an earlier one
+        self.image = MemoryImage()
+        self.overlaps = []
+        self.checksPassed = 0
+        self.checksFailed = 0
+        self.finished = False
+        self.verdict = None
+        # Set while nothing has touched the machine since it was last reset
+        self.fresh = True
+        # Result and output of a continue already run in lockstep, see runScripts
+        self.laneRun = None
+
+        self.commands = {
+            'reset': self.reset,
+            'ld': self.load, 'load': self.load,
+            'as': self.assemble,
+            'b': self.breakpoint, 'break': self.breakpoint,
+            'c': self.cont, 'continue': self.cont,
+            'n': self.next, 'next': self.next,
+            's': self.step, 'step': self.step,
+            'p': self.print, 'print': self.print,
+            'input': self.input,
+            'check': self.check,
+            'set': self.set,
+            'script': self.script,
+            'counters': self.counters,
+            'stop': lambda args: None,
+            'quit': self.quit,
+        }
+
+    def write(self, text):
+        self.outputSize += len(text)
+        if self.outputLimit is not None and self.outputSize > self.outputLimit:
+            if not self.finished:
+                self.verdict = 'Terminated (output limit)'
+                self.finished = True
+            raise ExecutionException('Output limit reached')
+        self.transcript.append(text)
+
+    def writeLine(self, text):
+        self.write(text + '\n')
+
+    @property
+    def output(self):
+        return ''.join(self.transcript)
+
+    def path(self, name):
+        return os.path.join(self.workingDir, name)
+
+    def run(self, script):
+        for line in script.splitlines():
+            if self.finished:
+                break
+            self.runCommand(line)
+        return self.output
+
+    def runCommand(self, line):
+        # Comments are allowed in scripts, same as PennSim
+        line = stripComment(line).strip()
+        if not line:
+            return
+        command, *args = line.split()
+        handler = self.commands.get(command.lower())
+        try:
+            self.writeLine('{} {}'.format(PROMPT, line))
+            if handler is None:
+                self.writeLine('Unknown command: {}'.format(command))
+            else:
+                handler(args)
+                self.fresh = handler == self.reset
+        except UnsupportedException as e:
+            # The run can't be compared with PennSim's, so it isn't carried on
+            if not self.finished:
+                self.verdict = 'Unsupported ({})'.format(e)
+                self.finished = True
+        except ExecutionException as e:
+            if not self.finished:
+                self.writeLine(e.args[0])
+        except OSError as e:
+            self.writeLine('Error: {}'.format(e))
+
+    def parseValue(self, token):
+        """
+        Parses PennSim's number formats (x3000, #10, 10) or a label
+        """
+        try:
+            if token[0] in 'xX':
+                return int(token[1:], 16) & 0xFFFF
+            if token[0] == '#':
+                return int(token[1:]) & 0xFFFF
+            return int(token, 0) & 0xFFFF
+        except ValueError:
+            if token in self.symbols:
+                return self.symbols[token]
+            raise ExecutionException('Error: Invalid register, address, or label (\'{}\')'.format(token))
+
+    ## Commands
+
+    def reset(self, args):
+        self.machine.reset()
+        self.machine.breakpoints.clear()
+        self.symbols.clear()
+        self.image = MemoryImage()
+        self.writeLine('System reset')
+
+    def load(self, args):
+        if not args:
+            raise ExecutionException('usage: l[oa]d <filename>')
+        name = args[0]
+        if not name.endswith('.obj'):
+            raise ExecutionException('Error: object filename \'{}\' does not end with .obj'.format(name))
+        try:
+            with open(self.path(name), 'rb') as objFile:
+                data = objFile.read()
+            self.loadImage(data)
+            for start, end, other in self.image.load(data, name):
+                self.overlaps.append('{} loaded over {} (x{:04X}-x{:04X})'.format(name, other, start, end - 1))
+            if self.fastTraps:
+                self.machine.installFastTraps()
+        except OSError:
+            raise ExecutionException('Error: Could not load object file \'{}\''.format(name))
+        except ObjectException as e:
+            raise ExecutionException('Error: {}'.format(e))
+        self.writeLine('Loaded object file \'{}\''.format(name))
+        symName = name[:-len('.obj')] + '.sym'
+        if os.path.exists(self.path(symName)):
+            self.symbols.update(readSymbols(self.path(symName)))
+            self.writeLine('Loaded symbol file \'{}\''.format(symName))
+
+    def loadImage(self, data):
+        if not self.fresh:
+            self.machine.loadImage(data)
+            return
+
+        key = hashlib.sha256(data).hexdigest()
+        snapshot = bootSnapshots.get(key)
+        if snapshot is not None:
+            self.machine.restore(snapshot)
+            return
+
+        self.machine.loadImage(data)
+        if len(bootSnapshots) >= BOOT_SNAPSHOT_LIMIT:
+            del bootSnapshots[next(iter(bootSnapshots))]
+        bootSnapshots[key] = self.machine.snapshot()
+
+    def assemble(self, args):
+        names = [arg for arg in args if not arg.startswith('-')]
+        if not names:
+            raise ExecutionException('usage: as [-warn] <filename>')
+        name = names[0]
+        if not name.endswith('.asm'):
+            raise ExecutionException('Input file must have .asm suffix (\'{}\')'.format(name))
+        try:
+            with open(self.path(name), encoding='utf-8', errors='replace') as asmFile:
+                source = asmFile.read()
+        except OSError as e:
+            raise ExecutionException('Couldn\'t read file ({})'.format(e))
+        try:
+            objData, symText = assemblyCache.assemble(source)
+        except AssemblyException as e:
+            self.writeLine(e.args[0])
+            raise ExecutionException('Errors encountered during assembly.')
+
+        base = name[:-len('.asm')]
+        with open(self.path(base + '.obj'), 'wb') as objFile:
+            objFile.write(objData)
+        with open(self.path(base + '.sym'), 'w') as symFile:
+            symFile.write(symText)
+        self.writeLine('Assembly of \'{}\' completed without errors or warnings.'.format(name))
+
+    def breakpoint(self, args):
+        if len(args) != 2 or args[0].lower() not in ('set', 'clear'):
+            raise ExecutionException('usage: b[reak] [ set | clear ] [ mem_addr | label ]')
+        address = self.parseValue(args[1])
+        if args[0].lower() == 'set':
+            self.machine.breakpoints.add(address)
+            self.writeLine('Breakpoint set at x{:04X}'.format(address))
+        else:
+            self.machine.breakpoints.discard(address)
+            self.writeLine('Breakpoint cleared at x{:04X}'.format(address))
+
+    def execute(self, limit):
+        machine = self.machine
+        # continue restarts the clock if the machine was halted, like PennSim
+        machine.mcr |= 0x8000
+        if self.laneRun is not None:
+            reason, output = self.laneRun
+            self.laneRun = None
+            for text in output:
+                self.write(text)
+            if isinstance(reason, ExecutionException):
+                raise reason
+        else:
+            started = machine.instructionCount
+            try:
+                reason = machine.run(limit, self.deadline)
+            finally:
+                self.executed += machine.instructionCount - started
+        if reason == 'breakpoint':
+            self.writeLine('Hit breakpoint at x{:04X}'.format(machine.pc))
+        elif reason == 'halted':
+            self.writeLine('Stopped at x{:04X}'.format(machine.pc))
+        return reason
+
+    @property
+    def remainingInstructions(self):
+        if self.instructionLimit is None:
+            return None
+        return max(0, self.instructionLimit - self.executed)
+
+    def cont(self, args):
+        reason = self.execute(self.remainingInstructions)
+        if reason == 'limit':
+            self.verdict = 'Terminated (instruction limit)'
+            self.finished = True
+        elif reason == 'timeout':
+            self.verdict = 'Terminated (time limit)'
+            self.finished = True
+        elif reason == 'livelock':
+            self.verdict = 'Terminated (livelock at {})'.format(self.symbols.symbolize(self.machine.loopAddress()))
+            self.finished = True
+
+    def next(self, args):
+        # Runs over subroutine calls and traps by stopping at the following instruction
+        machine = self.machine
+        instruction = machine.memory[machine.pc]
+        if instruction >> 12 in (0x4, 0xF):
+            following = (machine.pc + 1) & 0xFFFF
+            temporary = following not in machine.breakpoints
+            machine.breakpoints.add(following)
+            try:
+                self.cont(args)
+            finally:
+                if temporary:
+                    machine.breakpoints.discard(following)
+        else:
+            self.step(args)
+
+    def step(self, args):
+        self.machine.step()
+        self.executed += 1
+
+    def print(self, args):
+        machine = self.machine
+        self.writeLine(' '.join('R{} x{:04X}'.format(i, value) for i, value in enumerate(machine.registers)))
+        self.writeLine('PC = x{:04X}'.format(machine.pc))
+        self.writeLine('MPR = x{:04X}'.format(machine.mpr))
+        self.writeLine('PSR = x{:04X}'.format(machine.psr))
+        self.writeLine('CC = {}'.format({4: 'N', 2: 'Z', 1: 'P'}.get(machine.nzp, '')))
+
+    def input(self, args):
+        if args and self.keyboardInput is not None:
+            self.machine.keyboard.extend(self.keyboardInput)
+            self.writeLine('Keyboard input file \'{}\' enabled'.format(args[0]))
+            return
+        if not args or not os.path.exists(self.path(args[0])):
+            raise ExecutionException('Error: file {} does not exist.'.format(args[0] if args else ''))
+        with open(self.path(args[0]), 'rb') as inputFile:
+            self.machine.keyboard.extend(inputFile.read())
+        self.writeLine('Keyboard input file \'{}\' enabled'.format(args[0]))
+
+    def lookup(self, target):
+        machine = self.machine
+        upper = target.upper()
+        if upper == 'PC':
+            return machine.pc
+        if upper == 'PSR':
+            return machine.psr
+        if upper == 'MPR':
+            return machine.mpr
+        if re.match(r'^R[0-7]$', upper):
+            return machine.registers[int(upper[1])]
+        return machine.memory[self.parseValue(target)]
+
+    def check(self, args):
+        if args and args[0] == 'count':
+            self.writeLine('{} checks passed, {} failed'.format(self.checksPassed, self.checksFailed))
+            return
+        if args and args[0] == 'reset':
+            self.checksPassed = self.checksFailed = 0
+            self.writeLine('check counts reset')
+            return
+        if len(args) == 1 and args[0].upper() in ('N', 'Z', 'P'):
+            passed = self.machine.nzp == {'N': 4, 'Z': 2, 'P': 1}[args[0].upper()]
+            actual = None
+        elif len(args) == 2:
+            actual = self.lookup(args[0])
+            passed = actual == self.parseValue(args[1])
+        else:
+            raise ExecutionException('usage: check [ PC | reg | PSR | MPR | mem_addr | label | N | Z | P ] '
+                                     '[ value | label ]')
+        if passed:
+            self.checksPassed += 1
+            self.writeLine('TRUE')
+        else:
+            self.checksFailed += 1
+            if actual is None:
+                self.writeLine('FALSE')
+            else:
+                self.writeLine('FALSE (actual value: x{:04X})'.format(actual))
+
+    def set(self, args):
+        machine = self.machine
+        if len(args) != 2:
+            raise ExecutionException('usage: set [ PC | reg | PSR | MPR | mem_addr | label ] [ value ]')
+        target, value = args[0].upper(), self.parseValue(args[1])
+        if target == 'PC':
+            machine.pc = value
+        elif target == 'PSR':
+            machine.psr = value
+        elif target == 'MPR':
+            machine.mpr = value
+        elif re.match(r'^R[0-7]$', target):
+            machine.registers[int(target[1])] = value
+        else:
+            address = self.parseValue(args[0])
+            if address >= MEMORY_SIZE:
+                raise ExecutionException('Address x{:04X} out of bounds'.format(address))
+            machine.memory[address] = value
+            machine.invalidate(address, address + 1)
+            self.writeLine('Memory location x{:04X} updated to x{:04X}'.format(address, value))
+
+    def script(self, args):
+        if not args:
+            raise ExecutionException('usage: script <filename>')
+        with open(self.path(args[0])) as scriptFile:
+            for line in scriptFile.read().splitlines():
+                if self.finished:
+                    break
+                self.runCommand(line)
+
+    def counters(self, args):
+        self.writeLine('Instruction count: {}'.format(self.machine.instructionCount))
+
+    def quit(self, args):
+        self.writeLine('Bye!')
+        self.finished = True
+
+
+def runScript(workingDir, script, instructionLimit=None, outputLimit=None, assemblyCacheDir=None, fastTraps=False,
+              timeLimit=None):
+    """
+    Runs script in workingDir and returns the transcript and verdict (None if it ran to completion)
+
+    Module level so it can be handed to a process pool.
+    """
+    if assemblyCacheDir is not None:
+        setAssemblyCache(assemblyCacheDir)
+    runner = ScriptRunner(workingDir, instructionLimit, outputLimit, fastTraps, timeLimit=timeLimit)
+    output = runner.run(script)
+    return output, runner.verdict
+
+
+def runScripts(workingDirs, script, instructionLimit=None, outputLimit=None, assemblyCacheDir=None, timeLimit=None):
+    """
+    Runs the same script in each of workingDirs and returns a (transcript, verdict) pair for each
+
+    script is either one script or one per working directory, differing only in file names.
+    The scripts are stepped through together and every top-level continue is run on a
+    LaneMachine, so each transcript is the same as runScript would produce on its own.
+    Module level so it can be handed to a process pool.
+    """
+    if assemblyCacheDir is not None:
+        setAssemblyCache(assemblyCacheDir)
+    runners = [ScriptRunner(workingDir, instructionLimit, outputLimit, timeLimit=timeLimit)
+               for workingDir in workingDirs]
+    return runLockstep(runners, perRunner(script, len(runners)))
+
+
+def runInputs(workingDir, script, inputs, instructionLimit=None, outputLimit=None, assemblyCacheDir=None,
+              timeLimit=None):
+    """
+    Runs script in workingDir once per keyboard input and returns a (transcript, verdict) pair for each
+
+    Each run's input commands queue its entry of inputs (bytes) instead of reading the named
+    file. The runs are continued in lockstep like runScripts. Module level so it can be handed
+    to a process pool.
+    """
+    if assemblyCacheDir is not None:
+        setAssemblyCache(assemblyCacheDir)
+    runners = [ScriptRunner(workingDir, instructionLimit, outputLimit, keyboardInput=data, timeLimit=timeLimit)
+               for data in inputs]
+    return runLockstep(runners, perRunner(script, len(runners)))
+
+
+def perRunner(script, count):
+    return [script] * count if isinstance(script, str) else script
+
+
+def runLockstep(runners, scripts):
+    # The scripts only differ in file names, so they line up line for line
+    for lines in zip(*(script.splitlines() for script in scripts)):
+        running = [(runner, line) for runner, line in zip(runners, lines) if not runner.finished]
+        command = stripComment(lines[0]).split()
+        if numpy is not None and len(running) > 1 and command and command[0].lower() in ('c', 'continue'):
+            runLanes([runner for runner, _ in running], stripComment(lines[0]).strip())
+        for runner, line in running:
+            runner.runCommand(line)
+    return [(runner.output, runner.verdict) for runner in runners]
+
+
+def runLanes(runners, line):
+    # Output is held back until each runner's own continue writes it, after the command's prompt
+    outputs = []
+    started = []
+    for runner in runners:
+        output = []
+        runner.machine.mcr |= 0x8000
+        runner.machine.output = laneOutput(output, runner, len('{} {}\n'.format(PROMPT, line)))
+        outputs.append(output)
+        started.append(runner.machine.instructionCount)
+    # Runners in a group share their budgets, so they all have a limit or none do
+    limits = [runner.remainingInstructions for runner in runners]
+    deadlines = [runner.deadline for runner in runners if runner.deadline is not None]
+    deadline = min(deadlines) if deadlines else None
+
+    results = []
+    for start in range(0, len(runners), MAX_LANES):
+        group = slice(start, start + MAX_LANES)
+        results += LaneMachine([runner.machine for runner in runners[group]]).run(
+            None if limits[0] is None else limits[group], deadline)
+    for runner, result, output, count in zip(runners, results, outputs, started):
+        runner.machine.output = runner.write
+        runner.executed += runner.machine.instructionCount - count
+        runner.laneRun = result, output
+
+
+def laneOutput(output, runner, prompt):
+    # Stops a lane as soon as its output would take the runner past its output limit
+    remaining = None if runner.outputLimit is None else runner.outputLimit - runner.outputSize - prompt
+    written = [0]
+
+    def write(text):
+        output.append(text)
+        written[0] += len(text)
+        if remaining is not None and written[0] > remaining:
+            raise ExecutionException('Output limit reached')
+    return write
+
+
+def preassemble(path, assemblyCacheDir=None):
+    """
+    Assembles the source at path into the shared assembly cache
+
+    Returns the assembler's error message, or None if it assembled. Module level so it can be
+    handed to a process pool.
+    """
+    if assemblyCacheDir is not None:
+        setAssemblyCache(assemblyCacheDir)
+    try:
+        with open(path, encoding='utf-8', errors='replace') as asmFile:
+            source = asmFile.read()
+    except OSError as e:
+        return 'Couldn\'t read file ({})'.format(e)
+    try:
+        assemblyCache.assemble(source)
+    except AssemblyException as e:
+        return e.args[0]
+    return None
@@ -0,0 +1,93 @@
+from bisect import bisect_right
+
+import hashlib
+import re
+
+# Lines of the form '//	LABEL    ADDRESS' in a PennSim .sym file
+SYMBOL_LINE = re.compile(r'^//\s+(\S+)\s+([0-9A-Fa-f]{4})\s*$')
+
+
+class SymbolTable:
+    """
+    Labels from a .sym file, indexed both ways
+
+    names maps a label to its address. addresses and labels are parallel lists sorted by
+    address, so the label enclosing any address is found with a bisect.
+    """
+
+    def __init__(self, names=None):
+        self.names = dict(names) if names else {}
+        self.index()
+
+    def index(self):
+        pairs = sorted((address, name) for name, address in self.names.items())
+        self.addresses = [address for address, _ in pairs]
+        self.labels = [name for _, name in pairs]
+
+    def update(self, other):
+        if not self.names:
+            # Nothing to merge with, other's sorted lists can be shared since index() replaces them
+            self.names.update(other.names)
+            self.addresses, self.labels = other.addresses, other.labels
+            return
+        self.names.update(other.names)
+        self.index()
+
+    def clear(self):
+        self.names.clear()
+        self.index()
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __getitem__(self, name):
+        return self.names[name]
+
+    def __len__(self):
+        return len(self.names)
+
+    def nearest(self, address):
+        """
+        Returns the closest label at or before address and the offset from it, or None
+        """
+        index = bisect_right(self.addresses, address)
+        if not index:
+            return None
+        return self.labels[index - 1], address - self.addresses[index - 1]
+
+    def symbolize(self, address):
+        # 'LABEL', 'LABEL+3' or 'x3004' when nothing precedes address
+        found = self.nearest(address)
+        if found is None:
+            return 'x{:04X}'.format(address)
+        label, offset = found
+        return '{}+{}'.format(label, offset) if offset else label
+
+
+def parseSymbols(text):
+    names = {}
+    for line in text.splitlines():
+        match = SYMBOL_LINE.match(line)
+        # '$' entries mark the addresses holding instructions, they aren't labels
+        if match and match.group(1) != '$':
+            names[match.group(1)] = int(match.group(2), 16)
+    return SymbolTable(names)
+
+
+# Parsed tables by the SHA-256 of the file they came from
+tableCache = {}
+
+
+def readSymbols(path):
+    """
+    Parses the .sym file at path, reusing the table parsed from any file with the same contents
+
+    The cached table is returned as is, callers merge it into their own table rather than
+    changing it.
+    """
+    with open(path, 'rb') as symFile:
+        data = symFile.read()
+    contentHash = hashlib.sha256(data).hexdigest()
+    if contentHash not in tableCache:
+        tableCache[contentHash] = parseSymbols(data.decode('utf-8', errors='replace'))
+    return tableCache[contentHash]
@@ -0,0 +1,255 @@
+from lc3.blocks import signExtend
+
+import hashlib
+
+
+def fingerprint(words):
+    """
+    Hash of a routine's code with the PC-relative offsets of LD, ST, LDI, STI and LEA masked
+
+    The bundled OS images lay their data out slightly differently, so the same routine
+    only differs in those offsets between lc3os, p2os and p3os.
+    """
+    masked = [word & 0xFE00 if word >> 12 in (0x2, 0x3, 0xA, 0xB, 0xE) else word for word in words]
+    return hashlib.sha256(' '.join('{:04X}'.format(word) for word in masked).encode()).hexdigest()
+
+
+def target(memory, address):
+    # Address a PC-relative LD / ST / LEA at address refers to
+    return (address + 1 + signExtend(memory[address] & 0x1FF, 9)) & 0xFFFF
+
+
+class TrapRoutine:
+    """
+    Native stand-in for an OS trap routine
+
+    run is called right after the TRAP has jumped to the routine. It has to leave the machine
+    exactly as the routine would have: the same output, registers, condition codes, memory
+    (the OS's saved registers) and instruction count. It returns False to have the routine
+    run normally instead.
+    """
+
+    length = 0
+    fingerprint = None
+
+    def __init__(self, memory, start):
+        self.start = start
+        self.addresses = frozenset(range(start, start + self.length))
+
+    def finish(self, machine, count):
+        # Every routine returns with JMP R7 after restoring R7 with LD, which sets the condition codes
+        machine.advance(count)
+        machine.setCC(machine.registers[7])
+        machine.pc = machine.registers[7]
+
+
+class OutRoutine(TrapRoutine):
+    length = 6
+    fingerprint = '880bf4d865923980e3f3f642c21a5329dd139a838cb3afba3f58e19ff9e4dc6d'
+    # ST, LDI, BRzp (the display is always ready), STI, LD, JMP
+    instructions = 6
+
+    def __init__(self, memory, start):
+        super(OutRoutine, self).__init__(memory, start)
+        self.saveR1 = target(memory, start)
+
+    def out(self, machine, char):
+        machine.write(self.saveR1, machine.registers[1])
+        machine.output(chr(char & 0xFF))
+
+    def run(self, machine):
+        self.out(machine, machine.registers[0])
+        machine.advance(self.instructions)
+        machine.setCC(machine.registers[1])
+        machine.pc = machine.registers[7]
+        return True
+
+
+class NestedOutRoutine(TrapRoutine):
+    """
+    Routines that print through TRAP x21, only handled natively when that is the native OUT too
+    """
+
+    def nestedOut(self, machine):
+        routine = machine.fastTraps.get(machine.memory[0x21])
+        if isinstance(routine, OutRoutine) and machine.breakpoints.isdisjoint(routine.addresses):
+            return routine
+        return None
+
+    def outCall(self, machine, out, char, returnAddress):
+        machine.registers[7] = returnAddress
+        out.out(machine, char)
+
+
+class PutsRoutine(NestedOutRoutine):
+    length = 13
+    fingerprint = 'a701b425e79a8cd43552117323f40aafa0228a1def7dd1647ab0d7e1675a8497'
+
+    def __init__(self, memory, start):
+        super(PutsRoutine, self).__init__(memory, start)
+        self.saveR0 = target(memory, start)
+        self.saveR1 = target(memory, start + 1)
+        self.saveR7 = target(memory, start + 2)
+
+    def run(self, machine):
+        out = self.nestedOut(machine)
+        if out is None:
+            return False
+        registers = machine.registers
+        saved = registers[0], registers[1], registers[7]
+        machine.write(self.saveR0, registers[0])
+        machine.write(self.saveR1, registers[1])
+        machine.write(self.saveR7, registers[7])
+
+        # ST x3, ADD, then per character LDR, BRz, TRAP, ADD, BRnzp and the end LDR, BRz, LD x3, JMP
+        count = 4
+        pointer = registers[0]
+        while True:
+            char = machine.read(pointer)
+            if not char:
+                break
+            registers[1] = pointer
+            self.outCall(machine, out, char, (self.start + 7) & 0xFFFF)
+            count += 5 + out.instructions
+            pointer = (pointer + 1) & 0xFFFF
+        registers[0], registers[1], registers[7] = saved
+        self.finish(machine, count + 6)
+        return True
+
+
+class PutspRoutine(NestedOutRoutine):
+    length = 31
+    fingerprint = '46e91d9c88ea31f434f3e86c9bcef89bdddeefca4afdd2a5bc26f2be53134a73'
+
+    def __init__(self, memory, start):
+        super(PutspRoutine, self).__init__(memory, start)
+        self.saves = [target(memory, start + i) for i in range(5)]
+        self.lowMask = target(memory, start + 7)
+
+    def run(self, machine):
+        out = self.nestedOut(machine)
+        if out is None:
+            return False
+        registers = machine.registers
+        saved = registers[0], registers[1], registers[2], registers[3], registers[7]
+        for address, value in zip(self.saves, saved):
+            machine.write(address, value)
+
+        # ST x5, ADD
+        count = 6
+        pointer = registers[0]
+        while True:
+            word = machine.read(pointer)
+            low = machine.read(self.lowMask) & word
+            # LDR, LD, AND, BRz
+            count += 4
+            if not low:
+                break
+            registers[1] = pointer
+            self.outCall(machine, out, low, (self.start + 11) & 0xFFFF)
+            # TRAP, AND, ADD, then ADD, ADD, BRzp, ADD, ADD, BRp per bit plus an ADD for each set bit
+            count += 1 + out.instructions + 2 + 8 * 6 + bin(word >> 8).count('1')
+            high = word >> 8
+            # ADD, BRz
+            count += 2
+            if not high:
+                break
+            self.outCall(machine, out, high, (self.start + 23) & 0xFFFF)
+            # TRAP, ADD, BRnzp
+            count += 1 + out.instructions + 2
+            pointer = (pointer + 1) & 0xFFFF
+        registers[0], registers[1], registers[2], registers[3], registers[7] = saved
+        # LD x5, JMP
+        self.finish(machine, count + 6)
+        return True
+
+
+class PrintnRoutine(NestedOutRoutine):
+    length = 46
+    fingerprint = '199eddb39a56465e87d1ac219ce2d7f869130a303058a39bc47e5800bc7e6c36'
+
+    def __init__(self, memory, start):
+        super(PrintnRoutine, self).__init__(memory, start)
+        self.saves = [target(memory, start + i) for i in range(6)]
+        self.bottom = target(memory, start + 13)
+        self.zero = target(memory, start + 16)
+        self.minus = target(memory, start + 32)
+
+    def run(self, machine):
+        registers = machine.registers
+        # The routine never finishes dividing -32768, leave that to the real thing
+        out = self.nestedOut(machine)
+        if out is None or registers[0] == 0x8000:
+            return False
+        saved = registers[0], registers[1], registers[2], registers[3], registers[5], registers[7]
+        for address, value in zip(self.saves, saved):
+            machine.write(address, value)
+
+        # ST x6, AND, ADD, BRzp (+ ADD, NOT, ADD for negatives), AND, LEA
+        value = registers[0]
+        negative = bool(value & 0x8000)
+        count = 11
+        if negative:
+            value = (-value) & 0xFFFF
+            count += 3
+
+        # Digits are stored least significant first, below the bottom of the stack
+        pointer = self.bottom
+        zero = machine.read(self.zero)
+        while True:
+            quotient, digit = divmod(value, 10)
+            # ADD, BRzp, ADD, BRnzp per subtraction, then ADD, BRzp, LD, ADD, ADD, STR, BRnzp, ADD, BRz
+            count += 5 * quotient + 9
+            pointer = (pointer - 1) & 0xFFFF
+            machine.write(pointer, (digit + zero) & 0xFFFF)
+            if not quotient:
+                break
+            # ADD, AND, BRnzp
+            count += 3
+            value = quotient
+
+        # LD, ADD, BRz
+        count += 3
+        returnAddress = (self.start + 34) & 0xFFFF
+        if negative:
+            registers[1] = pointer
+            self.outCall(machine, out, machine.read(self.minus), returnAddress)
+            count += 2 + out.instructions
+        while True:
+            char = machine.read(pointer)
+            # LDR, BRz
+            count += 2
+            if not char:
+                break
+            pointer = (pointer + 1) & 0xFFFF
+            registers[1] = pointer
+            self.outCall(machine, out, char, (self.start + 38) & 0xFFFF)
+            # ADD, TRAP, BRnzp
+            count += 3 + out.instructions
+
+        registers[0], registers[1], registers[2], registers[3], registers[5], registers[7] = saved
+        # LD x6, JMP
+        self.finish(machine, count + 7)
+        return True
+
+
+ROUTINES = [OutRoutine, PutsRoutine, PutspRoutine, PrintnRoutine]
+
+
+def findTrapRoutines(memory):
+    """
+    Returns the routines that can be run natively, by start address
+
+    Each trap vector's target is checked against the fingerprints of the bundled OS
+    routines, so anything modified or unknown keeps running instruction by instruction.
+    """
+    routines = {}
+    for vector in range(0x100):
+        start = memory[vector]
+        if start in routines:
+            continue
+        for routine in ROUTINES:
+            if fingerprint(memory[start:start + routine.length]) == routine.fingerprint:
+                routines[start] = routine(memory, start)
+                break
+    return routines
@@ -1,14 +1,18 @@
 import os, sys
 
-from PySide2.QtCore import QObject, Slot, Signal, QStandardPaths, QFileInfo, QProcess, QTextStream, QTimer
+from PySide2.QtCore import QObject, Slot, Signal, QStandardPaths, QFileInfo, QProcess
 from PySide2.QtWidgets import QApplication, QMessageBox
 
 from resources.manager import ResourceManager
 from resources.available import Resources
+from runner.budget import DEFAULT_BUDGET, parseBudget, timeoutMs
+from runner.cache import ResultCache
+from runner.pool import PennSimWorkerPool, PooledPennSimJob
+from runner.preassembly import PreAssembler, assemblesProgram
+from runner.scheduler import Backend, JobScheduler, NativeJob, PennSimJob
+from runner.walk import DirectoryIndex, findWorkingDirs
 from ui.nmainwindow import NSimMainWindow
 
-import resources.generated
-
 
 class NSim(QObject):
     pennSimScript_started = Signal()
@@ -30,8 +34,24 @@ class NSim(QObject):
         self.mainWindow.runPennSim[QFileInfo].connect(self.pennSim)
         self.mainWindow.show()
 
-        # Place this in a QThread that's not started till runButton clicked? Then can terminate QThread
-        # to stop processing all files when runAll is checked
+        # Scripted runs are queued here and run up to maxJobs at a time
+        self.scheduler = JobScheduler()
+        self.scheduler.started.connect(self.pennSimScript_started)
+        self.scheduler.finished.connect(self.scheduler_finished)
+        self.scheduler.output.connect(self.pennSimScript_output)
+        self.scheduler.jobFinished.connect(self.job_finished)
+        self.mainWindow.setJobLimit(self.scheduler.maxJobs)
+        self.mainWindow.jobLimitChanged.connect(self.scheduler.setMaxJobs)
+        self.backend = Backend.PennSim
+        self.mainWindow.backendChanged.connect(self.setBackend)
+        self.preAssemble = True
+        self.mainWindow.preAssembleChanged.connect(self.setPreAssemble)
+        # Limits for each scripted run, scripts can override them with a '# budget:' comment
+        self.budget = DEFAULT_BUDGET
+        self.mainWindow.setBudget(self.budget)
+        self.mainWindow.timeLimitChanged.connect(self.setTimeLimit)
+        self.mainWindow.instructionLimitChanged.connect(self.setInstructionLimit)
+
         self.pennSimScript_started.connect(self.mainWindow.pennSimScript_started)
         self.pennSimScript_finished.connect(self.mainWindow.pennSimScript_finished)
         self.pennSimScript_output.connect(self.mainWindow.pennSimScript_output)
@@ -44,42 +64,101 @@ class NSim(QObject):
             QMessageBox.warning(self.mainWindow, 'Temporary Directory Unavailable',
                                 'Could not create temporary directory')
 
+        # CLI mode scripts are fed to long-lived PennSim processes rather than starting one per test
+        self.workerPool = PennSimWorkerPool(self.resources, self.javaBin, self.scheduler.maxJobs)
+        self.mainWindow.jobLimitChanged.connect(self.workerPool.setSize)
+
+        # Results of unchanged runs are replayed from here instead of running them again
+        self.resultCache = ResultCache(os.path.join(QStandardPaths.writableLocation(QStandardPaths.CacheLocation),
+                                                    'results'))
+        # Run All assembles every submission first so ones that don't assemble never take up a run
+        self.preAssembler = PreAssembler()
+        self.preAssembler.assembled.connect(self.preAssembler_assembled)
+        self.preAssembler.failed.connect(self.preAssembler_failed)
+        self.preAssembler.finished.connect(self.scheduler_finished)
+        self.preAssembled = {}
+
+        self.directoryIndex = DirectoryIndex(os.path.join(QStandardPaths.writableLocation(
+            QStandardPaths.CacheLocation), 'directories.json'))
+
     @Slot(QFileInfo, QFileInfo, str, bool)
     def pennSimScript(self, workingDir, pennSimOS, script, cliMode):
-        self.scriptProcess = QProcess(self)
-        self.scriptProcess.setWorkingDirectory(workingDir.absoluteFilePath())
-        self.scriptProcess.workingFiles = []
-        self.scriptProcess.workingFiles.extend(self.resources.createLocalOS(pennSimOS, workingDir))
-        self.scriptProcess.workingFiles.append(self.resources.createLocalFromContents(script, workingDir))
-
-        args = ['-jar', self.resources.pennSim.absoluteFilePath(), '-s',
-                self.resources.createTemporaryFromContents(script).absoluteFilePath()]
-
-        if cliMode:
-            args.append('-t')
-            # Start a 30 second timer before terminating the process. Should really be adjustable
-            QTimer.singleShot(30000, self.pennSimScriptProcess_terminated)
-        self.scriptProcess.setArguments(args)
-        self.scriptProcess.started.connect(self.pennSimScriptProcess_started)
-        self.scriptProcess.finished.connect(self.pennSimScriptProcess_finished)
-        self.startPennSim(self.scriptProcess)
+        budget = parseBudget(script, self.budget)
+        # Only runs that produce CLI output have anything worth caching
+        key = None
+        if cliMode or self.backend is Backend.Native:
+            key = self.resultKey(workingDir, pennSimOS, script, budget)
+        cached = self.resultCache.get(key)
+        if cached is not None:
+            self.pennSimScript_output.emit('Results for: {}\n{}'.format(workingDir.absoluteFilePath(), cached))
+            return
+
+        if self.backend is Backend.Native:
+            job = NativeJob(self.resources, workingDir, pennSimOS, script, budget)
+        elif cliMode:
+            job = PooledPennSimJob(self.resources, self.workerPool, workingDir, pennSimOS, script, timeoutMs(budget))
+        else:
+            job = PennSimJob(self.resources, self.javaBin, workingDir, pennSimOS, script, cliMode, timeoutMs(budget))
+        job.cacheKey = key
+        self.scheduler.submit(job)
+
+    def resultKey(self, workingDir, pennSimOS, script, budget):
+        return self.resultCache.runKey(self.resources, workingDir.absoluteFilePath(), pennSimOS.absoluteFilePath(),
+                                       Resources.PennSim.value.absoluteFilePath(), script, self.backend.value, budget)
+
+    @Slot(QObject)
+    def job_finished(self, job):
+        if job.cacheKey is not None and job.cliOutput is not None and not job.verdict:
+            self.resultCache.put(job.cacheKey, job.cliOutput)
+
+    @Slot(str)
+    def setBackend(self, name):
+        self.backend = Backend(name)
+
+    @Slot(bool)
+    def setPreAssemble(self, enabled):
+        self.preAssemble = enabled
+
+    @Slot(int)
+    def setTimeLimit(self, seconds):
+        self.budget = self.budget._replace(seconds=seconds)
+
+    @Slot(int)
+    def setInstructionLimit(self, instructions):
+        self.budget = self.budget._replace(instructions=instructions)
 
     @Slot(str, QFileInfo, str, str, bool)
     def pennSimScriptAll(self, rootDir, pennSimOS, script, programName, cliMode):
-        workingDirs = self.buildDirs(rootDir, set(rootDir))
-        for workingDir in workingDirs:
-            if os.path.exists(os.path.join(workingDir, programName)):
+        workingDirs = findWorkingDirs(rootDir, programName, self.directoryIndex)
+        # PennSim is the reference assembler, so the gate can be switched off for PennSim runs in
+        # case the built-in assembler rejects something PennSim accepts
+        gated = self.backend is Backend.Native or self.preAssemble
+        if not gated or not assemblesProgram(script, programName):
+            for workingDir in workingDirs:
                 self.pennSimScript(QFileInfo(workingDir), pennSimOS, script, cliMode)
-                self.scriptProcess.waitForFinished(-1)
+            return
+
+        for workingDir in workingDirs:
+            self.preAssembled[workingDir] = (pennSimOS, script, cliMode)
+        self.pennSimScript_started.emit()
+        self.preAssembler.run(workingDirs, programName)
+
+    @Slot(str)
+    def preAssembler_assembled(self, workingDir):
+        pennSimOS, script, cliMode = self.preAssembled.pop(workingDir)
+        self.pennSimScript(QFileInfo(workingDir), pennSimOS, script, cliMode)
 
-    # Should really use QDirIterator to be consistent.
-    def buildDirs(self, rootDir, val=set()):
-        with os.scandir(rootDir) as startDir:
-            for testDir in startDir:
-                if testDir.is_dir():
-                    val.add(testDir.path)
-                    self.buildDirs(testDir, val)
-        return sorted(val)
+    @Slot(str, str)
+    def preAssembler_failed(self, workingDir, error):
+        self.preAssembled.pop(workingDir, None)
+        self.pennSimScript_output.emit('Results for: {}\n{}'.format(workingDir, error))
+        self.pennSimScript_output.emit('Assembly failed: {}'.format(workingDir))
+
+    @Slot()
+    def scheduler_finished(self):
+        # Runs can drain while submissions are still being assembled
+        if not self.preAssembler.isBusy() and not self.scheduler.isBusy():
+            self.pennSimScript_finished.emit()
 
     @Slot(QFileInfo)
     def pennSim(self, workingDir):
@@ -100,31 +179,6 @@ class NSim(QObject):
         process.setProgram(self.javaBin)
         process.start()
 
-    @Slot()
-    def pennSimScriptProcess_started(self):
-        self.pennSimScript_started.emit()
-
-    @Slot(int, QProcess.ExitStatus)
-    def pennSimScriptProcess_finished(self, retVal, status):
-        for file in self.scriptProcess.workingFiles:
-            file.remove()
-        if '-t' in self.scriptProcess.arguments():
-            cliOutput = 'Results for: {}\n'.format(self.scriptProcess.workingDirectory())
-            rawProcessOutput = self.scriptProcess.readAll()
-            rawProcessOutputStream = QTextStream(rawProcessOutput)
-            rawOutput = rawProcessOutputStream.readAll()
-            # Strip PennSim's common 'header' / 'footer' output to save space.
-            rawOutput = rawOutput[rawOutput.find('==>'):rawOutput.find('Bye!')]
-            cliOutput += rawOutput
-            self.pennSimScript_output.emit(cliOutput)
-        self.pennSimScript_finished.emit()
-
-    @Slot()
-    def pennSimScriptProcess_terminated(self):
-        if self.scriptProcess.state() is not QProcess.NotRunning:
-            self.pennSimScript_output.emit('Terminated (timeout): {}'.format(self.scriptProcess.workingDirectory()))
-            self.scriptProcess.terminate()
-
     @Slot(int, QProcess.ExitStatus)
     def pennSimProcess_finished(self, retVal, status):
         for file in self.pennSimProcess.workingFiles:
@@ -136,4 +190,5 @@ if __name__ == '__main__':
     app = QApplication(sys.argv)
     app.setApplicationName('NSim')
     nsim = NSim()
+    app.aboutToQuit.connect(nsim.workerPool.shutdown)
     sys.exit(app.exec_())
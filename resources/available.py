@@ -1,6 +1,5 @@
 from PySide2.QtCore import QFileInfo
 from enum import Enum
-import resources.generated
 
 
 class Resources(Enum):
@@ -1,7 +1,20 @@
-from PySide2.QtCore import QByteArray, QFile, QFileInfo, QTextStream, QTemporaryDir, QTemporaryFile
+from PySide2.QtCore import QByteArray, QFile, QFileInfo, QStandardPaths, QTextStream, QTemporaryDir, QTemporaryFile
 from resources.available import Resources
+from resources.registry import registerResources
 
 import base64
+import hashlib
+import os
+
+
+def hashFile(path):
+    # SHA-256 of the file at path, None if it can't be read
+    try:
+        with open(path, 'rb') as hashedFile:
+            return hashlib.sha256(hashedFile.read()).hexdigest()
+    except OSError:
+        return None
+
 
 class ResourceManager:
     """
@@ -10,17 +23,27 @@ class ResourceManager:
     Handles all file I/O
     """
 
-    def __init__(self):
+    def __init__(self, cacheDir=None):
+        registerResources()
         self.currentResourceName = None
         self.tmpDir = QTemporaryDir()
         self.tmpFiles = []
+        self.resourceHashes = {}
+        self.extracted = {}
+
+        if cacheDir is None:
+            cacheDir = os.path.join(QStandardPaths.writableLocation(QStandardPaths.CacheLocation), 'resources')
+        self.cacheDir = cacheDir
 
     @property
     def pennSim(self):
         try:
             return self._pennSim
         except AttributeError:
-            self._pennSim = self.createTemporaryFromResource(Resources.PennSim.value)
+            try:
+                self._pennSim = self.extractResource(Resources.PennSim.value)
+            except Exception:
+                self._pennSim = self.createTemporaryFromResource(Resources.PennSim.value)
             return self._pennSim
 
     @pennSim.setter
@@ -43,6 +66,60 @@ class ResourceManager:
 
         return contents
 
+    def getHash(self, requested):
+        # Bundled resources can't change while running so their hashes are only computed once
+        if requested in self.resourceHashes:
+            return self.resourceHashes[requested]
+
+        resource = QFile(requested)
+
+        if not resource.open(QFile.ReadOnly):
+            raise Exception('Unable to open resource: {}'.format(requested))
+
+        contentHash = hashlib.sha256(bytes(resource.readAll())).hexdigest()
+        resource.close()
+
+        if requested.startswith(':/'):
+            self.resourceHashes[requested] = contentHash
+        return contentHash
+
+    def extractResource(self, requested):
+        """
+        Returns a copy of a bundled resource in the per-user cache directory
+
+        Copies live at <cacheDir>/<sha256>/<file name>, so a copy is only written the first time
+        its contents are seen and is shared by every later launch and batch run. Files are
+        written under a temporary name, checked against the hash and then renamed into place.
+        An existing copy is hashed again before it is reused and rewritten if it has changed.
+        """
+        path = requested.absoluteFilePath()
+        if not path.startswith(':/'):
+            return requested
+        if path in self.extracted:
+            return self.extracted[path]
+
+        contentHash = self.getHash(path)
+        target = os.path.join(self.cacheDir, contentHash, requested.fileName())
+
+        if hashFile(target) != contentHash:
+            resource = QFile(path)
+            if not resource.open(QFile.ReadOnly):
+                raise Exception('Unable to open resource: {}'.format(path))
+            data = bytes(resource.readAll())
+            resource.close()
+
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            temporary = '{}.tmp{}'.format(target, os.getpid())
+            with open(temporary, 'wb') as extractedFile:
+                extractedFile.write(data)
+            if hashFile(temporary) != contentHash:
+                os.remove(temporary)
+                raise Exception('ERROR: Extracted copy of {} is corrupt'.format(path))
+            os.replace(temporary, target)
+
+        self.extracted[path] = QFileInfo(target)
+        return self.extracted[path]
+
     def saveContents(self, requested, contents):
         resource = QFile(requested)
 
@@ -108,7 +185,13 @@ class ResourceManager:
         if requestedInfo.exists():
             return QFile(requestedInfo.absoluteFilePath())
 
-        resource = QFile(requested)
+        # Copying from the extracted file avoids decompressing the resource for every run
+        try:
+            source = self.extractResource(QFileInfo(requested)).absoluteFilePath()
+        except Exception:
+            source = requested
+
+        resource = QFile(source)
         resource.copy(requestedInfo.absoluteFilePath())
         if resource.isOpen():
             resource.close()
@@ -0,0 +1,24 @@
+from PySide2.QtCore import QResource
+
+import os
+
+RCC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nsim.rcc')
+
+_registered = False
+
+
+def registerResources():
+    '''
+    Makes the NSim resources (':/PennSim.jar', ':/lc3os.obj', ...) available
+
+    The binary nsim.rcc is registered directly, which Qt memory maps, so nothing is
+    parsed or copied until a resource is actually read. The resources compiled into
+    generated.py are only imported if nsim.rcc can't be registered.
+    '''
+    global _registered
+    if _registered:
+        return
+
+    if not QResource.registerResource(RCC_PATH):
+        import resources.generated
+    _registered = True
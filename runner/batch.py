@@ -0,0 +1,222 @@
+"""
+Headless batch grading
+
+Runs a script against every copy of a program under a root directory and writes the
+results as JSON, without creating any widgets:
+
+    python -m runner.batch ROOT --program prog.asm --script test.pm --os p3os
+"""
+
+from PySide2.QtCore import QCoreApplication, QFileInfo, QObject, QStandardPaths, Slot
+
+from resources.manager import ResourceManager
+from resources.available import Resources
+from runner.budget import DEFAULT_BUDGET, Budget, parseBudget, timeoutMs
+from runner.cache import ResultCache
+from runner.pool import PennSimWorkerPool, PooledPennSimJob
+from runner.scheduler import Backend, ForkServerJob, JobScheduler, LockstepJob, MultiInputJob, NativeJob
+from runner.walk import DirectoryIndex, findWorkingDirs
+
+import argparse
+import json
+import os
+import sys
+
+OPERATING_SYSTEMS = {
+    'lc3os': Resources.LC3,
+    'p2os': Resources.P2,
+    'p3os': Resources.P3,
+}
+
+SCRIPTS = {
+    'default': Resources.DefaultTest,
+    'assembly': Resources.AssemblyTest,
+}
+
+
+class BatchRunner(QObject):
+    """
+    Submits one job per working directory and collects the results
+    """
+
+    def __init__(self, resources, backend, javaBin, maxJobs, budget, resultCache=None, fastTraps=False,
+                 lockstep=False, inputs=None, forkServer=False):
+        super(BatchRunner, self).__init__()
+
+        self.resources = resources
+        self.backend = backend
+        self.budget = budget
+        self.fastTraps = fastTraps
+        self.lockstep = lockstep
+        self.forkServer = forkServer
+        self.inputs = inputs
+        self.resultCache = resultCache
+        self.results = []
+
+        self.scheduler = JobScheduler(maxJobs)
+        self.scheduler.jobFinished.connect(self.job_finished)
+        self.scheduler.finished.connect(self.scheduler_finished)
+        self.workerPool = PennSimWorkerPool(resources, javaBin, self.scheduler.maxJobs)
+
+    def run(self, workingDirs, pennSimOS, script):
+        groupedJobs = []
+        for workingDir in workingDirs:
+            if self.inputs:
+                self.scheduler.submit(MultiInputJob(self.resources, QFileInfo(workingDir), pennSimOS, script,
+                                                    self.inputs, self.budget))
+                continue
+
+            key = None
+            if self.resultCache is not None:
+                key = self.resultCache.runKey(self.resources, workingDir, pennSimOS.absoluteFilePath(),
+                                              Resources.PennSim.value.absoluteFilePath(), script, self.backend.value,
+                                              self.budget, self.fastTraps and self.backend is Backend.Native)
+                cached = self.resultCache.get(key)
+                if cached is not None:
+                    self.results.append({'directory': workingDir, 'verdict': None, 'output': cached, 'cached': True})
+                    continue
+
+            if self.backend is Backend.Native:
+                job = NativeJob(self.resources, QFileInfo(workingDir), pennSimOS, script, self.budget, self.fastTraps)
+            else:
+                job = PooledPennSimJob(self.resources, self.workerPool, QFileInfo(workingDir), pennSimOS, script,
+                                       timeoutMs(self.budget))
+            job.cacheKey = key
+            if self.backend is Backend.Native and (self.lockstep or self.forkServer):
+                groupedJobs.append(job)
+            else:
+                self.scheduler.submit(job)
+
+        # One group per worker process, each continuing its submissions in lockstep or forking them off
+        group = LockstepJob if self.lockstep else ForkServerJob
+        groupSize = max(1, -(-len(groupedJobs) // self.scheduler.maxJobs))
+        for start in range(0, len(groupedJobs), groupSize):
+            self.scheduler.submit(group(groupedJobs[start:start + groupSize]))
+
+        if not self.scheduler.isBusy():
+            self.scheduler_finished()
+
+    @Slot(QObject)
+    def job_finished(self, job):
+        if isinstance(job, LockstepJob):
+            for member in job.jobs:
+                self.job_finished(member)
+            return
+        if isinstance(job, MultiInputJob):
+            for name, output, verdict in job.results:
+                self.results.append({'directory': job.workingDir.absoluteFilePath(), 'input': name,
+                                     'verdict': verdict or None, 'output': output, 'cached': False})
+            return
+        self.results.append({'directory': job.workingDir.absoluteFilePath(), 'verdict': job.verdict,
+                             'output': job.cliOutput, 'cached': False})
+        if self.resultCache is not None and job.cacheKey is not None and not job.verdict:
+            self.resultCache.put(job.cacheKey, job.cliOutput)
+
+    @Slot()
+    def scheduler_finished(self):
+        self.workerPool.shutdown()
+        self.results.sort(key=lambda result: (result['directory'], result.get('input', '')))
+        QCoreApplication.quit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m runner.batch',
+                                     description='Run a PennSim script against every copy of a program under ROOT.')
+    parser.add_argument('root', help='directory searched recursively for the program')
+    parser.add_argument('--program', required=True, help='file name of the program to test, e.g. prog.asm')
+    parser.add_argument('--script', default='default',
+                        help='script file, or one of {} for a built-in script'.format(', '.join(SCRIPTS)))
+    parser.add_argument('--os', default='lc3os',
+                        help='one of {} or the path to an OS .obj'.format(', '.join(OPERATING_SYSTEMS)))
+    parser.add_argument('--backend', default=Backend.PennSim.value, choices=[backend.value for backend in Backend])
+    parser.add_argument('--jobs', type=int, default=0, help='runs allowed at once (default: number of cores)')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_BUDGET.seconds,
+                        help='seconds before a run is terminated (default: %(default)s)')
+    parser.add_argument('--instructions', type=int, default=DEFAULT_BUDGET.instructions,
+                        help='instructions a native run may execute before it is terminated (default: %(default)s)')
+    parser.add_argument('--output', default='-', help='file the JSON results are written to (default: stdout)')
+    parser.add_argument('--fast-traps', action='store_true',
+                        help='run the OS output traps natively (native backend only, not with --lockstep or --inputs)')
+    parser.add_argument('--lockstep', action='store_true',
+                        help='continue the submissions in lockstep on NumPy lanes (native backend only)')
+    parser.add_argument('--fork-server', action='store_true',
+                        help='run the script\'s shared start once and fork a child per submission from it '
+                             '(native backend only, Linux)')
+    parser.add_argument('--inputs', nargs='+', metavar='FILE',
+                        help='keyboard input files, each program is run once per file with its input commands '
+                             'reading that file instead (native backend only)')
+    parser.add_argument('--no-cache', action='store_true', help='always run, ignoring cached results')
+    args = parser.parse_args(argv)
+    backend = Backend(args.backend)
+    native = [option for option, value in (('--fast-traps', args.fast_traps), ('--lockstep', args.lockstep),
+                                           ('--fork-server', args.fork_server), ('--inputs', args.inputs)) if value]
+    if native and backend is not Backend.Native:
+        parser.error('{} needs the {} backend'.format(' and '.join(native), Backend.Native.value))
+    # Each of these runs submissions its own way, so they don't combine
+    modes = [option for option, value in (('--lockstep', args.lockstep), ('--fork-server', args.fork_server),
+                                          ('--inputs', args.inputs)) if value]
+    if len(modes) > 1:
+        parser.error('{} can\'t be used together'.format(' and '.join(modes)))
+    if args.fast_traps and (args.lockstep or args.inputs):
+        parser.error('--fast-traps can\'t be used with {}'.format(modes[0]))
+
+    app = QCoreApplication(sys.argv[:1])
+    app.setApplicationName('NSim')
+    resources = ResourceManager()
+
+    if args.os in OPERATING_SYSTEMS:
+        pennSimOS = OPERATING_SYSTEMS[args.os].value
+    else:
+        pennSimOS = QFileInfo(os.path.abspath(args.os))
+
+    try:
+        if args.script in SCRIPTS:
+            script = resources.getContents(SCRIPTS[args.script].value.absoluteFilePath())
+        else:
+            script = resources.getContents(args.script)
+        script = script.format(os=pennSimOS.fileName(), asm=args.program, obj=args.program.replace('.asm', '.obj'))
+    except Exception as e:
+        parser.error('could not load script: {}'.format(e))
+
+    inputs = None
+    if args.inputs:
+        try:
+            inputs = []
+            for path in args.inputs:
+                with open(path, 'rb') as inputFile:
+                    inputs.append((os.path.basename(path), inputFile.read()))
+        except OSError as e:
+            parser.error('could not read input: {}'.format(e))
+    javaBin = QStandardPaths.findExecutable('java')
+    if backend is Backend.PennSim and not javaBin:
+        parser.error('could not find java in PATH')
+
+    resultCache = None
+    if not args.no_cache:
+        resultCache = ResultCache(os.path.join(QStandardPaths.writableLocation(QStandardPaths.CacheLocation),
+                                               'results'))
+
+    # A '# budget:' comment in the script takes precedence over the command line
+    budget = parseBudget(script, Budget(args.instructions, args.timeout))
+    runner = BatchRunner(resources, backend, javaBin, args.jobs, budget, resultCache, args.fast_traps,
+                         args.lockstep, inputs, args.fork_server)
+    index = DirectoryIndex(os.path.join(QStandardPaths.writableLocation(QStandardPaths.CacheLocation),
+                                        'directories.json'))
+    runner.run(findWorkingDirs(args.root, args.program, index), pennSimOS, script)
+    if runner.scheduler.isBusy():
+        app.exec_()
+
+    if args.output == '-':
+        json.dump(runner.results, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as resultsFile:
+            json.dump(runner.results, resultsFile, indent=2)
+
+    failed = sum(1 for result in runner.results if result['verdict'])
+    sys.stderr.write('{} run, {} terminated\n'.format(len(runner.results), failed))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,40 @@
+from collections import namedtuple
+
+import re
+
+# Limits a scripted run is held to: instructions executed (native backend) and wall-clock seconds.
+# None means unlimited.
+Budget = namedtuple('Budget', ['instructions', 'seconds'])
+
+DEFAULT_BUDGET = Budget(50000000, 30)
+
+# Scripts can set their own budget in a comment, which PennSim ignores:
+#   # budget: instructions=2000000 seconds=5
+BUDGET_LINE = re.compile(r'^\s*#\s*budget:(.*)$', re.IGNORECASE)
+# Values that don't parse as a whole, like 1e6, are ignored rather than cut short
+BUDGET_ITEM = re.compile(r'(instructions|seconds)\s*=\s*(\d+(?:\.\d+)?|none)\b(?!\.)', re.IGNORECASE)
+
+
+def parseBudget(script, default=DEFAULT_BUDGET):
+    """
+    Returns default with any budget the script sets for itself applied
+    """
+    budget = default._asdict()
+    for line in script.splitlines():
+        match = BUDGET_LINE.match(line)
+        if match is None:
+            continue
+        for name, value in BUDGET_ITEM.findall(match.group(1)):
+            name = name.lower()
+            if value.lower() == 'none':
+                budget[name] = None
+            elif name == 'instructions':
+                budget[name] = int(float(value))
+            else:
+                budget[name] = float(value)
+    return Budget(**budget)
+
+
+def timeoutMs(budget):
+    # QTimer interval for a PennSim run, PennSim itself can only be held to wall-clock time
+    return None if budget.seconds is None else int(budget.seconds * 1000)
@@ -0,0 +1,152 @@
+from lc3.assembler import ASSEMBLER_VERSION
+from lc3.script import stripComment
+
+import hashlib
+import os
+import re
+
+# Commands whose file argument is an input to the run, rather than something the run produces
+INPUT_COMMANDS = {'as', 'input', 'script'}
+LOAD_COMMANDS = {'ld', 'load'}
+
+
+def hashFile(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as inputFile:
+        for chunk in iter(lambda: inputFile.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def scriptInputs(script, workingDir, ignore=()):
+    """
+    Returns the files in workingDir a script reads: assembly sources, keyboard input,
+    nested scripts and any object it loads that it doesn't assemble itself
+
+    Names in ignore (the staged OS files) are skipped since they are hashed separately.
+    """
+    inputs = []
+    assembled = set()
+    for line in script.splitlines():
+        parts = stripComment(line).split()
+        if len(parts) < 2:
+            continue
+        command, name = parts[0].lower(), parts[-1]
+        if command == 'as':
+            assembled.add(re.sub(r'\.asm$', '.obj', name))
+        if command in INPUT_COMMANDS or (command in LOAD_COMMANDS and name not in assembled):
+            if name not in ignore:
+                inputs.append(os.path.join(workingDir, name))
+    return inputs
+
+
+class ResultCache:
+    """
+    On-disk cache of script results keyed by a hash of everything that affects a run
+
+    Entries are plain files named by their key. The least recently used entries are evicted
+    once the cache grows past maxBytes; a hit refreshes the entry's modification time.
+    """
+
+    def __init__(self, directory, maxBytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.entries = {}
+
+        os.makedirs(directory, exist_ok=True)
+        with os.scandir(directory) as cacheDir:
+            for entry in cacheDir:
+                if entry.is_file() and entry.name.endswith('.txt'):
+                    stat = entry.stat()
+                    self.entries[entry.name[:-len('.txt')]] = (stat.st_mtime, stat.st_size)
+
+    def path(self, key):
+        return os.path.join(self.directory, '{}.txt'.format(key))
+
+    @property
+    def size(self):
+        return sum(size for _, size in self.entries.values())
+
+    def key(self, script, inputs, *hashes):
+        """
+        Builds a key from the script text, the contents of its input files and any extra hashes
+        (OS .obj / .sym, PennSim.jar, backend name, budget and options)
+
+        Returns None when an input is missing, such runs are never cached.
+        """
+        digest = hashlib.sha256(script.encode())
+        for path in inputs:
+            try:
+                digest.update(hashFile(path).encode())
+            except OSError:
+                return None
+        for value in hashes:
+            digest.update(value.encode())
+        return digest.hexdigest()
+
+    def runKey(self, resources, workingDir, osPath, pennSimPath, script, backend, budget, fastTraps=False):
+        """
+        Key for running script in workingDir against the OS at osPath on backend, held to budget
+
+        resources supplies the hashes of the OS .obj / .sym and PennSim.jar, which may only be
+        reachable through the Qt resource system. A result is only reused under the same budget
+        since a tighter one could have terminated the run.
+        """
+        osFiles = [osPath, re.sub(r'\.obj$', '.sym', osPath)]
+        inputs = scriptInputs(script, workingDir, [os.path.basename(file) for file in osFiles])
+        try:
+            hashes = [resources.getHash(file) for file in osFiles + [pennSimPath]]
+        except Exception:
+            return None
+        # Native transcripts include what the assembler wrote, so they are only reused from the same version
+        options = ['instructions={}'.format(budget.instructions), 'seconds={}'.format(budget.seconds),
+                   'fastTraps={}'.format(fastTraps), 'assembler={}'.format(ASSEMBLER_VERSION.decode())]
+        return self.key(script, inputs, backend, *hashes + options)
+
+    def get(self, key):
+        if key is None or key not in self.entries:
+            return None
+        try:
+            with open(self.path(key), encoding='utf-8') as entry:
+                contents = entry.read()
+            os.utime(self.path(key))
+        except OSError:
+            self.entries.pop(key, None)
+            return None
+        self.entries[key] = (os.path.getmtime(self.path(key)), self.entries[key][1])
+        return contents
+
+    def put(self, key, contents):
+        if key is None:
+            return
+        data = contents.encode('utf-8')
+        if len(data) > self.maxBytes:
+            return
+        temporary = '{}.tmp{}'.format(self.path(key), os.getpid())
+        try:
+            with open(temporary, 'wb') as entry:
+                entry.write(data)
+            os.replace(temporary, self.path(key))
+        except OSError:
+            return
+        self.entries[key] = (os.path.getmtime(self.path(key)), len(data))
+        self.evict()
+
+    def evict(self):
+        total = self.size
+        for key in sorted(self.entries, key=lambda k: self.entries[k][0]):
+            if total <= self.maxBytes:
+                break
+            total -= self.entries.pop(key)[1]
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+
+    def clear(self):
+        for key in list(self.entries):
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+        self.entries.clear()
@@ -0,0 +1,282 @@
+from PySide2.QtCore import QObject, Slot, Signal, QProcess, QTimer
+
+from lc3.script import stripComment
+from runner.scheduler import ScriptJob
+from runner.staging import FILE_COMMANDS
+
+from collections import deque
+
+import os
+
+
+def absoluteCommand(line, workingDir):
+    """
+    Rewrites relative file arguments in a script line against workingDir
+
+    Workers are shared between directories so they can't rely on their own working directory.
+    A rewritten line loses its comment.
+    """
+    parts = stripComment(line).split()
+    if not parts or parts[0].lower() not in FILE_COMMANDS:
+        return line
+    return ' '.join([parts[0]] + [arg if arg.startswith('-') or os.path.isabs(arg) else os.path.join(workingDir, arg)
+                                  for arg in parts[1:]])
+
+
+def workerCommands(script, workingDir):
+    """
+    Returns the lines a worker is fed for script, up to any quit, which would take the worker down with it
+    """
+    commands = []
+    for line in script.splitlines():
+        line = line.strip()
+        command = stripComment(line).split()
+        if command and command[0].lower() == 'quit':
+            break
+        if line:
+            commands.append(absoluteCommand(line, workingDir))
+    return commands
+
+
+class PennSimWorker(QObject):
+    """
+    A long-lived 'java -jar PennSim.jar -t' process that runs jobs fed over stdin
+
+    Each job is followed by a sentinel command. PennSim answers it with 'Unknown command: ...',
+    which marks the end of that job's output. The process is restarted after jobsPerWorker
+    jobs, when a job times out or when a script quits PennSim. failed is emitted instead of
+    idle if PennSim can't be started at all.
+    """
+
+    idle = Signal(QObject)
+    failed = Signal(QObject)
+
+    def __init__(self, resources, javaBin, jobsPerWorker):
+        super(PennSimWorker, self).__init__()
+
+        self.resources = resources
+        self.javaBin = javaBin
+        self.jobsPerWorker = jobsPerWorker
+        self.process = None
+        self.job = None
+        self.jobsRun = 0
+        self.sentinelCount = 0
+        self.tail = b''
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.job_timeout)
+
+    @property
+    def sentinel(self):
+        return 'nsim-done-{}'.format(self.sentinelCount)
+
+    def isRunning(self):
+        return self.process is not None and self.process.state() is not QProcess.NotRunning
+
+    def startProcess(self):
+        self.process = QProcess(self)
+        self.process.setProgram(self.javaBin)
+        self.process.setArguments(['-jar', self.resources.pennSim.absoluteFilePath(), '-t'])
+        self.process.readyReadStandardOutput.connect(self.process_readyReadStandardOutput)
+        self.process.finished.connect(self.process_finished)
+        self.process.errorOccurred.connect(self.process_errorOccurred)
+        self.process.start()
+        self.jobsRun = 0
+        self.tail = b''
+
+    def stopProcess(self):
+        if self.process is not None:
+            process, self.process = self.process, None
+            process.finished.disconnect(self.process_finished)
+            process.readyReadStandardOutput.disconnect(self.process_readyReadStandardOutput)
+            process.errorOccurred.disconnect(self.process_errorOccurred)
+            if process.state() is not QProcess.NotRunning:
+                process.write(b'quit\n')
+                process.closeWriteChannel()
+                if not process.waitForFinished(1000):
+                    process.kill()
+                    process.waitForFinished(1000)
+            process.deleteLater()
+
+    def run(self, job):
+        self.job = job
+        if not self.isRunning():
+            self.stopProcess()
+            self.startProcess()
+            if self.process is None:
+                # process_errorOccurred has already failed the job
+                return
+        self.sentinelCount += 1
+
+        commands = ['reset'] + workerCommands(job.staging.script, job.staging.path) + [self.sentinel]
+
+        self.process.write('\n'.join(commands + ['']).encode())
+        if job.timeout is not None:
+            self.timer.start(job.timeout)
+
+    def finishJob(self, verdict=None):
+        self.timer.stop()
+        job, self.job = self.job, None
+        self.jobsRun += 1
+        if job is not None:
+            job.complete(verdict)
+        if self.jobsRun >= self.jobsPerWorker:
+            self.stopProcess()
+        self.idle.emit(self)
+
+    @Slot()
+    def process_readyReadStandardOutput(self):
+        data = self.tail + bytes(self.process.readAllStandardOutput())
+        if self.job is None:
+            self.tail = b''
+            return
+        marker = 'Unknown command: {}'.format(self.sentinel).encode()
+        end = data.find(marker)
+        if end != -1:
+            self.tail = b''
+            self.job.receive(data[:end])
+            self.finishJob()
+            return
+        # Hold back enough to spot a sentinel split across reads
+        split = max(0, len(data) - len(marker) + 1)
+        self.tail = data[split:]
+        if not self.job.receive(data[:split]):
+            self.stopProcess()
+            self.finishJob('Terminated (output limit)')
+
+    @Slot(int, QProcess.ExitStatus)
+    def process_finished(self, retVal, status):
+        process, self.process = self.process, None
+        process.deleteLater()
+        if self.job is not None:
+            self.job.receive(self.tail)
+            self.tail = b''
+            self.finishJob()
+
+    @Slot(QProcess.ProcessError)
+    def process_errorOccurred(self, error):
+        # finished is never emitted for a process that could not be started
+        if error != QProcess.FailedToStart:
+            return
+        self.timer.stop()
+        process, self.process = self.process, None
+        if process is not None:
+            process.deleteLater()
+        job, self.job = self.job, None
+        if job is not None:
+            job.complete('Failed to start PennSim')
+        self.failed.emit(self)
+
+    @Slot()
+    def job_timeout(self):
+        if self.job is not None:
+            self.stopProcess()
+            self.finishJob('Terminated (timeout)')
+
+
+class PennSimWorkerPool(QObject):
+    """
+    Hands pooled jobs to up to size PennSimWorkers, starting workers as they are needed
+    """
+
+    def __init__(self, resources, javaBin, size, jobsPerWorker=50):
+        super(PennSimWorkerPool, self).__init__()
+
+        self.resources = resources
+        self.javaBin = javaBin
+        self.size = size
+        self.jobsPerWorker = jobsPerWorker
+        self.workers = []
+        self.idleWorkers = deque()
+        self.pending = deque()
+
+    @Slot(int)
+    def setSize(self, size):
+        self.size = max(1, size)
+        self.dispatch()
+
+    def submit(self, job):
+        self.pending.append(job)
+        self.dispatch()
+
+    def dispatch(self):
+        while self.pending:
+            if self.idleWorkers:
+                worker = self.idleWorkers.popleft()
+            elif len(self.workers) < self.size:
+                worker = PennSimWorker(self.resources, self.javaBin, self.jobsPerWorker)
+                worker.idle.connect(self.worker_idle)
+                worker.failed.connect(self.worker_failed)
+                self.workers.append(worker)
+            else:
+                break
+            worker.run(self.pending.popleft())
+
+    @Slot(QObject)
+    def worker_idle(self, worker):
+        if len(self.workers) > self.size:
+            worker.stopProcess()
+            self.workers.remove(worker)
+            worker.deleteLater()
+        else:
+            self.idleWorkers.append(worker)
+        self.dispatch()
+
+    @Slot(QObject)
+    def worker_failed(self, worker):
+        # The worker is never reused, and the jobs still waiting would fail the same way
+        self.workers.remove(worker)
+        if worker in self.idleWorkers:
+            self.idleWorkers.remove(worker)
+        worker.deleteLater()
+        while self.pending:
+            self.pending.popleft().complete('Failed to start PennSim')
+
+    @Slot()
+    def shutdown(self):
+        for worker in self.workers:
+            worker.stopProcess()
+
+
+class PooledPennSimJob(ScriptJob):
+    """
+    A scripted CLI mode PennSim run handed to a PennSimWorkerPool instead of its own process
+    """
+
+    def __init__(self, resources, pool, workingDir, pennSimOS, script, timeout=30000):
+        super(PooledPennSimJob, self).__init__(workingDir)
+
+        self.resources = resources
+        self.pool = pool
+        self.pennSimOS = pennSimOS
+        self.script = script
+        self.timeout = timeout
+        # Workers never print 'Bye!', their output for a job ends at the sentinel
+        self.capture.end = None
+
+    def start(self):
+        if self.stage(self.resources, self.pennSimOS, self.script) is None:
+            return
+        self.started.emit()
+        self.pool.submit(self)
+
+    def receive(self, data):
+        """
+        Takes output from the worker as it arrives, returns False once the output limit is hit
+        """
+        self.emitOutput(self.capture.feed(data))
+        return not self.capture.truncated
+
+    def complete(self, verdict=None):
+        self.removeWorkingFiles()
+        rest = self.capture.close()
+        # Drop the prompt left waiting for the sentinel
+        if rest.strip() == '==>':
+            self.capture.chunks.pop()
+            rest = ''
+        self.emitOutput(rest, force=not self.headerSent)
+        self.cliOutput = self.capture.text
+        if verdict:
+            self.emitVerdict(verdict)
+        self.finished.emit(self)
@@ -0,0 +1,71 @@
+from PySide2.QtCore import QObject, Slot, Signal
+
+from lc3.script import preassemble, stripComment
+from runner.scheduler import assemblyCacheDir, submitToPool
+
+from functools import partial
+
+import os
+
+
+def assemblesProgram(script, programName):
+    # Only scripts that assemble the program themselves benefit from assembling it up front
+    if not programName.endswith('.asm'):
+        return False
+    for line in script.splitlines():
+        parts = stripComment(line).split()
+        names = [arg for arg in parts[1:] if not arg.startswith('-')]
+        if parts and parts[0].lower() == 'as' and names[:1] == [programName]:
+            return True
+    return False
+
+
+class PreAssembler(QObject):
+    """
+    Assembles the program in every working directory of a Run All before anything is run
+
+    Sources are assembled concurrently in the shared process pool, into the same cache the
+    native backend assembles from. assembled is emitted for each directory whose program
+    assembles and failed, with the assembler's message, for each one that doesn't.
+    """
+
+    assembled = Signal(str)
+    failed = Signal(str, str)
+    finished = Signal()
+
+    # Carries results from the pool's callback thread back to the GUI thread
+    completed = Signal(str, str)
+
+    def __init__(self):
+        super(PreAssembler, self).__init__()
+
+        self.pending = 0
+        self.completed.connect(self.assemble_completed)
+
+    def isBusy(self):
+        return self.pending > 0
+
+    def run(self, workingDirs, programName):
+        for workingDir in workingDirs:
+            self.pending += 1
+            future = submitToPool(preassemble, os.path.join(workingDir, programName), assemblyCacheDir())
+            future.add_done_callback(partial(self.assemble_done, workingDir))
+        if not self.pending:
+            self.finished.emit()
+
+    def assemble_done(self, workingDir, future):
+        try:
+            error = future.result()
+        except Exception as e:
+            error = 'Assembly failed ({})'.format(e)
+        self.completed.emit(workingDir, error if error else '')
+
+    @Slot(str, str)
+    def assemble_completed(self, workingDir, error):
+        self.pending -= 1
+        if error:
+            self.failed.emit(workingDir, error)
+        else:
+            self.assembled.emit(workingDir)
+        if not self.pending:
+            self.finished.emit()
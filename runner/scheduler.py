@@ -0,0 +1,413 @@
+from PySide2.QtCore import QObject, Slot, Signal, QProcess, QStandardPaths, QThread, QTimer
+
+from lc3.forkserver import runForked
+from lc3.script import runInputs, runScript, runScripts
+from runner.budget import DEFAULT_BUDGET
+from runner.staging import StagingDir
+from runner.stream import OutputCapture
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from enum import Enum
+
+import os
+
+executor = None
+
+
+def processPool():
+    """
+    Process pool shared by native runs and pre-assembly, created on first use
+    """
+    global executor
+    if executor is None:
+        executor = ProcessPoolExecutor(QThread.idealThreadCount())
+    return executor
+
+
+def submitToPool(function, *args):
+    """
+    Submits a call to the process pool, replacing the pool if a worker has died and broken it
+    """
+    global executor
+    try:
+        return processPool().submit(function, *args)
+    except BrokenProcessPool:
+        executor.shutdown(wait=False)
+        executor = None
+        return processPool().submit(function, *args)
+
+
+def assemblyCacheDir():
+    # Unchanged sources are assembled once and reused by every later run
+    return os.path.join(QStandardPaths.writableLocation(QStandardPaths.CacheLocation), 'assembly')
+
+
+class Backend(Enum):
+    '''
+    Execution backends a script can be run on
+    '''
+
+    PennSim = 'PennSim'
+    Native = 'Native'
+
+
+class ScriptJob(QObject):
+    """
+    Common parts of a scripted run handed to the JobScheduler
+
+    Output is captured incrementally and emitted a line at a time as it arrives, with the
+    'Results for:' header in front of the first piece. cliOutput holds the captured output
+    (bounded by outputLimit) and verdict why the run was cut short, if it was. Jobs run in
+    a StagingDir rather than in workingDir itself.
+    """
+
+    started = Signal()
+    finished = Signal(QObject)
+    output = Signal(str)
+
+    def __init__(self, workingDir, outputLimit=1 << 20):
+        super(ScriptJob, self).__init__()
+
+        self.workingDir = workingDir
+        self.capture = OutputCapture(outputLimit)
+        self.headerSent = False
+        self.staging = None
+        self.cliOutput = None
+        self.verdict = None
+
+    def emitOutput(self, text, force=False):
+        if not text and not force:
+            return
+        if not self.headerSent:
+            text = 'Results for: {}\n{}'.format(self.workingDir.absoluteFilePath(), text)
+            self.headerSent = True
+        # Each emission is appended to the output view as its own paragraph
+        self.output.emit(text[:-1] if text.endswith('\n') else text)
+
+    def emitVerdict(self, verdict):
+        self.verdict = verdict
+        self.output.emit('{}: {}'.format(verdict, self.workingDir.absoluteFilePath()))
+
+    def stage(self, resources, pennSimOS, script):
+        """
+        Returns the job's StagingDir, or None once the job has finished because it couldn't be staged
+        """
+        try:
+            self.staging = StagingDir(resources, self.workingDir, pennSimOS, script)
+        except Exception as e:
+            self.fail('Failed to stage ({})'.format(e))
+            return None
+        return self.staging
+
+    def fail(self, verdict):
+        self.removeWorkingFiles()
+        self.emitVerdict(verdict)
+        self.finished.emit(self)
+
+    def removeWorkingFiles(self):
+        if self.staging is not None:
+            self.staging.remove()
+            self.staging = None
+
+
+class PennSimJob(ScriptJob):
+    """
+    A single scripted PennSim run
+
+    Owns its own QProcess and the files staged into the working directory, so any
+    number of jobs can be in flight at once.
+    """
+
+    def __init__(self, resources, javaBin, workingDir, pennSimOS, script, cliMode, timeout=30000):
+        super(PennSimJob, self).__init__(workingDir)
+
+        self.resources = resources
+        self.javaBin = javaBin
+        self.pennSimOS = pennSimOS
+        self.script = script
+        self.cliMode = cliMode
+        self.timeout = timeout
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.scriptProcess_terminated)
+
+    def start(self):
+        staging = self.stage(self.resources, self.pennSimOS, self.script)
+        if staging is None:
+            return
+        self.scriptProcess = QProcess(self)
+        self.scriptProcess.setWorkingDirectory(staging.path)
+
+        args = ['-jar', self.resources.pennSim.absoluteFilePath(), '-s', staging.scriptPath]
+
+        if self.cliMode:
+            args.append('-t')
+            if self.timeout is not None:
+                self.timer.start(self.timeout)
+            self.scriptProcess.readyReadStandardOutput.connect(self.scriptProcess_readyReadStandardOutput)
+        self.scriptProcess.setArguments(args)
+        self.scriptProcess.setProgram(self.javaBin)
+        self.scriptProcess.started.connect(self.started)
+        self.scriptProcess.finished.connect(self.scriptProcess_finished)
+        self.scriptProcess.errorOccurred.connect(self.scriptProcess_errorOccurred)
+        self.scriptProcess.start()
+
+    @Slot()
+    def scriptProcess_readyReadStandardOutput(self):
+        # PennSim's common 'header' / 'footer' output is stripped by the capture to save space.
+        self.emitOutput(self.capture.feed(bytes(self.scriptProcess.readAllStandardOutput())))
+        if self.capture.truncated and self.verdict is None:
+            self.timer.stop()
+            self.emitVerdict('Terminated (output limit)')
+            self.scriptProcess.kill()
+
+    @Slot(int, QProcess.ExitStatus)
+    def scriptProcess_finished(self, retVal, status):
+        self.timer.stop()
+        self.removeWorkingFiles()
+        if self.cliMode:
+            self.emitOutput(self.capture.feed(bytes(self.scriptProcess.readAllStandardOutput())))
+            self.emitOutput(self.capture.close(), force=not self.headerSent)
+            self.cliOutput = self.capture.text
+        self.finished.emit(self)
+
+    @Slot(QProcess.ProcessError)
+    def scriptProcess_errorOccurred(self, error):
+        # finished is never emitted for a process that could not be started
+        if error == QProcess.FailedToStart:
+            self.timer.stop()
+            self.removeWorkingFiles()
+            self.emitVerdict('Failed to start PennSim')
+            self.finished.emit(self)
+
+    @Slot()
+    def scriptProcess_terminated(self):
+        if self.scriptProcess.state() is not QProcess.NotRunning:
+            self.emitVerdict('Terminated (timeout)')
+            self.scriptProcess.terminate()
+
+
+class NativeJob(ScriptJob):
+    """
+    A single scripted run on the in-process LC-3 engine
+
+    The script is run in a shared process pool so the GUI stays responsive and jobs
+    scale across cores. Output is always reported since there is no GUI to show. The run
+    is held to budget, counted in instructions with wall-clock time as a backstop.
+    """
+
+    # Carries the result from the pool's callback thread back to the GUI thread
+    completed = Signal(str, str)
+
+    def __init__(self, resources, workingDir, pennSimOS, script, budget=DEFAULT_BUDGET, fastTraps=False):
+        super(NativeJob, self).__init__(workingDir)
+
+        self.resources = resources
+        self.pennSimOS = pennSimOS
+        self.script = script
+        self.budget = budget
+        self.fastTraps = fastTraps
+
+        self.completed.connect(self.run_completed)
+
+    def start(self):
+        staging = self.stage(self.resources, self.pennSimOS, self.script)
+        if staging is None:
+            return
+
+        self.started.emit()
+        future = submitToPool(runScript, staging.path, staging.script, self.budget.instructions,
+                              self.capture.limit, assemblyCacheDir(), self.fastTraps, self.budget.seconds)
+        future.add_done_callback(self.run_done)
+
+    def run_done(self, future):
+        try:
+            output, verdict = future.result()
+        except Exception as e:
+            output, verdict = '', 'Failed ({})'.format(e)
+        self.completed.emit(output, verdict if verdict else '')
+
+    @Slot(str, str)
+    def run_completed(self, output, verdict):
+        self.removeWorkingFiles()
+        self.cliOutput = output
+        self.emitOutput(output, force=True)
+        if verdict:
+            self.emitVerdict(verdict)
+        self.finished.emit(self)
+
+
+class MultiInputJob(NativeJob):
+    """
+    One program run once per keyboard input, the runs continued in lockstep (see runInputs)
+
+    inputs holds (name, bytes) pairs and results the matching (name, output, verdict) once
+    the job has finished. cliOutput has every run's output, each headed by its input's name.
+    """
+
+    inputsCompleted = Signal(list)
+
+    def __init__(self, resources, workingDir, pennSimOS, script, inputs, budget=DEFAULT_BUDGET):
+        super(MultiInputJob, self).__init__(resources, workingDir, pennSimOS, script, budget)
+
+        self.inputs = inputs
+        self.results = []
+
+        self.inputsCompleted.connect(self.inputs_completed)
+
+    def start(self):
+        staging = self.stage(self.resources, self.pennSimOS, self.script)
+        if staging is None:
+            return
+
+        self.started.emit()
+        future = submitToPool(runInputs, staging.path, staging.script, [data for _, data in self.inputs],
+                              self.budget.instructions, self.capture.limit, assemblyCacheDir(),
+                              self.budget.seconds)
+        future.add_done_callback(self.inputs_done)
+
+    def inputs_done(self, future):
+        try:
+            results = future.result()
+        except Exception as e:
+            results = [('', 'Failed ({})'.format(e))] * len(self.inputs)
+        self.inputsCompleted.emit([(output, verdict if verdict else '') for output, verdict in results])
+
+    @Slot(list)
+    def inputs_completed(self, results):
+        self.results = [(name, output, verdict) for (name, _), (output, verdict) in zip(self.inputs, results)]
+        output = ''.join('Input: {}\n{}'.format(name, output) for name, output, _ in self.results)
+        verdicts = ['{} (input {})'.format(verdict, name) for name, _, verdict in self.results if verdict]
+        self.run_completed(output, verdicts[0] if verdicts else '')
+
+
+class LockstepJob(QObject):
+    """
+    Several NativeJobs for the same script run as one pool task, see runScripts
+
+    Scheduled as a single job, finished is emitted once every member has finished. Members'
+    output is passed on as it would be if they had run on their own. Members that can't be
+    staged finish straight away and the rest run without them.
+    """
+
+    started = Signal()
+    finished = Signal(QObject)
+    output = Signal(str)
+
+    # Carries the results from the pool's callback thread back to the GUI thread
+    completed = Signal(list)
+
+    def __init__(self, jobs):
+        super(LockstepJob, self).__init__()
+
+        self.jobs = jobs
+        self.running = []
+        for job in jobs:
+            job.output.connect(self.output)
+
+        self.completed.connect(self.run_completed)
+
+    def start(self):
+        self.startGroup(runScripts, self.jobs[0].budget.seconds)
+
+    def startGroup(self, function, *arguments):
+        # Members share their script, budget and options, arguments follows assemblyCacheDir
+        self.running = [job for job in self.jobs if job.stage(job.resources, job.pennSimOS, job.script) is not None]
+        if not self.running:
+            self.finished.emit(self)
+            return
+        first = self.running[0]
+
+        self.started.emit()
+        future = submitToPool(function, [job.staging.path for job in self.running],
+                              [job.staging.script for job in self.running], first.budget.instructions,
+                              first.capture.limit, assemblyCacheDir(), *arguments)
+        future.add_done_callback(self.run_done)
+
+    def run_done(self, future):
+        try:
+            results = future.result()
+        except Exception as e:
+            results = [('', 'Failed ({})'.format(e))] * len(self.running)
+        self.completed.emit([(output, verdict if verdict else '') for output, verdict in results])
+
+    @Slot(list)
+    def run_completed(self, results):
+        for job, (output, verdict) in zip(self.running, results):
+            job.run_completed(output, verdict)
+        self.finished.emit(self)
+
+    def fail(self, verdict):
+        for job in self.running:
+            job.fail(verdict)
+        self.finished.emit(self)
+
+
+class ForkServerJob(LockstepJob):
+    """
+    Several NativeJobs for the same script run as one pool task that forks a child per job, see runForked
+    """
+
+    def start(self):
+        first = self.jobs[0]
+        self.startGroup(runForked, first.fastTraps, first.budget.seconds)
+
+
+class JobScheduler(QObject):
+    """
+    Keeps up to maxJobs PennSimJobs running at once
+
+    Jobs are started in submission order as slots free up. started is emitted when
+    the scheduler goes from idle to busy and finished once every submitted job is done.
+    """
+
+    started = Signal()
+    finished = Signal()
+    output = Signal(str)
+    jobFinished = Signal(QObject)
+
+    def __init__(self, maxJobs=None):
+        super(JobScheduler, self).__init__()
+
+        self.maxJobs = maxJobs if maxJobs else QThread.idealThreadCount()
+        self.pending = deque()
+        self.running = set()
+
+    @Slot(int)
+    def setMaxJobs(self, maxJobs):
+        self.maxJobs = max(1, maxJobs)
+        self.startPending()
+
+    def isBusy(self):
+        return bool(self.pending or self.running)
+
+    def submit(self, job):
+        if not self.isBusy():
+            self.started.emit()
+        job.output.connect(self.output)
+        job.finished.connect(self.job_finished)
+        self.pending.append(job)
+        self.startPending()
+
+    def startPending(self):
+        while self.pending and len(self.running) < self.maxJobs:
+            job = self.pending.popleft()
+            self.running.add(job)
+            try:
+                job.start()
+            except Exception as e:
+                # A job that couldn't start would never finish and hold its slot for good
+                if job in self.running:
+                    job.fail('Failed to start ({})'.format(e))
+
+    @Slot(QObject)
+    def job_finished(self, job):
+        self.running.discard(job)
+        self.jobFinished.emit(job)
+        job.deleteLater()
+        self.startPending()
+        if not self.isBusy():
+            self.finished.emit()
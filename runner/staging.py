@@ -0,0 +1,105 @@
+from PySide2.QtCore import QDir, QFileInfo, QTemporaryDir
+
+from lc3.script import stripComment
+from runner.walk import isPruned
+
+import os
+import shutil
+
+# Files PennSim writes when assembling, these are copied rather than linked so a link is never written through
+OUTPUT_SUFFIXES = {'.obj', '.sym'}
+
+# Script commands whose arguments are file names PennSim resolves against its working directory
+FILE_COMMANDS = {'ld', 'load', 'as', 'input', 'script'}
+
+
+def leadsOutside(arg):
+    if arg.startswith('-') or os.path.isabs(arg):
+        return False
+    return os.path.normpath(arg).split(os.sep)[0] == os.pardir
+
+
+def resolveOutside(line, workingDir):
+    """
+    Rewrites file arguments that lead out of the submission directory ('../tests/in1.txt')
+    as absolute paths under workingDir, since they don't exist next to the staged copy
+    """
+    parts = stripComment(line).split()
+    if not parts or parts[0].lower() not in FILE_COMMANDS:
+        return line
+    arguments = [os.path.normpath(os.path.join(workingDir, arg)) if leadsOutside(arg) else arg for arg in parts[1:]]
+    if arguments == parts[1:]:
+        return line
+    return ' '.join([parts[0]] + arguments)
+
+
+class StagingDir:
+    """
+    Per-job directory a script runs in instead of the submission directory
+
+    Files in the submission directory are symlinked in, apart from object and symbol files,
+    which are copied since PennSim may overwrite them. Subdirectories are recreated the same
+    way rather than linked, so assembling in one doesn't write through to the submission.
+    Only hidden, VCS and build directories are linked whole. The OS files are linked to the
+    ResourceManager's extracted copies and the script is written alongside, in place of any
+    file of the same name, so nothing is ever written to the submission tree. script holds
+    the script as it should be run in the staged directory, with paths out of the
+    submission directory pointing back at it.
+    """
+
+    def __init__(self, resources, workingDir, pennSimOS, script, scriptName='nsim.pm'):
+        self.tmpDir = QTemporaryDir(os.path.join(QDir.tempPath(), 'nsim-XXXXXX'))
+        if not self.tmpDir.isValid():
+            raise Exception('ERROR: Could not create staging directory for: {}'.format(workingDir.absoluteFilePath()))
+        self.path = self.tmpDir.path()
+        self.script = '\n'.join(resolveOutside(line, workingDir.absoluteFilePath()) for line in script.splitlines())
+
+        self.stageDir(workingDir.absoluteFilePath(), self.path, {scriptName}, {})
+
+        # A copy of the OS in the submission directory takes precedence, same as when staging in place
+        osSym = QFileInfo(pennSimOS.absoluteFilePath().replace('.obj', '.sym'))
+        for osFile in (resources.extractResource(pennSimOS), resources.extractResource(osSym)):
+            target = os.path.join(self.path, osFile.fileName())
+            if not os.path.lexists(target):
+                self.link(osFile.absoluteFilePath(), target)
+
+        self.scriptPath = os.path.join(self.path, scriptName)
+        if os.path.lexists(self.scriptPath):
+            os.remove(self.scriptPath)
+        with open(self.scriptPath, 'w') as scriptFile:
+            scriptFile.write(self.script)
+
+    def stageDir(self, source, target, skipped, visited):
+        # visited maps the real path of each directory staged so far to its copy, a symlink back to one links the copy
+        visited[os.path.realpath(source)] = target
+        with os.scandir(source) as sourceDir:
+            for entry in sourceDir:
+                if entry.name in skipped:
+                    continue
+                path = os.path.join(target, entry.name)
+                if entry.is_dir():
+                    realPath = os.path.realpath(entry.path)
+                    if realPath in visited:
+                        self.link(visited[realPath], path)
+                    elif isPruned(entry.name):
+                        self.link(entry.path, path)
+                    else:
+                        os.mkdir(path)
+                        self.stageDir(entry.path, path, (), visited)
+                elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in OUTPUT_SUFFIXES:
+                    shutil.copyfile(entry.path, path)
+                else:
+                    self.link(entry.path, path)
+
+    def link(self, source, target):
+        try:
+            os.symlink(source, target)
+        except (OSError, NotImplementedError):
+            # Symlinks may need extra privileges on Windows
+            if os.path.isdir(source):
+                shutil.copytree(source, target)
+            else:
+                shutil.copyfile(source, target)
+
+    def remove(self):
+        self.tmpDir.remove()
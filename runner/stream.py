@@ -0,0 +1,67 @@
+import codecs
+
+
+class OutputCapture:
+    """
+    Incrementally decodes PennSim output as it arrives
+
+    Text before the first start marker (PennSim's banner) and from the end marker ('Bye!') on
+    is dropped. feed returns only complete lines so markers and multi-byte characters split
+    across reads are handled. Once limit bytes have been received the rest is discarded and
+    truncated is set, so memory use is bounded no matter how much a program prints.
+    """
+
+    def __init__(self, limit=1 << 20, start='==>', end='Bye!'):
+        self.limit = limit
+        self.start = start
+        self.end = end
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.pending = ''
+        self.started = start is None
+        self.ended = False
+        self.received = 0
+        self.truncated = False
+        self.chunks = []
+
+    @property
+    def text(self):
+        return ''.join(self.chunks)
+
+    def feed(self, data, final=False):
+        self.received += len(data)
+        if self.received > self.limit:
+            self.truncated = True
+            data = data[:max(0, len(data) - (self.received - self.limit))]
+        if self.ended:
+            return ''
+
+        text = self.pending + self.decoder.decode(data, final)
+        self.pending = ''
+        if not self.started:
+            index = text.find(self.start)
+            if index == -1:
+                # Keep enough to spot a marker split across reads
+                self.pending = text[-(len(self.start) - 1):] if not final else ''
+                return ''
+            text = text[index:]
+            self.started = True
+
+        index = text.find(self.end) if self.end else -1
+        if index != -1:
+            ready = text[:index]
+            self.ended = True
+        elif final or self.truncated:
+            ready = text
+        else:
+            lineEnd = text.rfind('\n') + 1
+            ready, self.pending = text[:lineEnd], text[lineEnd:]
+
+        if ready:
+            self.chunks.append(ready)
+        return ready
+
+    def close(self):
+        """
+        Returns whatever was held back waiting for the rest of a line
+        """
+        return self.feed(b'', final=True)
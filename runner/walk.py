@@ -0,0 +1,111 @@
+import json
+import os
+
+# Directories never searched for submissions
+PRUNED_DIRS = {'__pycache__', '__MACOSX', 'node_modules', 'build', 'dist', 'venv', 'CVS'}
+
+
+def isPruned(name):
+    # Hidden directories cover .git, .svn, .hg and editor state
+    return name.startswith('.') or name in PRUNED_DIRS
+
+
+class DirectoryIndex:
+    """
+    Listing of every directory under a root, kept on disk between runs
+
+    Each entry maps a directory to its mtime and the subdirectories and files it held. A
+    directory's mtime changes whenever an entry is added, removed or renamed in it, so
+    unchanged directories only need a stat on later walks rather than a full listing.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.changed = False
+
+        if path is not None:
+            try:
+                with open(path, encoding='utf-8') as indexFile:
+                    self.entries = json.load(indexFile)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def listing(self, dirPath):
+        """
+        Returns the (subdirectories, files) of dirPath, from the index if it is still current
+        """
+        mtime = os.stat(dirPath).st_mtime_ns
+        entry = self.entries.get(dirPath)
+        if entry is not None and entry[0] == mtime:
+            return entry[1], entry[2]
+
+        dirNames, fileNames = [], []
+        with os.scandir(dirPath) as scanDir:
+            for entry in scanDir:
+                # Symlinked submissions count too, findWorkingDirs guards against loops
+                if entry.is_dir():
+                    dirNames.append(entry.name)
+                else:
+                    fileNames.append(entry.name)
+        self.entries[dirPath] = [mtime, dirNames, fileNames]
+        self.changed = True
+        return dirNames, fileNames
+
+    def prune(self, rootDir, walked):
+        """
+        Drops the entries under rootDir that weren't walked, directories since removed or moved
+        """
+        prefix = os.path.join(rootDir, '')
+        for dirPath in list(self.entries):
+            if (dirPath == rootDir or dirPath.startswith(prefix)) and dirPath not in walked:
+                del self.entries[dirPath]
+                self.changed = True
+
+    def save(self):
+        if self.path is None or not self.changed:
+            return
+        temporary = '{}.tmp{}'.format(self.path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(temporary, 'w', encoding='utf-8') as indexFile:
+                json.dump(self.entries, indexFile)
+            os.replace(temporary, self.path)
+        except OSError:
+            return
+        self.changed = False
+
+
+def findWorkingDirs(rootDir, programName, index=None):
+    """
+    Returns every directory under rootDir (rootDir included) that contains programName, sorted
+
+    Walks iteratively, skipping hidden, VCS and build directories. Symlinked directories are
+    followed, each real directory at most once. Listings come from index when one is given.
+    """
+    if index is None:
+        index = DirectoryIndex()
+
+    rootDir = os.path.abspath(rootDir)
+    workingDirs = []
+    walked = set()
+    visited = set()
+    stack = [rootDir]
+    while stack:
+        dirPath = stack.pop()
+        realPath = os.path.realpath(dirPath)
+        if realPath in visited:
+            continue
+        visited.add(realPath)
+        try:
+            dirNames, fileNames = index.listing(dirPath)
+        except OSError:
+            continue
+        walked.add(dirPath)
+        if programName in fileNames:
+            workingDirs.append(dirPath)
+        stack.extend(os.path.join(dirPath, name) for name in dirNames if not isPruned(name))
+
+    index.prune(rootDir, walked)
+    index.save()
+    return sorted(workingDirs)
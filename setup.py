@@ -3,7 +3,8 @@ from setuptools import setup
 setup(
     name='NSim',
     version='0.1',
-    packages=['ui', 'resources'],
+    packages=['ui', 'resources', 'runner', 'lc3'],
+    package_data={'resources': ['nsim.rcc']},
     url='',
     license='',
     author='Donavan Lance',
@@ -0,0 +1,141 @@
+from lc3.assembler import INSTRUCTIONS, Assembly, AssemblyException
+from lc3.loader import decodeObject
+from lc3.script import runScript
+from lc3.symbols import SYMBOL_LINE
+
+import os
+
+import pytest
+
+OS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'resources', 'os')
+
+# Encodings that take no operands, RET, RTI, HALT, ...
+FIXED = {base: name for name, (form, base) in INSTRUCTIONS.items() if form == 'none'}
+
+
+def signed(value, bits):
+    return value - (1 << bits) if value & (1 << (bits - 1)) else value
+
+
+def disassemble(word, address, labels):
+    """
+    Returns assembly for the instruction word at address, or None if it can only be written as a .FILL
+
+    PC-relative operands use a label where one marks the target and the offset itself otherwise.
+    """
+    if word in FIXED:
+        return FIXED[word]
+    opcode, dr, sr = word >> 12, (word >> 9) & 7, (word >> 6) & 7
+
+    def target(bits):
+        offset = signed(word & ((1 << bits) - 1), bits)
+        return labels.get((address + 1 + offset) & 0xFFFF, '#{}'.format(offset))
+
+    if opcode == 0x0 and dr:
+        return 'BR{} {}'.format(''.join(flag for flag, bit in zip('NZP', (4, 2, 1)) if dr & bit), target(9))
+    if opcode in (0x1, 0x5, 0xD):
+        name = {0x1: 'ADD', 0x5: 'AND', 0xD: 'MUL'}[opcode]
+        if word & 0x20:
+            return '{} R{}, R{}, #{}'.format(name, dr, sr, signed(word & 0x1F, 5))
+        if not word & 0x18:
+            return '{} R{}, R{}, R{}'.format(name, dr, sr, word & 7)
+        if opcode == 0x1 and word & 0x38 == 0x10:
+            return 'SUB R{}, R{}, R{}'.format(dr, sr, word & 7)
+    if opcode in (0x2, 0x3, 0xA, 0xB, 0xE):
+        name = {0x2: 'LD', 0x3: 'ST', 0xA: 'LDI', 0xB: 'STI', 0xE: 'LEA'}[opcode]
+        return '{} R{}, {}'.format(name, dr, target(9))
+    if opcode == 0x4:
+        if word & 0x800:
+            return 'JSR {}'.format(target(11))
+        if not word & 0xE3F:
+            return 'JSRR R{}'.format(sr)
+    if opcode in (0x6, 0x7):
+        return '{} R{}, R{}, #{}'.format('LDR' if opcode == 0x6 else 'STR', dr, sr, signed(word & 0x3F, 6))
+    if opcode == 0x9 and word & 0x3F == 0x3F:
+        return 'NOT R{}, R{}'.format(dr, sr)
+    if opcode == 0xC and not word & 0xE3E:
+        return '{} R{}'.format('JMPT' if word & 1 else 'JMP', sr)
+    if opcode == 0xF and not word & 0xF00:
+        return 'TRAP x{:02X}'.format(word & 0xFF)
+    return None
+
+
+def readSymbolFile(path):
+    # Labels by address, plus the '$' entries marking the instructions
+    labels, instructions = {}, set()
+    with open(path, encoding='utf-8') as symFile:
+        for line in symFile:
+            match = SYMBOL_LINE.match(line)
+            if match is None:
+                continue
+            address = int(match.group(2), 16)
+            if match.group(1) == '$':
+                instructions.add(address)
+            else:
+                labels.setdefault(address, []).append(match.group(1))
+    return labels, instructions
+
+
+@pytest.mark.parametrize('name', ['lc3os', 'p2os', 'p3os'])
+def test_reassembled_os_matches_shipped_object(name):
+    # The OS sources aren't shipped, so they are rebuilt from the object and symbol files
+    with open(os.path.join(OS_DIR, name + '.obj'), 'rb') as objFile:
+        data = objFile.read()
+    origin, words = decodeObject(data)
+    labels, instructions = readSymbolFile(os.path.join(OS_DIR, name + '.sym'))
+    targets = {address: names[0] for address, names in labels.items()}
+
+    lines = ['.ORIG x{:04X}'.format(origin)]
+    for address, word in enumerate(words.tolist(), origin):
+        lines.extend(labels.get(address, []))
+        # Without '$' entries every word is tried as an instruction, data reassembles to the same word either way
+        text = disassemble(word, address, targets) if address in instructions or not instructions else None
+        lines.append(text if text is not None else '.FILL x{:04X}'.format(word))
+    lines.append('.END')
+
+    assembly = Assembly('\n'.join(lines))
+    assert assembly.objectData == data
+    assert {address: sorted(names) for address, names in labels.items()} == \
+        {address: sorted(name for name, other in assembly.symbols.items() if other == address)
+         for address in set(assembly.symbols.values())}
+
+
+def test_program_encoding():
+    assembly = Assembly('\n'.join([
+        '.ORIG x3000',
+        '        LEA R0, MSG',
+        '        PUTS',
+        '        ADD R1, R1, #5   ; immediate',
+        'LOOP    BRnp LOOP',
+        '        HALT',
+        'MSG     .STRINGZ "Hi"',
+        '.END',
+    ]))
+    assert assembly.words == [0x3000, 0xE004, 0xF022, 0x1265, 0x0BFF, 0xF025, 0x0048, 0x0069, 0x0000]
+    assert assembly.symbols == {'LOOP': 0x3003, 'MSG': 0x3005}
+    assert assembly.instructions == [0x3000, 0x3001, 0x3002, 0x3003, 0x3004]
+
+
+def test_labels_keep_their_spelling():
+    assembly = Assembly('\n'.join([
+        '.ORIG x3000',
+        'Loop    add r1, r1, #-1',
+        '        brP loop',
+        'Done    HALT',
+        '        .FILL DONE',
+        '.END',
+    ]))
+    assert assembly.words == [0x3000, 0x127F, 0x03FE, 0xF025, 0x3002]
+    assert assembly.symbols == {'Loop': 0x3000, 'Done': 0x3002}
+    assert '//\tDone              3002' in assembly.symbolText.splitlines()
+
+
+def test_labels_differing_in_case_clash():
+    with pytest.raises(AssemblyException, match='Duplicate label'):
+        Assembly('.ORIG x3000\nLoop ADD R1, R1, #0\nLOOP ADD R1, R1, #0\n.END\n')
+
+
+def test_script_finds_labels_as_written(tmp_path):
+    (tmp_path / 'prog.asm').write_text('.ORIG x3000\nDone HALT\n.END\n')
+    output, verdict = runScript(str(tmp_path), 'as prog.asm\nld prog.obj\nbreak set Done\n')
+    assert output.splitlines()[-1] == 'Breakpoint set at x3000'
@@ -0,0 +1,23 @@
+import pytest
+
+pytest.importorskip('PySide2.QtCore')
+
+from runner.batch import main  # noqa: E402
+
+
+@pytest.mark.parametrize('options, message', [
+    (['--fast-traps'], '--fast-traps needs the Native backend'),
+    (['--lockstep'], '--lockstep needs the Native backend'),
+    (['--fork-server'], '--fork-server needs the Native backend'),
+    (['--inputs', 'in1.txt'], '--inputs needs the Native backend'),
+    (['--backend', 'Native', '--lockstep', '--fork-server'], '--lockstep and --fork-server can\'t be used together'),
+    (['--backend', 'Native', '--fork-server', '--inputs', 'in1.txt'],
+     '--fork-server and --inputs can\'t be used together'),
+    (['--backend', 'Native', '--fast-traps', '--lockstep'], '--fast-traps can\'t be used with --lockstep'),
+    (['--backend', 'Native', '--fast-traps', '--inputs', 'in1.txt'], '--fast-traps can\'t be used with --inputs'),
+])
+def test_ignored_options_are_rejected(capsys, options, message):
+    with pytest.raises(SystemExit) as exit:
+        main(['submissions', '--program', 'prog.asm'] + options)
+    assert exit.value.code == 2
+    assert message in capsys.readouterr().err
@@ -0,0 +1,83 @@
+from lc3.script import ScriptRunner
+
+import os
+
+import pytest
+
+# Rewrites an instruction later in its own block and one in another block on every pass,
+# prints a character each time and stops the clock through the MCR rather than an OS
+PROGRAM = '''.ORIG x3000
+        AND R1, R1, #0
+        ADD R1, R1, #15
+        ADD R1, R1, #15
+        AND R2, R2, #0
+        AND R4, R4, #0
+LOOP    LD R3, PATCH
+        ADD R3, R3, #1
+        ST R3, PATCH
+PATCH   ADD R2, R2, #1
+        LEA R5, LATER
+        STR R3, R5, #0
+        LD R0, CHAR
+        ADD R0, R0, R1
+        STI R0, DDR
+        JSR LATER
+        ADD R1, R1, #-1
+        BRp LOOP
+        AND R0, R0, #0
+        STI R0, MCR
+LATER   ADD R4, R4, #1
+        ADD R4, R4, R2
+        RET
+CHAR    .FILL x40
+DDR     .FILL xFE06
+MCR     .FILL xFFFE
+.END
+'''
+
+
+def loadMachine(path):
+    with open(os.path.join(str(path), 'prog.asm'), 'w') as asmFile:
+        asmFile.write(PROGRAM)
+    output = []
+    runner = ScriptRunner(str(path))
+    runner.run('reset\nas prog.asm\nld prog.obj\n')
+    runner.machine.output = output.append
+    runner.machine.pc = 0x3000
+    return runner.machine, output
+
+
+def test_blocks_match_stepping(tmp_path):
+    compiled, compiledOutput = loadMachine(tmp_path)
+    stepped, steppedOutput = loadMachine(tmp_path)
+    assert compiled.run() == 'halted'
+    while not stepped.halted:
+        stepped.step()
+    assert compiled.blocks
+    assert compiled.snapshot() == stepped.snapshot()
+    assert compiledOutput == steppedOutput
+    assert len(compiledOutput) == 30
+    # The patched instructions ran as they were rewritten, not as they were compiled
+    assert stepped.registers[2] != 30
+
+
+@pytest.mark.parametrize('limit', [1, 7, 50, 123, 300, 399])
+def test_blocks_stop_on_the_limit(tmp_path, limit):
+    compiled, compiledOutput = loadMachine(tmp_path)
+    stepped, steppedOutput = loadMachine(tmp_path)
+    # Warm the blocks up first so the limit lands inside compiled code
+    for count in (limit // 2, limit - limit // 2):
+        compiled.runFor(count)
+        for _ in range(count):
+            stepped.step()
+    assert compiled.instructionCount == limit
+    assert compiled.snapshot() == stepped.snapshot()
+    assert compiledOutput == steppedOutput
+
+
+def test_breakpoint_inside_a_block(tmp_path):
+    compiled, _ = loadMachine(tmp_path)
+    compiled.run(100)
+    compiled.breakpoints.add(0x3008)
+    compiled.run()
+    assert compiled.pc == 0x3008
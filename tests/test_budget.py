@@ -0,0 +1,32 @@
+from runner.budget import DEFAULT_BUDGET, Budget, parseBudget, timeoutMs
+
+import pytest
+
+
+@pytest.mark.parametrize('script, budget', [
+    ('continue\n', DEFAULT_BUDGET),
+    ('# budget: instructions=2000000\ncontinue\n', Budget(2000000, 30)),
+    ('# budget: seconds=5\n', Budget(50000000, 5.0)),
+    ('#Budget: Seconds = 2.5 instructions=1e3\n', Budget(50000000, 2.5)),
+    ('# budget: instructions=none seconds=none\n', Budget(None, None)),
+    ('# budget: instructions=10\n# budget: instructions=20\n', Budget(20, 30)),
+    # Only whole-line comments count, and only the names it knows
+    ('continue # budget: seconds=1\n', DEFAULT_BUDGET),
+    ('# budget: memory=10\n', DEFAULT_BUDGET),
+])
+def test_parse_budget(script, budget):
+    assert parseBudget(script) == budget
+
+
+def test_parse_budget_keeps_the_default_it_is_given():
+    assert parseBudget('# budget: seconds=5\n', Budget(1000, None)) == Budget(1000, 5.0)
+
+
+def test_timeout():
+    assert timeoutMs(Budget(None, 2.5)) == 2500
+    assert timeoutMs(Budget(1000, None)) is None
+
+
+@pytest.mark.parametrize('value', ['1e6', '12abc', '1.5.2'])
+def test_malformed_values_are_ignored(value):
+    assert parseBudget('# budget: instructions={}\n'.format(value)) == DEFAULT_BUDGET
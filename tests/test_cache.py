@@ -0,0 +1,99 @@
+from runner.budget import Budget
+from runner.cache import ResultCache, scriptInputs
+
+import os
+import time
+
+import pytest
+
+SCRIPT = 'ld lc3os.obj\nas prog.asm\nld prog.obj\ninput keys.txt # comment\ncontinue\n'
+BUDGET = Budget(1000000, 10)
+
+
+class Resources:
+    # Stands in for ResourceManager, whose hashes come through the Qt resource system
+    def __init__(self, version=''):
+        self.version = version
+
+    def getHash(self, path):
+        return 'hash of {}{}'.format(path, self.version)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / 'results'))
+
+
+@pytest.fixture
+def workingDir(tmp_path):
+    (tmp_path / 'prog.asm').write_text('.ORIG x3000\nHALT\n.END\n')
+    (tmp_path / 'keys.txt').write_text('abc')
+    return str(tmp_path)
+
+
+def runKey(cache, workingDir, script=SCRIPT, resources=Resources(), backend='Native', budget=BUDGET,
+           fastTraps=False):
+    return cache.runKey(resources, workingDir, ':/os/lc3os.obj', ':/PennSim.jar', script, backend, budget,
+                        fastTraps)
+
+
+def test_script_inputs(workingDir):
+    # The OS is hashed separately and prog.obj is produced by the script
+    assert scriptInputs(SCRIPT, workingDir, ['lc3os.obj', 'lc3os.sym']) == [
+        os.path.join(workingDir, 'prog.asm'), os.path.join(workingDir, 'keys.txt')]
+    assert scriptInputs('ld prog.obj\n', workingDir) == [os.path.join(workingDir, 'prog.obj')]
+
+
+def test_key_is_stable(cache, workingDir):
+    assert runKey(cache, workingDir) == runKey(cache, workingDir)
+
+
+@pytest.mark.parametrize('change', [
+    {'script': SCRIPT + 'print R0\n'},
+    {'resources': Resources(' changed')},
+    {'backend': 'PennSim'},
+    # A tighter budget could have terminated the run
+    {'budget': BUDGET._replace(instructions=2000000)},
+    {'budget': BUDGET._replace(instructions=None)},
+    {'budget': BUDGET._replace(seconds=5)},
+    {'fastTraps': True},
+])
+def test_key_changes_with_the_run(cache, workingDir, change):
+    assert runKey(cache, workingDir, **change) != runKey(cache, workingDir)
+
+
+@pytest.mark.parametrize('name', ['prog.asm', 'keys.txt'])
+def test_key_changes_with_inputs(cache, workingDir, name):
+    key = runKey(cache, workingDir)
+    with open(os.path.join(workingDir, name), 'a') as inputFile:
+        inputFile.write('\n')
+    assert runKey(cache, workingDir) != key
+    # Runs missing an input are never cached
+    os.remove(os.path.join(workingDir, name))
+    assert runKey(cache, workingDir) is None
+
+
+def test_put_and_get(cache, workingDir):
+    key = runKey(cache, workingDir)
+    assert cache.get(key) is None
+    cache.put(key, 'transcript ★')
+    assert cache.get(key) == 'transcript ★'
+    assert ResultCache(cache.directory).get(key) == 'transcript ★'
+    cache.clear()
+    assert cache.get(key) is None and not os.listdir(cache.directory)
+
+
+def test_least_recently_used_are_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path / 'results'), maxBytes=350)
+    for key in 'abc':
+        cache.put(key, key * 100)
+        # mtimes order the entries, make sure they differ
+        os.utime(cache.path(key), (time.time() - 10 + 'abc'.index(key),) * 2)
+        cache.entries[key] = (os.path.getmtime(cache.path(key)), 100)
+    cache.get('a')
+    cache.put('d', 'd' * 100)
+    assert sorted(cache.entries) == ['a', 'c', 'd']
+    assert sorted(os.listdir(cache.directory)) == ['a.txt', 'c.txt', 'd.txt']
+    # Too big to ever be kept
+    cache.put('e', 'e' * 400)
+    assert cache.get('e') is None
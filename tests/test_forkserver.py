@@ -0,0 +1,46 @@
+from lc3.forkserver import preludeLength, runForked
+from lc3.script import runScript
+
+from tests.test_script import SCRIPT, makeWorkingDir
+
+import os
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+
+
+@pytest.mark.parametrize('dirCount', [1, 3, 20])
+def test_forked_runs_match_single_runs(tmp_path, dirCount):
+    # The last program prints more than the instruction limit allows
+    workingDirs = [makeWorkingDir(tmp_path / str(index), index) for index in range(dirCount - 1)]
+    workingDirs.append(makeWorkingDir(tmp_path / 'long', 30000))
+
+    single = [runScript(workingDir, SCRIPT, 20000) for workingDir in workingDirs]
+    assert single[-1][1] == 'Terminated (instruction limit)'
+    assert runForked(workingDirs, SCRIPT, 20000) == single
+
+
+def test_forked_with_a_script_per_directory(tmp_path):
+    workingDirs = [makeWorkingDir(tmp_path / str(index), index) for index in range(4)]
+    scripts = [SCRIPT.replace('check R1 #0', 'check R1 #{}'.format(index % 2)) for index in range(4)]
+    assert runForked(workingDirs, scripts, 20000) == [
+        runScript(workingDir, script, 20000) for workingDir, script in zip(workingDirs, scripts)]
+
+
+def test_prelude_stops_at_the_first_line_that_can_differ(tmp_path):
+    workingDirs = [makeWorkingDir(tmp_path / str(index), index) for index in range(2)]
+    lines = SCRIPT.splitlines()
+    # The comment, reset and ld of the same OS, up to 'as prog.asm'
+    assert preludeLength(workingDirs, [lines, lines]) == 3
+    assert preludeLength(workingDirs, [lines[:2], lines[:2]]) == 2
+    assert preludeLength(workingDirs, [lines, ['# other comment'] + lines[1:]]) == 0
+
+    # An OS that differs between directories has to be loaded in each child
+    with open(os.path.join(workingDirs[1], 'lc3os.sym'), 'a') as symFile:
+        symFile.write('\n')
+    assert preludeLength(workingDirs, [lines, lines]) == 2
+
+
+def test_run_forked_with_no_directories():
+    assert runForked([], SCRIPT) == []
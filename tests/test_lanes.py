@@ -0,0 +1,69 @@
+from lc3.script import runInputs, runScript, runScripts
+
+from tests.test_script import SCRIPT, makeWorkingDir
+
+import os
+
+import pytest
+
+# Echoes its input a line at a time until it reads a 'q', counting the characters in R1
+ECHO = '''.ORIG x3000
+        AND R1, R1, #0
+LOOP    GETC
+        LD R2, QUIT
+        ADD R2, R0, R2
+        BRz DONE
+        ADD R1, R1, #1
+        OUT
+        BRnzp LOOP
+DONE    HALT
+QUIT    .FILL x-71
+.END
+'''
+
+ECHO_SCRIPT = '''reset
+ld lc3os.obj
+as echo.asm
+ld echo.obj
+input keys.txt
+continue
+print R1
+'''
+
+
+@pytest.mark.parametrize('dirCount', [3, 20])
+def test_lockstep_matches_single_runs(tmp_path, dirCount):
+    # The last program prints more than the instruction limit allows
+    workingDirs = [makeWorkingDir(tmp_path / str(index), index) for index in range(dirCount - 1)]
+    workingDirs.append(makeWorkingDir(tmp_path / 'long', 30000))
+
+    single = [runScript(workingDir, SCRIPT, 20000) for workingDir in workingDirs]
+    assert single[-1][1] == 'Terminated (instruction limit)'
+    assert runScripts(workingDirs, SCRIPT, 20000) == single
+
+
+def test_lockstep_with_a_script_per_directory(tmp_path):
+    workingDirs = [makeWorkingDir(tmp_path / str(index), index) for index in range(20)]
+    scripts = [SCRIPT.replace('check R1 #0', 'check R1 #{}'.format(index % 2)) for index in range(20)]
+    results = runScripts(workingDirs, scripts, 20000)
+    assert results == [runScript(workingDir, script, 20000) for workingDir, script in zip(workingDirs, scripts)]
+    assert [output.splitlines()[-1] for output, _ in results[:2]] == ['TRUE', 'FALSE (actual value: x0000)']
+
+
+def test_inputs_match_single_runs(tmp_path):
+    workingDir = makeWorkingDir(tmp_path / 'echo', 0)
+    with open(os.path.join(workingDir, 'echo.asm'), 'w') as asmFile:
+        asmFile.write(ECHO)
+    # Lanes finish after different numbers of characters, or wait for input that never comes
+    inputs = [b'q', b'hello\nq', b'never ends', b'', b'x' * 500 + b'q', b'ab\nq trailing']
+
+    single = []
+    for data in inputs:
+        with open(os.path.join(workingDir, 'keys.txt'), 'wb') as keysFile:
+            keysFile.write(data)
+        single.append(runScript(workingDir, ECHO_SCRIPT, 50000))
+    os.remove(os.path.join(workingDir, 'keys.txt'))
+
+    assert runInputs(workingDir, ECHO_SCRIPT, inputs, 50000) == single
+    assert 'hello' in single[1][0]
+    assert single[0][1] is None and single[2][1] is not None
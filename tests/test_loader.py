@@ -0,0 +1,53 @@
+from lc3.loader import MEMORY_SIZE, MemoryImage, ObjectException, decodeObject
+from lc3.script import ScriptRunner
+
+import struct
+
+import pytest
+
+
+def objectData(origin, *words):
+    return struct.pack('>{}H'.format(len(words) + 1), origin, *words)
+
+
+def test_decode_object():
+    origin, words = decodeObject(objectData(0x3000, 0x1234, 0xFFFF) + b'\x00')
+    assert origin == 0x3000
+    assert list(words) == [0x1234, 0xFFFF]
+
+
+@pytest.mark.parametrize('data', [b'', b'\x30', objectData(0xFFFF, 1, 2)])
+def test_bad_objects(data):
+    with pytest.raises(ObjectException):
+        decodeObject(data)
+
+
+def test_merged_images():
+    image = MemoryImage()
+    assert len(image.words) == MEMORY_SIZE
+    assert image.load(objectData(0x0200, 1, 2, 3), 'os') == []
+    assert image.load(objectData(0x3000, 4, 5, 6, 7), 'prog') == []
+    assert image.ranges == [(0x0200, 0x0203, 'os'), (0x3000, 0x3004, 'prog')]
+    assert list(image.words[0x0200:0x0203]) == [1, 2, 3]
+    assert list(image.words[0x3000:0x3004]) == [4, 5, 6, 7]
+
+
+def test_overlaps_are_reported_and_later_image_wins():
+    image = MemoryImage()
+    image.load(objectData(0x3000, 1, 2, 3, 4, 5, 6), 'prog')
+    assert image.load(objectData(0x3002, 7, 8), 'patch') == [(0x3000, 0x3006, 'prog')]
+    assert list(image.words[0x3000:0x3006]) == [1, 2, 7, 8, 5, 6]
+    assert image.ranges == [(0x3000, 0x3002, 'prog'), (0x3002, 0x3004, 'patch'), (0x3004, 0x3006, 'prog')]
+    # Only what is left of each earlier image counts
+    assert image.load(objectData(0x2FFF, 9, 9, 9, 9), 'low') == [(0x3000, 0x3002, 'prog'), (0x3002, 0x3004, 'patch')]
+
+
+def test_script_notes_overlapping_loads(tmp_path):
+    (tmp_path / 'prog.obj').write_bytes(objectData(0x3000, 0xF025, 0xF025))
+    (tmp_path / 'patch.obj').write_bytes(objectData(0x3001, 0x0000))
+    runner = ScriptRunner(str(tmp_path))
+    output = runner.run('ld prog.obj\nld patch.obj\n')
+    assert runner.overlaps == ['patch.obj loaded over prog.obj (x3000-x3001)']
+    assert output.splitlines()[-1] == 'Loaded object file \'patch.obj\''
+    runner.run('reset\nld patch.obj\n')
+    assert len(runner.overlaps) == 1
@@ -0,0 +1,161 @@
+from lc3.machine import ExecutionException
+from lc3.script import ScriptRunner, runScript
+from tests.test_script import makeWorkingDir
+
+import os
+import re
+
+import pytest
+
+LOAD = '''reset
+ld lc3os.obj
+as loop.asm
+ld loop.obj
+'''
+
+
+def makeLoop(path, body):
+    workingDir = makeWorkingDir(path, 0)
+    with open(os.path.join(workingDir, 'loop.asm'), 'w') as asmFile:
+        asmFile.write('.ORIG x3000\n{}\nSTAR .FILL x2A\n.END\n'.format(body))
+    return workingDir
+
+
+def test_livelock_in_user_code(tmp_path):
+    workingDir = makeLoop(tmp_path, 'LOOP ADD R1, R1, #0\nBRnzp LOOP')
+    output, verdict = runScript(workingDir, LOAD + 'continue\n')
+    assert verdict in ('Terminated (livelock at LOOP)', 'Terminated (livelock at LOOP+1)')
+
+
+def test_livelock_through_a_trap_points_at_the_submission(tmp_path):
+    workingDir = makeLoop(tmp_path, 'LOOP LD R0, STAR\nOUT\nBRnzp LOOP')
+    output, verdict = runScript(workingDir, LOAD + 'continue\n')
+    assert re.fullmatch(r'Terminated \(livelock at LOOP(\+[12])?\)', verdict)
+
+    runner = ScriptRunner(workingDir)
+    runner.run(LOAD + 'continue\n')
+    machine = runner.machine
+    while machine.pc >= 0x3000:
+        machine.step()
+    # The OUT call, whichever instruction of the routine the loop is caught on
+    while machine.pc < 0x3000:
+        before = machine.snapshot()
+        written = runner.output
+        assert machine.loopAddress() == 0x3001
+        assert machine.snapshot() == before
+        assert runner.output == written
+        machine.step()
+
+
+def test_livelock_inside_the_os_falls_back_to_the_trap(tmp_path):
+    # GETC with no input spins in the OS, never returning to the submission
+    workingDir = makeLoop(tmp_path, 'ADD R0, R0, #0\nLOOP GETC\nBRnzp LOOP')
+    output, verdict = runScript(workingDir, LOAD + 'continue\n')
+    assert verdict == 'Terminated (livelock at LOOP)'
+
+
+def test_finished_run_has_no_verdict(tmp_path):
+    workingDir = makeLoop(tmp_path, 'LD R0, STAR\nOUT\nHALT')
+    output, verdict = runScript(workingDir, LOAD + 'continue\n')
+    assert verdict is None
+    assert '*' in output
+
+
+# Reads, writes or jumps to x2000 depending on R1, in a loop hot enough to be compiled first
+PROTECTED = '''.ORIG x3000
+LOOP    ADD R2, R2, #1
+        ADD R3, R2, #-10
+        BRn LOOP
+        LD R4, TARGET
+        ADD R1, R1, #0
+        BRp WRITE
+        BRz JUMP
+        LDR R0, R4, #0
+        ST R0, TARGET
+        BRnzp DONE
+WRITE   STR R1, R4, #0
+        BRnzp DONE
+JUMP    JMP R4
+DONE    AND R0, R0, #0
+        STI R0, MCR
+TARGET  .FILL x2000
+MCR     .FILL xFFFE
+.END
+'''
+
+
+def loadUserMachine(path, mpr, r1):
+    with open(os.path.join(str(path), 'protected.asm'), 'w') as asmFile:
+        asmFile.write(PROTECTED)
+    runner = ScriptRunner(str(path))
+    runner.run('reset\nas protected.asm\nld protected.obj\n')
+    machine = runner.machine
+    machine.memory[0x2000] = 0x1234
+    machine.mpr = mpr
+    machine.registers[1] = r1
+    machine.pc = 0x3000
+    machine.privileged = False
+    return machine
+
+
+@pytest.mark.parametrize('r1', [-1, 1, 0])
+def test_mpr_faults_user_accesses(tmp_path, r1):
+    machine = loadUserMachine(tmp_path, 0xFFFF & ~(1 << 2), r1)
+    with pytest.raises(ExecutionException) as e:
+        machine.run()
+    assert e.value.args[0] == ('IllegalMemAccessException accessing address x2000\n'
+                               '(The MPR and PSR do not permit access to this address)')
+    assert machine.memory[0x2000] == 0x1234
+
+
+@pytest.mark.parametrize('r1', [-1, 1])
+def test_mpr_allows_open_pages(tmp_path, r1):
+    machine = loadUserMachine(tmp_path, 0xFFFF, r1)
+    assert machine.run() == 'halted'
+    assert machine.memory[0x2000] == (0x1234 if r1 < 0 else 1)
+
+
+def test_mpr_is_ignored_when_privileged(tmp_path):
+    machine = loadUserMachine(tmp_path, 0, -1)
+    machine.privileged = True
+    assert machine.run() == 'halted'
+    assert machine.memory[0x300F] == 0x1234
+
+
+def test_writing_the_mpr_rebuilds_the_page_table(tmp_path):
+    machine = loadUserMachine(tmp_path, 0, -1)
+    machine.privileged = True
+    machine.write(0xFE12, 1 << 3 | 1 << 15)
+    assert machine.mpr == 1 << 3 | 1 << 15
+    assert machine.userPages == [page in (3, 15) for page in range(16)]
+    machine.privileged = False
+    assert machine.read(0x3000) == machine.memory[0x3000]
+    with pytest.raises(ExecutionException):
+        machine.read(0x4000)
+    machine.pc = 0x4000
+    with pytest.raises(ExecutionException):
+        machine.step()
+
+
+def test_mpr_faults_inside_compiled_blocks(tmp_path):
+    with open(os.path.join(str(tmp_path), 'walk.asm'), 'w') as asmFile:
+        asmFile.write('.ORIG x3000\nLD R4, START\nLOOP LDR R0, R4, #0\nADD R4, R4, #1\nBRnzp LOOP\n'
+                      'START .FILL x1FF0\n.END\n')
+    machines = []
+    for compiled in (True, False):
+        runner = ScriptRunner(str(tmp_path))
+        runner.run('reset\nas walk.asm\nld walk.obj\n')
+        machine = runner.machine
+        machine.mpr = 1 << 1 | 1 << 3
+        machine.pc = 0x3000
+        machine.privileged = False
+        with pytest.raises(ExecutionException) as e:
+            if compiled:
+                machine.run()
+            else:
+                while True:
+                    machine.step()
+        assert 'accessing address x2000' in e.value.args[0]
+        machines.append(machine)
+    assert machines[0].blocks
+    assert machines[0].snapshot() == machines[1].snapshot()
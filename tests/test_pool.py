@@ -0,0 +1,22 @@
+import pytest
+
+pytest.importorskip('PySide2.QtCore')
+
+from runner.pool import absoluteCommand, workerCommands  # noqa: E402
+
+
+@pytest.mark.parametrize('line, command', [
+    ('ld prog.obj', 'ld /staged/prog.obj'),
+    ('ld prog.obj # note', 'ld /staged/prog.obj'),
+    ('AS -warn prog.asm', 'AS -warn /staged/prog.asm'),
+    ('input /tests/in1.txt', 'input /tests/in1.txt'),
+    ('set R1 #5 # five', 'set R1 #5 # five'),
+    ('# ld prog.obj', '# ld prog.obj'),
+])
+def test_absolute_command(line, command):
+    assert absoluteCommand(line, '/staged') == command
+
+
+def test_worker_commands_stop_at_quit():
+    script = 'ld prog.obj\n\n  continue  \nQuit # done\nld other.obj\n'
+    assert workerCommands(script, '/staged') == ['ld /staged/prog.obj', 'continue']
@@ -0,0 +1,63 @@
+import os
+import struct
+import xml.etree.ElementTree
+import zlib
+
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'resources')
+
+# Tree node flags in a binary resource file
+COMPRESSED = 0x01
+DIRECTORY = 0x02
+
+
+def readRcc(path):
+    """
+    Returns the contents of every file in a binary (rcc -binary) resource file, by resource path
+
+    Reads the format Qt's rcc writes directly so the bundle can be checked without Qt.
+    """
+    with open(path, 'rb') as rccFile:
+        data = rccFile.read()
+    magic, version, treeOffset, dataOffset, namesOffset = struct.unpack('>4sIIII', data[:20])
+    assert magic == b'qres'
+    # Version 2 added each file's modification time to its node
+    nodeSize = 22 if version >= 2 else 14
+
+    def name(offset):
+        length, = struct.unpack('>H', data[namesOffset + offset:namesOffset + offset + 2])
+        start = namesOffset + offset + 6
+        return data[start:start + 2 * length].decode('utf-16-be')
+
+    contents = {}
+    pending = [(0, '')]
+    while pending:
+        index, prefix = pending.pop()
+        node = treeOffset + index * nodeSize
+        nameOffset, flags = struct.unpack('>IH', data[node:node + 6])
+        if flags & DIRECTORY:
+            count, first = struct.unpack('>II', data[node + 6:node + 14])
+            # The root's name is never used
+            path = prefix + name(nameOffset) + '/' if index else prefix
+            pending.extend((child, path) for child in range(first, first + count))
+            continue
+        offset, = struct.unpack('>I', data[node + 10:node + 14])
+        length, = struct.unpack('>I', data[dataOffset + offset:dataOffset + offset + 4])
+        blob = data[dataOffset + offset + 4:dataOffset + offset + 4 + length]
+        if flags & COMPRESSED:
+            # qCompress format, the uncompressed size followed by a zlib stream
+            blob = zlib.decompress(blob[4:])
+        contents[prefix + name(nameOffset)] = blob
+    return contents
+
+
+def test_rcc_matches_qrc_sources():
+    qrc = xml.etree.ElementTree.parse(os.path.join(RESOURCES_DIR, 'nsim.qrc'))
+    expected = {}
+    for entry in qrc.iter('file'):
+        with open(os.path.join(RESOURCES_DIR, entry.text), 'rb') as sourceFile:
+            expected[entry.get('alias', entry.text)] = sourceFile.read()
+
+    bundled = readRcc(os.path.join(RESOURCES_DIR, 'nsim.rcc'))
+    assert sorted(bundled) == sorted(expected)
+    for name, contents in expected.items():
+        assert bundled[name] == contents, name
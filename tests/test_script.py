@@ -0,0 +1,89 @@
+from lc3.script import runScript, stripComment
+
+import os
+import shutil
+
+import pytest
+
+OS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'resources', 'os')
+
+PROGRAM = '''; prints COUNT stars
+.ORIG x3000
+        LD R1, COUNT
+        ADD R1, R1, #0
+        BRz DONE
+LOOP    LD R0, STAR
+        OUT
+        ADD R1, R1, #-1
+        BRp LOOP
+DONE    HALT
+STAR    .FILL x2A
+COUNT   .FILL #{count}
+.END
+'''
+
+SCRIPT = '''# comment line
+reset
+ld lc3os.obj
+as prog.asm
+ld prog.obj   # trailing comment
+set R2 #-2
+check R2 #-2
+check R2 xFFFE
+break set DONE
+continue
+check R1 #0
+'''
+
+
+def makeWorkingDir(path, count):
+    os.makedirs(path, exist_ok=True)
+    for name in ('lc3os.obj', 'lc3os.sym'):
+        shutil.copy(os.path.join(OS_DIR, name), path)
+    with open(os.path.join(path, 'prog.asm'), 'w') as asmFile:
+        asmFile.write(PROGRAM.format(count=count))
+    return str(path)
+
+
+@pytest.mark.parametrize('line, stripped', [
+    ('# budget: seconds=5', ''),
+    ('  # indented comment', ''),
+    ('ld prog.obj # comment', 'ld prog.obj '),
+    ('ld prog.obj #', 'ld prog.obj '),
+    ('set R1 #7', 'set R1 #7'),
+    ('check R0 #-3', 'check R0 #-3'),
+    ('set R1 #7 # comment', 'set R1 #7 '),
+])
+def test_strip_comment(line, stripped):
+    assert stripComment(line) == stripped
+
+
+def test_script_round_trip(tmp_path):
+    workingDir = makeWorkingDir(tmp_path, 3)
+    output, verdict = runScript(workingDir, SCRIPT, 100000)
+    assert verdict is None
+    assert output == '\n'.join([
+        '==> reset',
+        'System reset',
+        '==> ld lc3os.obj',
+        'Loaded object file \'lc3os.obj\'',
+        'Loaded symbol file \'lc3os.sym\'',
+        '==> as prog.asm',
+        'Assembly of \'prog.asm\' completed without errors or warnings.',
+        '==> ld prog.obj',
+        'Loaded object file \'prog.obj\'',
+        'Loaded symbol file \'prog.sym\'',
+        '==> set R2 #-2',
+        '==> check R2 #-2',
+        'TRUE',
+        '==> check R2 xFFFE',
+        'TRUE',
+        '==> break set DONE',
+        'Breakpoint set at x3007',
+        '==> continue',
+        '***Hit breakpoint at x3007',  # the stars are the program's output
+        '==> check R1 #0',
+        'TRUE',
+        '',
+    ])
+
@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+QtCore = pytest.importorskip('PySide2.QtCore')
+
+from runner.staging import StagingDir, resolveOutside  # noqa: E402
+
+
+class Resources:
+    # Stands in for ResourceManager, the OS is "extracted" to osDir
+    def __init__(self, osDir):
+        self.osDir = osDir
+
+    def extractResource(self, requested):
+        return QtCore.QFileInfo(os.path.join(self.osDir, requested.fileName()))
+
+
+@pytest.fixture
+def submission(tmp_path):
+    osDir = tmp_path / 'os'
+    osDir.mkdir()
+    (osDir / 'lc3os.obj').write_bytes(b'\x00\x00')
+    (osDir / 'lc3os.sym').write_text('')
+
+    workingDir = tmp_path / 'student'
+    (workingDir / 'sub').mkdir(parents=True)
+    (workingDir / 'prog.asm').write_text('.ORIG x3000\n.END\n')
+    (workingDir / 'prog.obj').write_bytes(b'old')
+    (workingDir / 'nsim.pm').write_text('saved script')
+    (workingDir / 'sub' / 'lib.asm').write_text('.ORIG x4000\n.END\n')
+    os.symlink('..', str(workingDir / 'sub' / 'loop'))
+    return Resources(str(osDir)), workingDir
+
+
+def stage(resources, workingDir, script='as prog.asm\n'):
+    return StagingDir(resources, QtCore.QFileInfo(str(workingDir)), QtCore.QFileInfo(':/lc3os.obj'), script)
+
+
+def test_staged_files(submission):
+    resources, workingDir = submission
+    staging = stage(resources, workingDir)
+    try:
+        path = staging.path
+        assert os.path.islink(os.path.join(path, 'prog.asm'))
+        assert not os.path.islink(os.path.join(path, 'prog.obj'))
+        assert os.path.islink(os.path.join(path, 'lc3os.obj'))
+        assert not os.path.islink(os.path.join(path, 'sub'))
+        assert os.path.islink(os.path.join(path, 'sub', 'lib.asm'))
+        # A link back up the submission leads to the staged copy, not the submission
+        assert os.path.realpath(os.path.join(path, 'sub', 'loop')) == os.path.realpath(path)
+    finally:
+        staging.remove()
+
+
+def test_nothing_written_to_submission(submission):
+    resources, workingDir = submission
+    staging = stage(resources, workingDir)
+    try:
+        with open(staging.scriptPath) as scriptFile:
+            assert scriptFile.read() == 'as prog.asm'
+        # What assembling would write
+        for name in ('prog.obj', os.path.join('sub', 'lib.obj'), os.path.join('sub', 'loop', 'prog.sym')):
+            with open(os.path.join(staging.path, name), 'wb') as outputFile:
+                outputFile.write(b'new')
+    finally:
+        staging.remove()
+    assert (workingDir / 'nsim.pm').read_text() == 'saved script'
+    assert (workingDir / 'prog.obj').read_bytes() == b'old'
+    assert sorted(os.listdir(str(workingDir))) == ['nsim.pm', 'prog.asm', 'prog.obj', 'sub']
+    assert sorted(os.listdir(str(workingDir / 'sub'))) == ['lib.asm', 'loop']
+
+
+@pytest.mark.parametrize('line, resolved', [
+    ('input ../tests/in1.txt # keys', 'input /course/tests/in1.txt'),
+    ('ld ../lib.obj', 'ld /course/lib.obj'),
+    ('ld prog.obj # comment', 'ld prog.obj # comment'),
+    ('as -warn sub/../prog.asm', 'as -warn sub/../prog.asm'),
+    ('set R1 #-1', 'set R1 #-1'),
+])
+def test_resolve_outside(line, resolved):
+    assert resolveOutside(line, '/course/student') == resolved
@@ -0,0 +1,46 @@
+from runner.stream import OutputCapture
+
+import pytest
+
+OUTPUT = ('PennSim banner ==\nLoading...\n==> ld prog.obj\nLoaded object file \'prog.obj\'\n'
+          '==> continue\nhéllo ★\nStopped at x3007\n==> quit\nBye!\nafter quitting\n').encode()
+CAPTURED = OUTPUT[OUTPUT.index(b'==>'):OUTPUT.index(b'Bye!')].decode()
+
+
+def capture(chunks, **kwargs):
+    output = OutputCapture(**kwargs)
+    fed = ''.join(output.feed(chunk) for chunk in chunks)
+    fed += output.close()
+    assert fed == output.text
+    return output
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, len(OUTPUT)])
+def test_markers_and_characters_split_across_reads(size):
+    output = capture([OUTPUT[start:start + size] for start in range(0, len(OUTPUT), size)])
+    assert output.text == CAPTURED
+    assert not output.truncated
+
+
+def test_only_complete_lines_are_returned():
+    output = OutputCapture()
+    assert output.feed(b'banner\n==> contin') == ''
+    assert output.feed(b'ue\nstars: **') == '==> continue\n'
+    assert output.feed(b'*\n') == 'stars: ***\n'
+    assert output.close() == ''
+
+
+def test_without_markers():
+    output = capture([OUTPUT], start=None, end=None)
+    assert output.text == OUTPUT.decode()
+
+
+def test_truncated_at_the_limit():
+    chunks = [b'==> continue\n'] + [b'*' * 1000 + b'\n'] * 100
+    output = capture(chunks, limit=5000)
+    assert output.truncated
+    assert output.text == (b''.join(chunks)[:5000]).decode()
+    assert output.received == sum(len(chunk) for chunk in chunks)
+    # Nothing past the limit is kept
+    assert output.feed(b'more\n') == ''
+    assert len(output.text) == 5000
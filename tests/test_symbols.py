@@ -0,0 +1,73 @@
+from lc3.symbols import SymbolTable, parseSymbols, readSymbols
+from tests.test_script import OS_DIR
+
+import os
+import shutil
+
+import pytest
+
+SYMBOLS = '''// Symbol table
+// Scope level 0:
+//	Symbol Name       Page Address
+//	----------------  ------------
+//	START             3000
+//	$                 3001
+//	LOOP              3002
+//	Data              3010
+
+'''
+
+
+def test_parse():
+    table = parseSymbols(SYMBOLS)
+    assert table.names == {'START': 0x3000, 'LOOP': 0x3002, 'Data': 0x3010}
+    assert table.addresses == [0x3000, 0x3002, 0x3010]
+    assert table.labels == ['START', 'LOOP', 'Data']
+    assert 'Data' in table and '$' not in table
+    assert table['LOOP'] == 0x3002
+
+
+@pytest.mark.parametrize('address, nearest, symbolized', [
+    (0x2FFF, None, 'x2FFF'),
+    (0x3000, ('START', 0), 'START'),
+    (0x3001, ('START', 1), 'START+1'),
+    (0x3002, ('LOOP', 0), 'LOOP'),
+    (0x300F, ('LOOP', 13), 'LOOP+13'),
+    (0x3010, ('Data', 0), 'Data'),
+    (0xFFFF, ('Data', 0xCFEF), 'Data+53231'),
+])
+def test_nearest(address, nearest, symbolized):
+    table = parseSymbols(SYMBOLS)
+    assert table.nearest(address) == nearest
+    assert table.symbolize(address) == symbolized
+
+
+def test_empty_table():
+    table = SymbolTable()
+    assert table.nearest(0x3000) is None
+    assert table.symbolize(0x3000) == 'x3000'
+
+
+def test_read_symbols_is_cached_by_contents(tmp_path):
+    for name in ('a.sym', 'b.sym'):
+        shutil.copy(os.path.join(OS_DIR, 'lc3os.sym'), str(tmp_path / name))
+    table = readSymbols(str(tmp_path / 'a.sym'))
+    assert readSymbols(str(tmp_path / 'b.sym')) is table
+    assert table.symbolize(table['TRAP_OUT_WAIT'] + 1) == 'TRAP_OUT_WAIT+1'
+
+    (tmp_path / 'b.sym').write_text(SYMBOLS)
+    assert readSymbols(str(tmp_path / 'b.sym')) is not table
+
+
+def test_merging_leaves_the_cached_table_alone(tmp_path):
+    (tmp_path / 'prog.sym').write_text(SYMBOLS)
+    cached = readSymbols(os.path.join(OS_DIR, 'lc3os.sym'))
+    names, addresses, labels = dict(cached.names), list(cached.addresses), list(cached.labels)
+
+    merged = SymbolTable()
+    merged.update(cached)
+    merged.update(readSymbols(str(tmp_path / 'prog.sym')))
+    assert merged.symbolize(0x3003) == 'LOOP+1'
+    assert merged['TRAP_OUT'] == cached['TRAP_OUT']
+    merged.clear()
+    assert (cached.names, cached.addresses, cached.labels) == (names, addresses, labels)
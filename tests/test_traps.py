@@ -0,0 +1,72 @@
+from lc3.script import ScriptRunner
+from tests.test_script import OS_DIR
+
+import os
+import shutil
+
+import pytest
+
+PROGRAM = '''.ORIG x3000
+        LEA R0, TEXT
+        PUTS
+        LD R0, CHAR
+        OUT
+        LEA R0, PACKED
+        PUTSP
+{printn}
+        HALT
+CHAR    .FILL x21
+NUMBERS .FILL #0
+        .FILL #-12345
+        .FILL #32767
+TEXT    .STRINGZ "Hello, world"
+PACKED  .FILL x6261
+        .FILL x0063
+        .FILL x0000
+.END
+'''
+
+# PRINTN only exists in p3os
+PRINTN = '''        LEA R1, NUMBERS
+        LDR R0, R1, #0
+        TRAP x30
+        LDR R0, R1, #1
+        TRAP x30
+        LDR R0, R1, #2
+        TRAP x30'''
+
+
+def loadRunner(path, pennSimOS, fastTraps):
+    for extension in ('.obj', '.sym'):
+        shutil.copy(os.path.join(OS_DIR, pennSimOS + extension), str(path))
+    with open(os.path.join(str(path), 'prog.asm'), 'w') as asmFile:
+        asmFile.write(PROGRAM.format(printn=PRINTN if pennSimOS == 'p3os' else ''))
+    runner = ScriptRunner(str(path), fastTraps=fastTraps)
+    runner.run('reset\nld {}.obj\nas prog.asm\nld prog.obj\n'.format(pennSimOS))
+    return runner
+
+
+@pytest.mark.parametrize('pennSimOS', ['lc3os', 'p2os', 'p3os'])
+def test_fast_traps_match_the_os(tmp_path, pennSimOS):
+    (tmp_path / 'os').mkdir()
+    (tmp_path / 'fast').mkdir()
+    slow = loadRunner(tmp_path / 'os', pennSimOS, False)
+    fast = loadRunner(tmp_path / 'fast', pennSimOS, True)
+    assert fast.machine.fastTraps and not slow.machine.fastTraps
+
+    # Each step of the fast machine is matched by however many instructions the OS takes for it
+    machine = fast.machine
+    native = 0
+    while not machine.halted:
+        instruction = machine.memory[machine.pc]
+        if instruction >> 12 == 0xF and machine.memory[instruction & 0xFF] in machine.fastTraps:
+            native += 1
+        machine.step()
+        while slow.machine.instructionCount < machine.instructionCount:
+            slow.machine.step()
+        assert slow.machine.snapshot() == machine.snapshot()
+        assert slow.output == fast.output
+    assert native == (6 if pennSimOS == 'p3os' else 3)
+    assert 'Hello, world!abc' in fast.output
+    if pennSimOS == 'p3os':
+        assert '0-1234532767' in fast.output
@@ -0,0 +1,78 @@
+from runner.walk import DirectoryIndex, findWorkingDirs
+
+import os
+
+import pytest
+
+
+def makeTree(root, dirs):
+    for path in dirs:
+        os.makedirs(os.path.join(str(root), path), exist_ok=True)
+        with open(os.path.join(str(root), path, 'prog.asm'), 'w') as asmFile:
+            asmFile.write('.ORIG x3000\n.END\n')
+    # Directory mtimes tick coarsely, so later changes have to be told apart from the walk
+    for dirPath, _, _ in os.walk(str(root)):
+        os.utime(dirPath, ns=(0, 0))
+    return str(root)
+
+
+def test_finds_submissions_and_skips_pruned_dirs(tmp_path):
+    root = makeTree(tmp_path, ['.', 'a', 'b/c', 'b/.git/d', '__pycache__', 'e/node_modules/f', 'g/build'])
+    os.makedirs(os.path.join(root, 'empty'))
+    assert findWorkingDirs(root, 'prog.asm') == [root] + [os.path.join(root, path) for path in ('a', 'b/c')]
+    assert findWorkingDirs(root, 'other.asm') == []
+
+
+def test_follows_symlinks_once(tmp_path):
+    root = makeTree(tmp_path / 'root', ['a'])
+    outside = makeTree(tmp_path / 'outside', ['b'])
+    os.symlink(outside, os.path.join(root, 'linked'))
+    # Loops back to an ancestor and a second link to the same submission
+    os.symlink(root, os.path.join(root, 'a', 'loop'))
+    os.symlink(os.path.join(outside, 'b'), os.path.join(root, 'again'))
+    found = findWorkingDirs(root, 'prog.asm')
+    assert os.path.join(root, 'a') in found
+    assert len(found) == 2
+    assert [os.path.realpath(path) for path in found if path != os.path.join(root, 'a')] == [os.path.join(outside, 'b')]
+
+
+def test_index_is_reused_while_directories_are_unchanged(tmp_path, monkeypatch):
+    root = makeTree(tmp_path / 'root', ['a', 'b', 'b/c'])
+    indexPath = str(tmp_path / 'cache' / 'directories.json')
+    expected = [os.path.join(root, path) for path in ('a', 'b', 'b/c')]
+    assert findWorkingDirs(root, 'prog.asm', DirectoryIndex(indexPath)) == expected
+
+    def scandir(path):
+        raise AssertionError('listed {}'.format(path))
+    monkeypatch.setattr(os, 'scandir', scandir)
+    assert findWorkingDirs(root, 'prog.asm', DirectoryIndex(indexPath)) == expected
+    # Unchanged directories are still found through the index even when their program isn't
+    assert findWorkingDirs(root, 'missing.asm', DirectoryIndex(indexPath)) == []
+
+
+def test_index_follows_changes(tmp_path):
+    root = makeTree(tmp_path / 'root', ['a', 'b', 'b/c'])
+    indexPath = str(tmp_path / 'directories.json')
+    findWorkingDirs(root, 'prog.asm', DirectoryIndex(indexPath))
+
+    os.remove(os.path.join(root, 'a', 'prog.asm'))
+    os.rename(os.path.join(root, 'b', 'c'), os.path.join(root, 'd'))
+    index = DirectoryIndex(indexPath)
+    assert findWorkingDirs(root, 'prog.asm', index) == [os.path.join(root, path) for path in ('b', 'd')]
+    assert os.path.join(root, 'b', 'c') not in index.entries
+    assert os.path.join(root, 'b', 'c') not in DirectoryIndex(indexPath).entries
+
+
+def test_prune_keeps_other_roots(tmp_path):
+    index = DirectoryIndex()
+    for dirPath in ('/x', '/x/a', '/x/ab', '/xy', '/y'):
+        index.entries[dirPath] = [0, [], []]
+    index.prune('/x', {'/x'})
+    assert sorted(index.entries) == ['/x', '/xy', '/y']
+
+
+@pytest.mark.parametrize('contents', ['', 'not json'])
+def test_unreadable_index_starts_empty(tmp_path, contents):
+    indexPath = tmp_path / 'directories.json'
+    indexPath.write_text(contents)
+    assert DirectoryIndex(str(indexPath)).entries == {}
@@ -17,6 +17,19 @@ class NSimMainWindow(QMainWindow):
     # Add programName otherwise the same as above->1
     runPennSimAll = Signal(str, QFileInfo, str, str, bool)
 
+    # Signal for changing how many scripted runs may happen at once
+    jobLimitChanged = Signal(int)
+
+    # Signal for choosing the backend (PennSim or the native engine) scripts run on
+    backendChanged = Signal(str)
+
+    # Signal for whether Run All on PennSim skips programs the built-in assembler rejects
+    preAssembleChanged = Signal(bool)
+
+    # Signals for the budget scripted runs are held to, in seconds and instructions
+    timeLimitChanged = Signal(int)
+    instructionLimitChanged = Signal(int)
+
     def __init__(self, _resourceManager):
         super(NSimMainWindow, self).__init__()
 
@@ -265,9 +278,8 @@ class NSimMainWindow(QMainWindow):
         else:
             if self.ui.programNameEdit.text():
                 checkContinue = QMessageBox.warning(self, 'Run All',
-                                                    'Warning: Testing against all files may take a long time and cause '
-                                                    'the window to appear to freeze. There is currently no method to '
-                                                    'cancel.\n\nContinue?',
+                                                    'Warning: Testing against all files may take a long time. There '
+                                                    'is currently no method to cancel.\n\nContinue?',
                                                     QMessageBox.No | QMessageBox.Yes, QMessageBox.No)
                 if checkContinue == QMessageBox.Yes:
                     try:
@@ -283,6 +295,33 @@ class NSimMainWindow(QMainWindow):
                 QMessageBox.warning(self, 'No Program Name',
                                     'Please define a program name to run a script against all files.')
 
+    @Slot(str)
+    def on_backendComboBox_activated(self, selection):
+        self.backendChanged.emit(selection)
+
+    @Slot(bool)
+    def on_preAssembleCheckBox_toggled(self, checked):
+        self.preAssembleChanged.emit(checked)
+
+    @Slot(int)
+    def on_jobsSpinBox_valueChanged(self, value):
+        self.jobLimitChanged.emit(value)
+
+    def setJobLimit(self, value):
+        self.ui.jobsSpinBox.setValue(min(value, self.ui.jobsSpinBox.maximum()))
+
+    @Slot(int)
+    def on_timeLimitSpinBox_valueChanged(self, value):
+        self.timeLimitChanged.emit(value)
+
+    @Slot(int)
+    def on_instructionLimitSpinBox_valueChanged(self, value):
+        self.instructionLimitChanged.emit(value * 1000000)
+
+    def setBudget(self, budget):
+        self.ui.timeLimitSpinBox.setValue(budget.seconds)
+        self.ui.instructionLimitSpinBox.setValue(budget.instructions // 1000000)
+
     @Slot()
     def pennSimScript_started(self):
         self.ui.runButton.setEnabled(False)
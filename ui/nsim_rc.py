@@ -108,18 +108,56 @@ class Ui_MainWindow(object):
         self.saveAsScriptButton.setEnabled(False)
         self.saveAsScriptButton.setObjectName("saveAsScriptButton")
         self.gridLayout.addWidget(self.saveAsScriptButton, 5, 2, 1, 2)
+        self.jobsLabel = QtWidgets.QLabel(self.scriptGroupBox)
+        self.jobsLabel.setObjectName("jobsLabel")
+        self.gridLayout.addWidget(self.jobsLabel, 7, 0, 1, 2)
+        self.jobsSpinBox = QtWidgets.QSpinBox(self.scriptGroupBox)
+        self.jobsSpinBox.setMinimum(1)
+        self.jobsSpinBox.setMaximum(64)
+        self.jobsSpinBox.setObjectName("jobsSpinBox")
+        self.gridLayout.addWidget(self.jobsSpinBox, 7, 2, 1, 2)
+        self.backendLabel = QtWidgets.QLabel(self.scriptGroupBox)
+        self.backendLabel.setObjectName("backendLabel")
+        self.gridLayout.addWidget(self.backendLabel, 8, 0, 1, 2)
+        self.backendComboBox = QtWidgets.QComboBox(self.scriptGroupBox)
+        self.backendComboBox.setObjectName("backendComboBox")
+        self.backendComboBox.addItem("")
+        self.backendComboBox.addItem("")
+        self.gridLayout.addWidget(self.backendComboBox, 8, 2, 1, 2)
+        self.timeLimitLabel = QtWidgets.QLabel(self.scriptGroupBox)
+        self.timeLimitLabel.setObjectName("timeLimitLabel")
+        self.gridLayout.addWidget(self.timeLimitLabel, 9, 0, 1, 2)
+        self.timeLimitSpinBox = QtWidgets.QSpinBox(self.scriptGroupBox)
+        self.timeLimitSpinBox.setMinimum(1)
+        self.timeLimitSpinBox.setMaximum(3600)
+        self.timeLimitSpinBox.setProperty("value", 30)
+        self.timeLimitSpinBox.setObjectName("timeLimitSpinBox")
+        self.gridLayout.addWidget(self.timeLimitSpinBox, 9, 2, 1, 2)
+        self.instructionLimitLabel = QtWidgets.QLabel(self.scriptGroupBox)
+        self.instructionLimitLabel.setObjectName("instructionLimitLabel")
+        self.gridLayout.addWidget(self.instructionLimitLabel, 10, 0, 1, 2)
+        self.instructionLimitSpinBox = QtWidgets.QSpinBox(self.scriptGroupBox)
+        self.instructionLimitSpinBox.setMinimum(1)
+        self.instructionLimitSpinBox.setMaximum(100000)
+        self.instructionLimitSpinBox.setProperty("value", 50)
+        self.instructionLimitSpinBox.setObjectName("instructionLimitSpinBox")
+        self.gridLayout.addWidget(self.instructionLimitSpinBox, 10, 2, 1, 2)
         self.allTestsCheckBox = QtWidgets.QCheckBox(self.scriptGroupBox)
         self.allTestsCheckBox.setEnabled(False)
         self.allTestsCheckBox.setObjectName("allTestsCheckBox")
-        self.gridLayout.addWidget(self.allTestsCheckBox, 9, 2, 1, 1)
+        self.gridLayout.addWidget(self.allTestsCheckBox, 11, 2, 1, 1)
         self.cliModeCheckBox = QtWidgets.QCheckBox(self.scriptGroupBox)
         self.cliModeCheckBox.setEnabled(False)
         self.cliModeCheckBox.setObjectName("cliModeCheckBox")
-        self.gridLayout.addWidget(self.cliModeCheckBox, 9, 1, 1, 1)
+        self.gridLayout.addWidget(self.cliModeCheckBox, 11, 1, 1, 1)
+        self.preAssembleCheckBox = QtWidgets.QCheckBox(self.scriptGroupBox)
+        self.preAssembleCheckBox.setChecked(True)
+        self.preAssembleCheckBox.setObjectName("preAssembleCheckBox")
+        self.gridLayout.addWidget(self.preAssembleCheckBox, 12, 1, 1, 2)
         spacerItem2 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.MinimumExpanding, QtWidgets.QSizePolicy.Minimum)
-        self.gridLayout.addItem(spacerItem2, 9, 0, 1, 1)
+        self.gridLayout.addItem(spacerItem2, 11, 0, 1, 1)
         spacerItem3 = QtWidgets.QSpacerItem(0, 0, QtWidgets.QSizePolicy.MinimumExpanding, QtWidgets.QSizePolicy.Minimum)
-        self.gridLayout.addItem(spacerItem3, 9, 3, 1, 1)
+        self.gridLayout.addItem(spacerItem3, 11, 3, 1, 1)
         self.verticalLayout.addWidget(self.scriptGroupBox)
         self.pennSimGroupBox = QtWidgets.QGroupBox(self.layoutWidget)
         self.pennSimGroupBox.setCheckable(True)
@@ -172,6 +210,10 @@ class Ui_MainWindow(object):
         self.programNameEditLabel.setBuddy(self.programNameEdit)
         self.selectTestLabel.setBuddy(self.scriptComboBox)
         self.osLabel.setBuddy(self.osComboBox)
+        self.jobsLabel.setBuddy(self.jobsSpinBox)
+        self.timeLimitLabel.setBuddy(self.timeLimitSpinBox)
+        self.instructionLimitLabel.setBuddy(self.instructionLimitSpinBox)
+        self.backendLabel.setBuddy(self.backendComboBox)
 
         self.retranslateUi(MainWindow)
         QtCore.QMetaObject.connectSlotsByName(MainWindow)
@@ -201,11 +243,29 @@ class Ui_MainWindow(object):
         self.osComboBox.setItemText(2, QtWidgets.QApplication.translate("MainWindow", "p3os", None, -1))
         self.osComboBox.setItemText(3, QtWidgets.QApplication.translate("MainWindow", "Other...", None, -1))
         self.saveAsScriptButton.setText(QtWidgets.QApplication.translate("MainWindow", "Save Script As", None, -1))
+        self.jobsLabel.setToolTip(QtWidgets.QApplication.translate("MainWindow", "Number of PennSim runs allowed at once when running against all programs.", None, -1))
+        self.jobsLabel.setText(QtWidgets.QApplication.translate("MainWindow", "Parallel Jobs:", None, -1))
+        self.jobsSpinBox.setToolTip(QtWidgets.QApplication.translate("MainWindow", "Number of PennSim runs allowed at once when running against all programs.", None, -1))
+        self.backendLabel.setToolTip(QtWidgets.QApplication.translate("MainWindow", "Run scripts on PennSim or on the built-in LC-3 engine.", None, -1))
+        self.backendLabel.setText(QtWidgets.QApplication.translate("MainWindow", "Backend:", None, -1))
+        self.backendComboBox.setToolTip(QtWidgets.QApplication.translate("MainWindow", "Run scripts on PennSim or on the built-in LC-3 engine.", None, -1))
+        self.backendComboBox.setItemText(0, QtWidgets.QApplication.translate("MainWindow", "PennSim", None, -1))
+        self.backendComboBox.setItemText(1, QtWidgets.QApplication.translate("MainWindow", "Native", None, -1))
+        self.timeLimitLabel.setToolTip(QtWidgets.QApplication.translate("MainWindow", "Seconds a scripted run may take before it is terminated. A script can set its own with a \"# budget: seconds=N\" comment.", None, -1))
+        self.timeLimitLabel.setText(QtWidgets.QApplication.translate("MainWindow", "Time Limit:", None, -1))
+        self.timeLimitSpinBox.setToolTip(QtWidgets.QApplication.translate("MainWindow", "Seconds a scripted run may take before it is terminated. A script can set its own with a \"# budget: seconds=N\" comment.", None, -1))
+        self.timeLimitSpinBox.setSuffix(QtWidgets.QApplication.translate("MainWindow", " s", None, -1))
+        self.instructionLimitLabel.setToolTip(QtWidgets.QApplication.translate("MainWindow", "Millions of instructions a scripted run on the built-in engine may execute before it is terminated. A script can set its own with a \"# budget: instructions=N\" comment.", None, -1))
+        self.instructionLimitLabel.setText(QtWidgets.QApplication.translate("MainWindow", "Instruction Limit:", None, -1))
+        self.instructionLimitSpinBox.setToolTip(QtWidgets.QApplication.translate("MainWindow", "Millions of instructions a scripted run on the built-in engine may execute before it is terminated. A script can set its own with a \"# budget: instructions=N\" comment.", None, -1))
+        self.instructionLimitSpinBox.setSuffix(QtWidgets.QApplication.translate("MainWindow", " M", None, -1))
         self.allTestsCheckBox.setToolTip(QtWidgets.QApplication.translate("MainWindow", "Recursively runs script against all <Program Name>\'s found with selected root or current folder. Program Name determines the program name searched for, not anything in the script.", None, -1))
         self.allTestsCheckBox.setStatusTip(QtWidgets.QApplication.translate("MainWindow", "Recursively runs script against all <Program Name>\'s found with selected root folder.", None, -1))
         self.allTestsCheckBox.setText(QtWidgets.QApplication.translate("MainWindow", "All programs", None, -1))
         self.cliModeCheckBox.setToolTip(QtWidgets.QApplication.translate("MainWindow", "Run PennSim in command-line mode.", None, -1))
         self.cliModeCheckBox.setText(QtWidgets.QApplication.translate("MainWindow", "CLI Mode", None, -1))
+        self.preAssembleCheckBox.setToolTip(QtWidgets.QApplication.translate("MainWindow", "Before running against all programs, assemble each one with the built-in assembler and skip those that don\'t assemble. Runs on the built-in engine always do this.", None, -1))
+        self.preAssembleCheckBox.setText(QtWidgets.QApplication.translate("MainWindow", "Skip programs that don\'t assemble", None, -1))
         self.pennSimGroupBox.setTitle(QtWidgets.QApplication.translate("MainWindow", "PennSim CLI Output", None, -1))
         self.clearCLIOutputButton.setText(QtWidgets.QApplication.translate("MainWindow", "Clear Output", None, -1))
         self.menuFile.setTitle(QtWidgets.QApplication.translate("MainWindow", "File", None, -1))